@@ -1,3 +1,12 @@
-from .mock import MockChainContext, MockUser, MockFrostApi, MockPool
+from .eval_cache import EvaluationCache, UnflattenCache
+from .evaluator import ProcessPoolEvaluator, SerialEvaluator
+from .profiling import CostProfile, OpshinSource, SourceProfile
+from .mock import (
+    MockChainContext,
+    MockUser,
+    MockFrostApi,
+    MockPool,
+    NativeMockChainContext,
+)
 from .mockfrost.client import MockFrostClient, MockFrostSession, MockFrostUser
 from .mockfrost.server import app as MockFrostServer
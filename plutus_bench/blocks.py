@@ -0,0 +1,137 @@
+import dataclasses
+import hashlib
+from typing import Optional, Tuple
+
+from pycardano import ProtocolParameters, Transaction
+
+from .tx_tools import transaction_ex_units
+
+
+def block_hash(
+    previous_block: Optional[str], slot: int, tx_ids: Tuple[str, ...]
+) -> str:
+    """Deterministic hash of a mock block, chaining it to its predecessor"""
+    h = hashlib.blake2b(digest_size=32)
+    h.update(bytes.fromhex(previous_block or ""))
+    h.update(slot.to_bytes(8, "big", signed=True))
+    for tx_id in tx_ids:
+        h.update(bytes.fromhex(tx_id))
+    return h.hexdigest()
+
+
+@dataclasses.dataclass(frozen=True)
+class Block:
+    """A block of the mock chain"""
+
+    hash: str
+    height: int
+    slot: int
+    previous_block: Optional[str]
+    # ids of the included transactions, in order
+    transactions: Tuple[str, ...] = ()
+    size: int = 0
+    ex_mem: int = 0
+    ex_steps: int = 0
+    fees: int = 0
+    # lovelace in the outputs of the included transactions
+    output: int = 0
+
+
+GENESIS_BLOCK = Block(
+    hash=block_hash(None, 0, ()), height=0, slot=0, previous_block=None
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class PendingTransaction:
+    """A transaction in the mempool, with the resources it takes up in a block"""
+
+    tx: Transaction
+    cbor: bytes
+    ex_mem: int
+    ex_steps: int
+
+    @classmethod
+    def from_transaction(cls, tx: Transaction, cbor: bytes) -> "PendingTransaction":
+        mem, steps = transaction_ex_units(tx)
+        return cls(tx, cbor, mem, steps)
+
+    @property
+    def size(self) -> int:
+        return len(self.cbor)
+
+    def fits(self, block: Block, protocol_param: ProtocolParameters) -> bool:
+        """Whether the transaction can be added to the block without exceeding its limits"""
+        return (
+            block.size + self.size <= protocol_param.max_block_size
+            and block.ex_mem + self.ex_mem <= protocol_param.max_block_ex_mem
+            and block.ex_steps + self.ex_steps <= protocol_param.max_block_ex_steps
+        )
+
+
+def next_block(
+    previous: Block, slot: int, transactions: Tuple[PendingTransaction, ...] = ()
+) -> Block:
+    """The block following previous, containing the transactions"""
+    tx_ids = tuple(p.tx.id.payload.hex() for p in transactions)
+    return Block(
+        hash=block_hash(previous.hash, slot, tx_ids),
+        height=previous.height + 1,
+        slot=slot,
+        previous_block=previous.hash,
+        transactions=tx_ids,
+        size=sum(p.size for p in transactions),
+        ex_mem=sum(p.ex_mem for p in transactions),
+        ex_steps=sum(p.ex_steps for p in transactions),
+        fees=sum(p.tx.transaction_body.fee for p in transactions),
+        output=sum(
+            o.amount.coin for p in transactions for o in p.tx.transaction_body.outputs
+        ),
+    )
+
+
+@dataclasses.dataclass
+class BlockStatistics:
+    """Throughput and resource utilisation of the blocks produced by a mock chain"""
+
+    blocks: int = 0
+    empty_blocks: int = 0
+    # blocks that were closed because the next transaction did not fit
+    full_blocks: int = 0
+    transactions: int = 0
+    # transactions removed from the mempool because they became invalid before they were included
+    dropped_transactions: int = 0
+    max_transactions_per_block: int = 0
+    # totals over all blocks
+    size: int = 0
+    ex_mem: int = 0
+    ex_steps: int = 0
+
+    def add(self, block: Block, full: bool = False):
+        self.blocks += 1
+        if not block.transactions:
+            self.empty_blocks += 1
+        self.full_blocks += full
+        self.transactions += len(block.transactions)
+        self.max_transactions_per_block = max(
+            self.max_transactions_per_block, len(block.transactions)
+        )
+        self.size += block.size
+        self.ex_mem += block.ex_mem
+        self.ex_steps += block.ex_steps
+
+    def to_json(self, protocol_param: ProtocolParameters) -> dict:
+        """
+        The statistics with averages over the non-empty blocks.
+        Utilisation is the fraction of the block limits taken up by the transactions.
+        """
+        filled = max(self.blocks - self.empty_blocks, 1)
+        return {
+            **dataclasses.asdict(self),
+            "transactions_per_block": self.transactions / filled,
+            "size_utilisation": self.size / (filled * protocol_param.max_block_size),
+            "ex_mem_utilisation": self.ex_mem
+            / (filled * protocol_param.max_block_ex_mem),
+            "ex_steps_utilisation": self.ex_steps
+            / (filled * protocol_param.max_block_ex_steps),
+        }
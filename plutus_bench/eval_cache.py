@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import tempfile
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+import uplc
+import uplc.ast
+
+# result of evaluating a script: the error message (None on success), (cpu, mem) and the logs
+EvaluationResult = Tuple[Optional[str], Tuple[int, int], List[str]]
+
+
+def evaluation_key(script: bytes, args: List[bytes], cpu: int, mem: int) -> str:
+    """
+    Content address of a script evaluation.
+
+    Covers the uplc version, the script, the CBOR encoding of every argument and the budget.
+    """
+    h = hashlib.sha256()
+    h.update(uplc.__version__.encode())
+    for part in [script, *args]:
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    h.update(cpu.to_bytes(16, "big", signed=True))
+    h.update(mem.to_bytes(16, "big", signed=True))
+    return h.hexdigest()
+
+
+class EvaluationCache:
+    """
+    Cache of script evaluation results, keyed by :func:`evaluation_key`.
+
+    Evaluation is deterministic, so a stored result can be returned for the same script, arguments and budget.
+    Results are kept in an in-memory LRU of at most max_entries entries
+    and, if a directory is given, in one JSON file per result in that directory,
+    so later processes (e.g. the next CI run) can reuse them.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        directory: Optional[Union[str, os.PathLike]] = None,
+    ):
+        self.max_entries = max_entries
+        self.directory = pathlib.Path(directory) if directory is not None else None
+        self._memory: "OrderedDict[str, EvaluationResult]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[EvaluationResult]:
+        res = self._memory.get(key)
+        if res is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return res
+        if self.directory is not None:
+            try:
+                with open(self._path(key)) as f:
+                    stored = json.load(f)
+            except (OSError, ValueError):
+                pass
+            else:
+                res = stored["error"], (stored["cpu"], stored["mem"]), stored["logs"]
+                self._remember(key, res)
+                self.disk_hits += 1
+                return res
+        self.misses += 1
+        return None
+
+    def put(self, key: str, res: EvaluationResult):
+        self._remember(key, res)
+        if self.directory is None:
+            return
+        error, (cpu, mem), logs = res
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so concurrent readers never see partial results
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"error": error, "cpu": cpu, "mem": mem, "logs": logs}, f)
+        os.replace(tmp, path)
+
+    def _remember(self, key: str, res: EvaluationResult):
+        self._memory[key] = res
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def clear(self):
+        """Drop the in-memory entries, the on-disk entries are kept."""
+        self._memory.clear()
+
+
+class UnflattenCache:
+    """
+    Size-bounded LRU cache of unflattened UPLC programs, keyed by the script bytes.
+
+    If a directory is set, decoded programs are also pickled there by script hash,
+    so fresh processes (server restarts, evaluation workers) load them instead of decoding the script again.
+    The directory defaults to the environment variable PLUTUS_BENCH_UNFLATTEN_CACHE_DIR.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        directory: Optional[Union[str, os.PathLike]] = None,
+    ):
+        if directory is None:
+            directory = os.environ.get("PLUTUS_BENCH_UNFLATTEN_CACHE_DIR")
+        self.max_entries = max_entries
+        self.directory = pathlib.Path(directory) if directory else None
+        self._memory: "OrderedDict[bytes, uplc.ast.Program]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, script: bytes) -> pathlib.Path:
+        key = hashlib.sha256(uplc.__version__.encode() + script).hexdigest()
+        return self.directory / key[:2] / f"{key}.pickle"
+
+    def get(self, script: bytes) -> "uplc.ast.Program":
+        program = self._memory.get(script)
+        if program is not None:
+            self._memory.move_to_end(script)
+            self.hits += 1
+            return program
+        program = self._load(script)
+        if program is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            program = uplc.unflatten(script)
+            self._store(script, program)
+        self._memory[script] = program
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+        return program
+
+    def _load(self, script: bytes) -> Optional["uplc.ast.Program"]:
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(script), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # some programs (e.g. with list constants) do not unpickle, decode those again
+            self._path(script).unlink(missing_ok=True)
+            return None
+
+    def _store(self, script: bytes, program: "uplc.ast.Program"):
+        if self.directory is None:
+            return
+        path = self._path(script)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(program, f)
+        os.replace(tmp, path)
+
+    def info(self) -> dict:
+        """Hit, miss and size statistics of the cache"""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._memory),
+            "max_entries": self.max_entries,
+        }
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def clear(self):
+        """Drop the in-memory entries and statistics, the on-disk entries are kept."""
+        self._memory.clear()
+        self.hits = self.disk_hits = self.misses = 0
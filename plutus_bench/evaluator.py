@@ -0,0 +1,194 @@
+import hashlib
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import uplc.ast
+
+from .eval_cache import EvaluationCache, EvaluationResult, evaluation_key
+from .tx_tools import (
+    ScriptInvocation,
+    evaluate_script,
+    evaluate_uplc,
+    uplc_arguments,
+    uplc_unflat,
+)
+
+
+def evaluation_result(res, cost: Tuple[int, int], logs: List[str]) -> EvaluationResult:
+    return (str(res) if isinstance(res, Exception) else None), cost, logs
+
+
+class ScriptEvaluator:
+    """
+    Evaluates the script invocations of a transaction.
+
+    Results are yielded in the order of the invocations.
+    Callers may stop consuming the results after the first failing script.
+    If a cache is given, results of previous evaluations of the same script, arguments and budget are reused.
+    """
+
+    def __init__(self, cache: Optional[EvaluationCache] = None):
+        self.cache = cache
+
+    def evaluate(
+        self, script_invocations: List[ScriptInvocation]
+    ) -> Iterator[EvaluationResult]:
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SerialEvaluator(ScriptEvaluator):
+    """Evaluates one script after the other in the current process."""
+
+    def evaluate(
+        self, script_invocations: List[ScriptInvocation]
+    ) -> Iterator[EvaluationResult]:
+        # shares the converted TxInfo between the scripts of this transaction
+        data_cache = {}
+        for invocation in script_invocations:
+            if self.cache is None:
+                yield evaluation_result(*evaluate_script(invocation, data_cache))
+                continue
+            args = uplc_arguments(invocation, data_cache)
+            cpu = invocation.redeemer.ex_units.steps
+            mem = invocation.redeemer.ex_units.mem
+            key = evaluation_key(
+                invocation.script,
+                [uplc.ast.plutus_cbor_dumps(a.to_cbor()) for a in args],
+                cpu,
+                mem,
+            )
+            res = self.cache.get(key)
+            if res is None:
+                res = evaluation_result(
+                    *evaluate_uplc(uplc_unflat(invocation.script), args, cpu, mem)
+                )
+                self.cache.put(key, res)
+            yield res
+
+
+# scripts known to the current worker process, by script hash
+_worker_scripts: Dict[bytes, bytes] = {}
+
+
+def _evaluate_in_worker(
+    script_hash: bytes,
+    script: Optional[bytes],
+    args: List[bytes],
+    cpu: int,
+    mem: int,
+) -> Optional[EvaluationResult]:
+    """Evaluate a script in a worker process, returns None if the script was not sent and is unknown"""
+    if script is None:
+        script = _worker_scripts.get(script_hash)
+        if script is None:
+            return None
+    else:
+        _worker_scripts[script_hash] = script
+    # the unflattened program is cached in the worker process
+    return evaluation_result(
+        *evaluate_uplc(
+            uplc_unflat(script), [uplc.ast.data_from_cbor(a) for a in args], cpu, mem
+        )
+    )
+
+
+class ProcessPoolEvaluator(ScriptEvaluator):
+    """
+    Evaluates the scripts of a transaction in parallel on a pool of worker processes.
+
+    The pool is started on first use and kept alive until :meth:`close` is called.
+    One evaluator may be used by several threads at the same time.
+    Script arguments are converted in the calling process, so the TxInfo is still converted once per transaction.
+    Workers keep the scripts they have seen together with their unflattened programs,
+    so a script is only sent again to a worker that has not seen it yet.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        cache: Optional[EvaluationCache] = None,
+    ):
+        super().__init__(cache)
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # hashes of scripts that were sent to at least one worker
+        self._sent: Set[bytes] = set()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def evaluate(
+        self, script_invocations: List[ScriptInvocation]
+    ) -> Iterator[EvaluationResult]:
+        data_cache = {}
+        tasks = []
+        sent = set()
+        for invocation in script_invocations:
+            script_hash = hashlib.sha256(invocation.script).digest()
+            # uplc data does not survive pickling, send it in its CBOR encoding
+            args = [
+                uplc.ast.plutus_cbor_dumps(a.to_cbor())
+                for a in uplc_arguments(invocation, data_cache)
+            ]
+            cpu = invocation.redeemer.ex_units.steps
+            mem = invocation.redeemer.ex_units.mem
+            task = (script_hash, invocation.script, args, cpu, mem)
+            if self.cache is not None:
+                key = evaluation_key(invocation.script, args, cpu, mem)
+                res = self.cache.get(key)
+                if res is not None:
+                    future = Future()
+                    future.set_result(res)
+                    tasks.append((future, task, None))
+                    continue
+            else:
+                key = None
+            # scripts seen for the first time are sent along with every invocation of the batch
+            script = invocation.script if script_hash not in self._sent else None
+            sent.add(script_hash)
+            future = self.executor.submit(
+                _evaluate_in_worker, script_hash, script, args, cpu, mem
+            )
+            tasks.append((future, task, key))
+        self._sent.update(sent)
+        return self._results(tasks)
+
+    def _results(
+        self, tasks: List[Tuple[Future, tuple, Optional[str]]]
+    ) -> Iterator[EvaluationResult]:
+        for i, (future, task, key) in enumerate(tasks):
+            res = future.result()
+            if res is None:
+                # the worker that picked up the task has not seen the script yet,
+                # resubmit all such tasks of the batch with their script before blocking again
+                wait([f for f, _, _ in tasks[i:]])
+                for j in range(i, len(tasks)):
+                    f, t, k = tasks[j]
+                    if f.result() is None:
+                        tasks[j] = (self.executor.submit(_evaluate_in_worker, *t), t, k)
+                res = tasks[i][0].result()
+            if key is not None:
+                self.cache.put(key, res)
+            yield res
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+                self._sent.clear()
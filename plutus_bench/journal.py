@@ -0,0 +1,100 @@
+import copy
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from pycardano import Datum, DatumHash, TransactionInput, UTxO
+
+if TYPE_CHECKING:
+    from .mock import MockFrostApi
+
+
+class LedgerJournal:
+    """
+    Ledger mutations of a single transaction, staged until they are committed.
+
+    Reads go through the journal, so later steps of a transaction see the effects of earlier ones,
+    while the ledger itself stays untouched.
+    Committing applies the staged changes in O(changes),
+    dropping an uncommitted journal rolls the transaction back at no cost.
+    """
+
+    def __init__(self, api: "MockFrostApi"):
+        self.api = api
+        self.spent: Dict[TransactionInput, UTxO] = {}
+        self.created: Dict[TransactionInput, UTxO] = {}
+        # hashes of the inline datums of the created outputs
+        self.created_datum_hashes: Dict[TransactionInput, DatumHash] = {}
+        # witness datums of the transaction by their hash
+        self.datums: Dict[DatumHash, Datum] = {}
+        # staged copies of the reward accounts touched by the transaction
+        self.reward_account: Dict[str, dict] = {}
+        # delegators added to each pool by the transaction
+        self.pool_delegators: Dict[str, list] = defaultdict(list)
+        self.committed = False
+
+    def get_utxo(self, txi: TransactionInput) -> UTxO:
+        if txi in self.spent:
+            raise KeyError(txi)
+        if txi in self.created:
+            return self.created[txi]
+        return self.api.get_utxo_from_txid(txi.transaction_id, txi.index)
+
+    def remove_txi(self, txi: TransactionInput) -> UTxO:
+        utxo = self.get_utxo(txi)
+        if txi in self.created:
+            del self.created[txi]
+            self.created_datum_hashes.pop(txi, None)
+        else:
+            self.spent[txi] = utxo
+        return utxo
+
+    def add_utxo(self, utxo: UTxO, datum_h: Optional[DatumHash] = None):
+        self.created[utxo.input] = utxo
+        if datum_h is not None:
+            self.created_datum_hashes[utxo.input] = datum_h
+
+    def add_datum(self, datum_h: DatumHash, datum: Datum):
+        self.datums[datum_h] = datum
+
+    def get_reward_account(self, reward_address: str) -> Optional[dict]:
+        """Current state of the reward account, must not be modified"""
+        if reward_address in self.reward_account:
+            return self.reward_account[reward_address]
+        return self.api._reward_account.get(reward_address)
+
+    def update_reward_account(self, reward_address: str) -> dict:
+        """Staged copy of an existing reward account that may be modified"""
+        if reward_address not in self.reward_account:
+            self.reward_account[reward_address] = copy.deepcopy(
+                self.api._reward_account[reward_address]
+            )
+        return self.reward_account[reward_address]
+
+    def set_reward_account(self, reward_address: str, account: dict):
+        self.reward_account[reward_address] = account
+
+    def add_pool_delegator(self, pool_id: str, credential):
+        self.pool_delegators[pool_id].append(credential)
+
+    def pool_exists(self, pool_id: str) -> bool:
+        return pool_id in self.api._pool_delegators
+
+    def commit(self):
+        """Apply the staged changes to the ledger"""
+        assert not self.committed, "Journal was already committed"
+        # the ledger may have changed since the journal was staged, check before changing anything
+        store = self.api._utxo_state
+        for txi, utxo in self.spent.items():
+            assert (
+                txi in store and store.get(txi) is utxo
+            ), f"Input {txi} was spent since the journal was created"
+        for txi in self.spent:
+            self.api.remove_txi(txi)
+        for txi, utxo in self.created.items():
+            self.api.add_utxo(utxo, self.created_datum_hashes.get(txi))
+        for datum_h, datum in self.datums.items():
+            self.api._utxo_state.add_datum(datum_h, datum)
+        self.api._reward_account.update(self.reward_account)
+        for pool_id, delegators in self.pool_delegators.items():
+            self.api._pool_delegators[pool_id].extend(delegators)
+        self.committed = True
@@ -1,16 +1,30 @@
+import contextlib
+import copy
+import hashlib
+import inspect
+import io
+import itertools
+import os
+import pathlib
+import pickle
 import random
 import traceback
+import typing
 import uuid
 import warnings
-from collections import defaultdict
-from dataclasses import asdict
-from typing import Any, Callable, Dict, List, Optional, Union
+import zlib
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import cbor2
 import pycardano
+import uplc
+import uplc.ast
 from blockfrost import Namespace
 from blockfrost.utils import convert_json_to_object, convert_json_to_pandas
 from pycardano.crypto.bech32 import decode, encode
+from pycardano.exception import DeserializeException
 from pycardano.pool_params import PoolId
 from pycardano import (
     Address,
@@ -28,30 +42,55 @@ from pycardano import (
     TransactionOutput,
     UTxO,
     Value,
+    PlutusData,
+    Redeemer,
     RedeemerTag,
     script_hash,
     NativeScript,
     PlutusV1Script,
     PlutusV2Script,
     ScriptHash,
+    DatumHash,
     BlockFrostChainContext,
     RawCBOR,
     RawPlutusData,
-    datum_hash,
     default_encoder,
     StakeKeyPair,
     StakeVerificationKey,
+    TransactionFailedException,
 )
 
 from .protocol_params import (
     DEFAULT_GENESIS_PARAMETERS,
     DEFAULT_PROTOCOL_PARAMETERS,
 )
+from .blocks import (
+    GENESIS_BLOCK,
+    Block,
+    BlockStatistics,
+    PendingTransaction,
+    next_block,
+)
+from .eval_cache import EvaluationResult
+from .evaluator import ScriptEvaluator, SerialEvaluator, evaluation_result
+from .profiling import (
+    CostProfile,
+    OpshinSource,
+    SourceProfile,
+    profile_source,
+    profile_uplc,
+)
 from .tx_tools import (
-    evaluate_script,
     generate_script_contexts_resolved,
     ScriptInvocation,
+    TransactionDatums,
+    uplc_arguments,
+    uplc_unflat,
 )
+from .journal import LedgerJournal
+from .phase1 import ValidationException, body_hash, validate_transaction
+from .signatures import SignatureVerifier, vkey_signatures
+from .utxo_store import CowDict, UTxOStore
 
 
 ValidatorType = Callable[[Any, Any, Any], Any]
@@ -95,20 +134,156 @@ def script_type(script: bytes) -> str:
         return "unknown"
 
 
+def redeemer_key(redeemer: Redeemer) -> str:
+    """Key of a redeemer in evaluation results, e.g. spend:0"""
+    return f"{redeemer.tag.name.lower()}:{redeemer.index}"
+
+
 def datum_to_cbor(d: pycardano.Datum) -> bytes:
     return cbor2.dumps(d, default=default_encoder)
 
 
+def native_argument(value: Any, annotation: Any) -> Any:
+    """
+    Convert a script argument to the PlutusData class the validator annotates it with,
+    so that isinstance checks and attribute access work as on chain.
+    """
+    candidates = (
+        typing.get_args(annotation)
+        if typing.get_origin(annotation) is Union
+        else (annotation,)
+    )
+    classes = tuple(
+        c for c in candidates if isinstance(c, type) and issubclass(c, PlutusData)
+    )
+    if not classes or isinstance(value, classes):
+        return value
+    cbor = datum_to_cbor(value)
+    for c in classes:
+        try:
+            return c.from_cbor(cbor)
+        except DeserializeException:
+            continue
+    return value
+
+
 def evaluate_opshin_validator(validator: OpshinValidator, invocation: ScriptInvocation):
+    """Run the python version of an OpShin validator, raises if the validator fails"""
+    try:
+        annotations = typing.get_type_hints(validator)
+    except Exception:
+        annotations = getattr(validator, "__annotations__", {})
+    params = list(inspect.signature(validator).parameters)
     if invocation.redeemer.tag == RedeemerTag.SPEND:
-        validator(invocation.datum, invocation.redeemer.data, invocation.script_context)
-    elif invocation.redeemer.tag == RedeemerTag.MINT:
-        validator(invocation.redeemer.data, invocation.script_context)
+        args = [
+            invocation.datum,
+            invocation.redeemer.data,
+            invocation.script_context,
+        ]
     else:
-        raise NotImplementedError("Only spending and minting validators supported.")
+        args = [invocation.redeemer.data, invocation.script_context]
+    assert len(params) == len(
+        args
+    ), f"Validator takes {len(params)} arguments, but the {invocation.redeemer.tag.name.lower()} script is called with {len(args)}"
+    validator(*(native_argument(a, annotations.get(p)) for a, p in zip(args, params)))
+
+
+def evaluate_native(
+    validator: OpshinValidator, invocation: ScriptInvocation
+) -> EvaluationResult:
+    """
+    Evaluate an invocation with the python version of its OpShin validator.
+    Printed output is returned as logs, the cost is not measured and reported as zero.
+    """
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            evaluate_opshin_validator(validator, invocation)
+    except Exception as e:
+        return evaluation_result(e, (0, 0), out.getvalue().splitlines())
+    return evaluation_result(None, (0, 0), out.getvalue().splitlines())
+
+
+# script invocation of a transaction, its native validator and whether it is sampled
+PlannedInvocation = Tuple[ScriptInvocation, Optional[OpshinValidator], bool]
+
+
+def uplc_invocations(plan: List[PlannedInvocation]) -> List[ScriptInvocation]:
+    """The planned invocations that are evaluated as UPLC"""
+    return [
+        invocation
+        for invocation, validator, sample in plan
+        if validator is None or sample
+    ]
+
+
+def evaluation_json(res: Union[Dict[str, ExecutionUnits], Exception]) -> dict:
+    """Response of the evaluation endpoint for the execution units or the error of an evaluation"""
+    if isinstance(res, Exception):
+        return {
+            "result": {
+                "EvaluationFailure": str(res),
+                "Trace": traceback.format_exception(res),
+            }
+        }
+    return {
+        "result": {
+            "EvaluationResult": {
+                k: {
+                    "steps": v.steps,
+                    "memory": v.mem,
+                }
+                for k, v in res.items()
+            }
+        }
+    }
+
+
+class EvaluationDivergenceWarning(UserWarning):
+    pass
+
+
+@dataclass(frozen=True)
+class EvaluationDivergence:
+    """An invocation that failed in only one of the native and the UPLC evaluation"""
+
+    transaction_id: TransactionId
+    redeemer: str
+    native_error: Optional[str]
+    uplc_error: Optional[str]
+
+
+@dataclass(frozen=True)
+class LedgerSnapshot:
+    """State of a MockFrostApi ledger at one point in time, see MockFrostApi.snapshot"""
+
+    utxos: UTxOStore
+    scripts: CowDict[ScriptHash, ScriptType]
+    pool_delegators: Dict[str, list]
+    accounts: Dict[str, dict]
+    reward_account: Dict[str, dict]
+    epoch: int
+    last_block_slot: int
+    random_state: tuple
+    latest_block: Block
+    block_statistics: BlockStatistics
+    mempool: Tuple[PendingTransaction, ...]
+
+
+# version of the format written by MockFrostApi.dumps
+STATE_FORMAT_VERSION = 1
+
+_PLUTUS_SCRIPT_TYPES = {
+    t.__name__: t for t in (PlutusV1Script, PlutusV2Script, pycardano.PlutusV3Script)
+}
 
 
 class MockFrostApi:
+    # number of recent evaluation outcomes kept to be reused on submit
+    max_memoized_evaluations = 64
+    # rough memory use of an empty chain and of every UTxO in it, including its indices
+    estimated_chain_bytes = 16 * 1024
+    estimated_utxo_bytes = 1024
 
     def __init__(
         self,
@@ -116,6 +291,14 @@ class MockFrostApi:
         genesis_param: Optional[GenesisParameters] = None,
         opshin_scripts: Optional[Dict[ScriptType, OpshinValidator]] = None,
         seed: int = 0,
+        evaluator: Optional[ScriptEvaluator] = None,
+        strict_evaluation: bool = False,
+        opshin_sources: Optional[Dict[ScriptType, OpshinSource]] = None,
+        flamegraph_directory: Optional[Union[str, os.PathLike]] = None,
+        opshin_sample_rate: float = 0.0,
+        phase1_validation: bool = True,
+        verify_signatures: bool = True,
+        block_production: bool = False,
     ):
         """
         A mock BlockFrost API that you can use for testing offchain code and evaluating scripts locally.
@@ -123,8 +306,33 @@ class MockFrostApi:
         Args:
             protocol_param: Cardano Node protocol parameters. Defaults to preview network parameters.
             genesis_param: Cardano Node genesis parameters. Defaults to preview network parameters.
-            opshin_scripts: If set, evaluate the opshin validator when the plutus script matches.
+            opshin_scripts: Python versions of OpShin validators by their compiled script.
+                Invocations of these scripts run the python validator instead of the UPLC script,
+                which is much faster but does not measure the cost, the invocations report zero execution units.
+            seed: Seed of the random number generator of the mock chain.
+            evaluator: Evaluates the scripts of a transaction. Defaults to evaluating them one after the other,
+                pass a ProcessPoolEvaluator to evaluate them in parallel.
+            strict_evaluation: If set, always evaluate the scripts of a submitted transaction,
+                even if the same transaction was just evaluated against the same ledger state.
+            opshin_sources: OpShin source code of scripts, see register_opshin_source.
+            flamegraph_directory: If set, every evaluation of a script with registered OpShin source
+                writes its cpu cost per source function to a collapsed stack file in this directory.
+            opshin_sample_rate: Fraction of the invocations of opshin_scripts that are evaluated as UPLC as well.
+                Sampled invocations report the cost of the UPLC evaluation. If only one of the evaluations fails,
+                the divergence is recorded in divergences and an EvaluationDivergenceWarning is emitted.
+            phase1_validation: If set, submit_tx checks the phase-1 ledger rules (validity interval, inputs, size,
+                fee, balance, collateral and key witnesses) before evaluating any script.
+            verify_signatures: If set, phase-1 validation verifies the signatures of the vkey witnesses.
+                Otherwise only the presence of the required witnesses is checked.
+            block_production: If set, submit_tx validates and evaluates transactions against the ledger and the mempool,
+                but only adds them to the mempool. wait and set_block_slot produce blocks from the mempool,
+                respecting the block size and execution unit limits of the protocol parameters.
+                Otherwise every submitted transaction is applied immediately in a block of its own.
         """
+        self.evaluator = evaluator if evaluator is not None else SerialEvaluator()
+        self.strict_evaluation = strict_evaluation
+        # recent evaluation outcomes by transaction and slot, with the UTxOs they were evaluated against
+        self._evaluations: OrderedDict = OrderedDict()
         self.random = random.Random(seed)
         self._protocol_param = (
             protocol_param if protocol_param else DEFAULT_PROTOCOL_PARAMETERS
@@ -136,18 +344,33 @@ class MockFrostApi:
             self.opshin_scripts = {}
         else:
             self.opshin_scripts = opshin_scripts
-        self._scripts: Dict[ScriptHash, ScriptType] = {}
-        # map from address to outputs
-        self._utxo_state: Dict[str, List[UTxO]] = defaultdict(list)
-        # map from utxo to address
-        self._address_lookup: Dict[TransactionInput, str] = {}
-        self._utxo_from_txid: Dict[TransactionId, Dict[int, UTxO]] = defaultdict(dict)
+        assert 0 <= opshin_sample_rate <= 1, "The sample rate must be between 0 and 1"
+        self.opshin_sample_rate = opshin_sample_rate
+        # separate from self.random, so sampling does not change the chain
+        self._sample_random = random.Random(seed)
+        self.divergences: List[EvaluationDivergence] = []
+        self.phase1_validation = phase1_validation
+        self.verify_signatures = verify_signatures
+        self.signature_verifier = SignatureVerifier()
+        self.flamegraph_directory = flamegraph_directory
+        # source annotated programs by script
+        self._opshin_programs: Dict[bytes, Tuple[str, uplc.ast.Program]] = {}
+        for script, source in (opshin_sources or {}).items():
+            self.register_opshin_source(script, source)
+        self._scripts: CowDict[ScriptHash, ScriptType] = CowDict()
+        self._utxo_state = UTxOStore()
         self._network = Network.TESTNET
         self._epoch = 0
         self._last_block_slot = 0
         self._pool_delegators: Dict[str, list] = {}
         self._accounts: Dict[str, dict] = {}
         self._reward_account: Dict[str, dict] = {}
+        self.block_production = block_production
+        self.mempool: typing.Deque[PendingTransaction] = deque()
+        # the ledger with the mempool applied, transactions are validated against it on submission
+        self._mempool_ledger: Optional[MockFrostApi] = None
+        self.latest_block = GENESIS_BLOCK
+        self.block_stats = BlockStatistics()
 
     # these functions are convenience functions and for manipulating the state of the mock chain
 
@@ -172,17 +395,239 @@ class MockFrostApi:
         return self._last_block_slot
 
     def set_block_slot(self, slot: int):
+        """
+        Move the chain to the slot, ending with a block at that slot.
+        In block production mode, blocks are produced at the slots in between until the mempool is empty.
+        """
+        if slot == self._last_block_slot:
+            return
+        if self.block_production:
+            for s in range(self._last_block_slot + 1, slot):
+                if not self.mempool:
+                    break
+                self._produce_block(s)
+        self._produce_block(slot)
+
+    def _produce_block(self, slot: int):
+        """Produce a block at the slot from the transactions in the mempool that are still valid and fit"""
         self._last_block_slot = slot
         self._epoch = self._last_block_slot // self._genesis_param.epoch_length
+        block = next_block(self.latest_block, slot)
+        included = []
+        full = False
+        while self.mempool:
+            pending = self.mempool[0]
+            if not pending.fits(block, self.protocol_param):
+                if included:
+                    full = True
+                    break
+                # does not even fit into an empty block
+                self.mempool.popleft()
+                self.block_stats.dropped_transactions += 1
+                continue
+            self.mempool.popleft()
+            try:
+                if self.phase1_validation:
+                    # the signatures were verified when the transaction entered the mempool
+                    validate_transaction(
+                        pending.tx,
+                        NativeMockChainContext(self),
+                        self._utxo_state,
+                        pending.cbor,
+                    )
+                self.submit_tx_mock(pending.tx)
+            except (ValidationException, AssertionError):
+                self.block_stats.dropped_transactions += 1
+                continue
+            included.append(pending)
+            block = next_block(self.latest_block, slot, tuple(included))
+        self._mempool_ledger = None
+        self._add_block(block, full)
+
+    def _add_block(self, block: Block, full: bool = False):
+        self.latest_block = block
+        self.block_stats.add(block, full)
+
+    def _mempool_ledger_api(self) -> "MockFrostApi":
+        """The ledger with all transactions of the mempool applied"""
+        if self._mempool_ledger is None:
+            ledger = self.fork()
+            ledger.block_production = False
+            ledger.mempool = deque()
+            # evaluations are only reused if the inputs resolve to the same UTxOs
+            ledger._evaluations = self._evaluations
+            for pending in self.mempool:
+                ledger.submit_tx_mock(pending.tx)
+            self._mempool_ledger = ledger
+        return self._mempool_ledger
+
+    def block_statistics(self) -> dict:
+        """Throughput and execution unit utilisation of the produced blocks, see BlockStatistics"""
+        return {
+            **self.block_stats.to_json(self.protocol_param),
+            "mempool": len(self.mempool),
+        }
+
+    def snapshot(self) -> LedgerSnapshot:
+        """
+        Capture the current state of the ledger.
+        UTxOs and scripts are shared copy-on-write, so this is cheap even for large ledgers.
+        """
+        return LedgerSnapshot(
+            utxos=self._utxo_state.fork(),
+            scripts=self._scripts.fork(),
+            pool_delegators=copy.deepcopy(self._pool_delegators),
+            accounts=copy.deepcopy(self._accounts),
+            reward_account=copy.deepcopy(self._reward_account),
+            epoch=self._epoch,
+            last_block_slot=self._last_block_slot,
+            random_state=self.random.getstate(),
+            latest_block=self.latest_block,
+            block_statistics=copy.copy(self.block_stats),
+            mempool=tuple(self.mempool),
+        )
+
+    def restore(self, snapshot: LedgerSnapshot):
+        """Reset the ledger to a snapshot. The snapshot may be restored again later."""
+        self._utxo_state = snapshot.utxos.fork()
+        self._scripts = snapshot.scripts.fork()
+        self._pool_delegators = copy.deepcopy(snapshot.pool_delegators)
+        self._accounts = copy.deepcopy(snapshot.accounts)
+        self._reward_account = copy.deepcopy(snapshot.reward_account)
+        self._epoch = snapshot.epoch
+        self._last_block_slot = snapshot.last_block_slot
+        self.random = random.Random()
+        self.random.setstate(snapshot.random_state)
+        self.latest_block = snapshot.latest_block
+        self.block_stats = copy.copy(snapshot.block_statistics)
+        self.mempool = deque(snapshot.mempool)
+        self._mempool_ledger = None
+
+    def fork(self) -> "MockFrostApi":
+        """
+        Create an independent copy of this mock chain.
+        The copy shares all unchanged UTxOs and scripts with this chain.
+        """
+        api = copy.copy(self)
+        api._evaluations = OrderedDict()
+        api._opshin_programs = dict(self._opshin_programs)
+        api.restore(self.snapshot())
+        return api
+
+    def estimated_size(self) -> int:
+        """Rough estimate of the memory used by this chain in bytes"""
+        return self.estimated_chain_bytes + self.estimated_utxo_bytes * (
+            len(self._utxo_state) + len(self.mempool)
+        )
+
+    def dumps(self) -> bytes:
+        """
+        Serialize the chain compactly: the ledger, the mempool, the parameters and the settings.
+
+        The evaluator, memoized evaluations, opshin_scripts and OpShin sources are not included,
+        pass them to loads again if needed.
+        """
+        state = {
+            "version": STATE_FORMAT_VERSION,
+            "protocol_param": asdict(self._protocol_param),
+            "genesis_param": asdict(self._genesis_param),
+            "settings": {
+                "strict_evaluation": self.strict_evaluation,
+                "opshin_sample_rate": self.opshin_sample_rate,
+                "phase1_validation": self.phase1_validation,
+                "verify_signatures": self.verify_signatures,
+                "block_production": self.block_production,
+                "flamegraph_directory": self.flamegraph_directory,
+            },
+            "utxos": self._utxo_state.dump(),
+            "scripts": [
+                (
+                    h.payload,
+                    type(script).__name__,
+                    (
+                        script.to_cbor()
+                        if isinstance(script, NativeScript)
+                        else bytes(script)
+                    ),
+                )
+                for h, script in self._scripts.items()
+            ],
+            "pool_delegators": self._pool_delegators,
+            "accounts": self._accounts,
+            "reward_account": self._reward_account,
+            "epoch": self._epoch,
+            "last_block_slot": self._last_block_slot,
+            "random_state": self.random.getstate(),
+            "sample_random_state": self._sample_random.getstate(),
+            "divergences": self.divergences,
+            "latest_block": self.latest_block,
+            "block_statistics": self.block_stats,
+            "mempool": [p.cbor for p in self.mempool],
+        }
+        return zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+    @classmethod
+    def loads(cls, data: bytes, **kwargs) -> "MockFrostApi":
+        """
+        Restore a chain serialized with dumps.
+
+        Args:
+            data: The serialized chain.
+            kwargs: Further arguments of the constructor, e.g. the evaluator.
+        """
+        state = pickle.loads(zlib.decompress(data))
+        assert (
+            state["version"] == STATE_FORMAT_VERSION
+        ), f"Unsupported state format version {state['version']}"
+        api = cls(
+            protocol_param=ProtocolParameters(**state["protocol_param"]),
+            genesis_param=GenesisParameters(**state["genesis_param"]),
+            **{**state["settings"], **kwargs},
+        )
+        api._utxo_state = UTxOStore.load(state["utxos"])
+        for h, kind, script in state["scripts"]:
+            if kind in _PLUTUS_SCRIPT_TYPES:
+                script = _PLUTUS_SCRIPT_TYPES[kind](script)
+            else:
+                script = NativeScript.from_cbor(script)
+            api._scripts[ScriptHash(h)] = script
+        api._pool_delegators = state["pool_delegators"]
+        api._accounts = state["accounts"]
+        api._reward_account = state["reward_account"]
+        api._epoch = state["epoch"]
+        api._last_block_slot = state["last_block_slot"]
+        api.random.setstate(state["random_state"])
+        api._sample_random.setstate(state["sample_random_state"])
+        api.divergences = state["divergences"]
+        api.latest_block = state["latest_block"]
+        api.block_stats = state["block_statistics"]
+        api.mempool = deque(
+            PendingTransaction.from_transaction(Transaction.from_cbor(cbor), cbor)
+            for cbor in state["mempool"]
+        )
+        return api
+
+    def register_opshin_source(self, script: ScriptType, source: OpshinSource):
+        """
+        Register the OpShin source code of a script to attribute its cost to the source functions,
+        see source_profile_tx and flamegraph_directory.
+        """
+        program = source.compile()
+        if uplc.flatten(program) != bytes(script):
+            raise ValueError(
+                f"{source.filename} does not compile to the registered script, "
+                "check the OpShin version, compiler options and parameters"
+            )
+        self._opshin_programs[bytes(script)] = (
+            pathlib.Path(source.filename).name,
+            program,
+        )
 
     def _utxos(self, address: str | Address) -> List[UTxO]:
-        return self._utxo_state.get(str(address), [])
+        return self._utxo_state.address_utxos(address)
 
-    def add_utxo(self, utxo: UTxO):
-        address = str(utxo.output.address)
-        self._utxo_state[address].append(utxo)
-        self._address_lookup[utxo.input] = address
-        self._utxo_from_txid[utxo.input.transaction_id][utxo.input.index] = utxo
+    def add_utxo(self, utxo: UTxO, datum_h: Optional[DatumHash] = None):
+        self._utxo_state.add(utxo, datum_h)
         # TODO properly determine the script type
         if utxo.output.script:
             self._scripts[script_hash(utxo.output.script)] = utxo.output.script
@@ -201,25 +646,102 @@ class MockFrostApi:
         return utxo.input
 
     def get_address(self, utxo: TransactionInput) -> str:
-        return self._address_lookup[utxo]
+        return self._utxo_state.address_of(utxo)
 
     def remove_txi(self, txi: TransactionInput):
-        del self._utxo_from_txid[txi.transaction_id][txi.index]
-        address = self._address_lookup[txi]
-        del self._address_lookup[txi]
-        i = [
-            i for i, utxo in enumerate(self._utxo_state[address]) if utxo.input == txi
-        ][0]
-        self._utxo_state[address].pop(i)
+        self._utxo_state.remove(txi)
 
     def remove_utxo(self, utxo: UTxO):
         self.remove_txi(utxo.input)
 
-    def submit_tx(self, tx: Transaction):
-        self.evaluate_tx(tx)
-        self.submit_tx_mock(tx)
+    def submit_tx(
+        self, tx: Transaction, dry_run: bool = False, cbor: Optional[bytes] = None
+    ) -> LedgerJournal:
+        """
+        Validate the transaction, evaluate its scripts and apply it to the ledger.
+        In block production mode, the transaction is validated against the ledger with the mempool applied
+        and added to the mempool instead.
+
+        Args:
+            tx: The transaction to submit.
+            dry_run: If set, do not commit the changes, see submit_tx_mock.
+            cbor: The transaction as submitted, defaults to its serialization.
+                Decoding and encoding a transaction does not always preserve its size and body hash.
+        """
+        if cbor is None:
+            cbor = tx.to_cbor()
+        if self.block_production and not dry_run:
+            journal = self._mempool_ledger_api().submit_tx(tx, cbor=cbor)
+            self.mempool.append(PendingTransaction.from_transaction(tx, cbor))
+            return journal
+        if self.phase1_validation:
+            validate_transaction(
+                tx,
+                NativeMockChainContext(self),
+                self._utxo_state,
+                cbor,
+                self.signature_verifier if self.verify_signatures else None,
+            )
+        tx_datums = TransactionDatums.from_transaction(tx)
+        if self.strict_evaluation or not self._reuse_evaluation(tx):
+            self.evaluate_tx(tx, tx_datums)
+        journal = self.submit_tx_mock(tx, dry_run=dry_run, tx_datums=tx_datums)
+        if not dry_run:
+            self._add_block(
+                next_block(
+                    self.latest_block,
+                    self._last_block_slot,
+                    (PendingTransaction.from_transaction(tx, cbor),),
+                )
+            )
+        return journal
+
+    def submit_txs(
+        self, txs: List[Transaction], cbors: Optional[List[bytes]] = None
+    ) -> List[LedgerJournal]:
+        """
+        Submit transactions one after the other.
+
+        The signatures of all transactions are verified in one batch before the first transaction is applied.
+        Transactions are applied until the first one fails, which raises like submit_tx.
+
+        Args:
+            txs: The transactions to submit, in order.
+            cbors: The transactions as submitted, see submit_tx.
+        """
+        if cbors is None:
+            cbors = [tx.to_cbor() for tx in txs]
+        assert len(cbors) == len(txs), "Expected one serialization per transaction"
+        if self.phase1_validation and self.verify_signatures:
+            # invalid signatures are not remembered, the transaction fails when it is submitted
+            self.signature_verifier.verify(
+                signature
+                for tx, cbor in zip(txs, cbors)
+                for signature in vkey_signatures(tx, body_hash(cbor))
+            )
+        return [self.submit_tx(tx, cbor=cbor) for tx, cbor in zip(txs, cbors)]
+
+    def submit_tx_mock(
+        self,
+        tx: Transaction,
+        dry_run: bool = False,
+        tx_datums: Optional[TransactionDatums] = None,
+    ) -> LedgerJournal:
+        """
+        Apply the transaction to the ledger without evaluating its scripts.
+
+        All changes are staged in a journal and only committed once the whole transaction was processed,
+        so a failing transaction leaves the ledger untouched.
+
+        Args:
+            tx: The transaction to apply.
+            dry_run: If set, do not commit the changes. The returned journal shows what the transaction would change.
+            tx_datums: The hashed datums of the transaction, if they were already computed.
+
+        Returns:
+            The journal of changes made by the transaction.
+        """
 
-    def submit_tx_mock(self, tx: Transaction):
         def is_witnessed(
             address: Union[bytes, pycardano.Address],
             witness_set: pycardano.TransactionWitnessSet,
@@ -241,45 +763,55 @@ class MockFrostApi:
                     "Only ScriptHash is currently supported for address staking_part"
                 )
 
+        if tx_datums is None:
+            tx_datums = TransactionDatums.from_transaction(tx)
+        journal = LedgerJournal(self)
         for input in tx.transaction_body.inputs:
-            utxo = self.get_utxo_from_txid(input.transaction_id, input.index)
-            self.remove_utxo(utxo)
+            journal.remove_txi(input)
         for i, output in enumerate(tx.transaction_body.outputs):
             utxo = UTxO(TransactionInput(tx.id, i), output)
-            self.add_utxo(utxo)
+            journal.add_utxo(utxo, tx_datums.outputs[i])
+        for datum_h, datum in tx_datums.witness.items():
+            journal.add_datum(datum_h, datum)
         for certificate in tx.transaction_body.certificates or []:
             if isinstance(certificate, pycardano.StakeRegistration):
                 reward_address = pycardano.Address(
                     staking_part=certificate.stake_credential.credential,
                     network=self.network,
                 ).encode()
-                if reward_address in self._reward_account:
+                account = journal.get_reward_account(reward_address)
+                if account is not None:
                     assert (
-                        self._reward_account["registered_stake"] == False
+                        account["registered_stake"] == False
                     ), f"Stake key is already registered. Reward address: {reward_address}"
-                    self._reward_account[reward_address]["registered_stake"] = True
+                    journal.update_reward_account(reward_address)[
+                        "registered_stake"
+                    ] = True
                 else:
-                    self._reward_account[reward_address] = {
-                        "registered_stake": True,
-                        "delegation": {"pool_id": None, "rewards": 0},
-                    }
+                    journal.set_reward_account(
+                        reward_address,
+                        {
+                            "registered_stake": True,
+                            "delegation": {"pool_id": None, "rewards": 0},
+                        },
+                    )
             elif isinstance(certificate, pycardano.StakeDelegation):
                 reward_address = pycardano.Address(
                     staking_part=certificate.stake_credential.credential,
                     network=self.network,
                 ).encode()
                 assert (
-                    reward_address in self._reward_account
+                    journal.get_reward_account(reward_address) is not None
                 ), f"Stake key is not registered. Reward address: {reward_address}"
                 pool_id = PoolId(encode("pool", bytes(certificate.pool_keyhash)))
-                assert (
-                    str(pool_id) in self._pool_delegators
+                assert journal.pool_exists(
+                    str(pool_id)
                 ), f"Pool not found, PoolId: {pool_id}"
-                self._reward_account[reward_address]["delegation"]["pool_id"] = str(
-                    pool_id
-                )
-                self._pool_delegators[str(pool_id)].append(
-                    certificate.stake_credential.credential
+                journal.update_reward_account(reward_address)["delegation"][
+                    "pool_id"
+                ] = str(pool_id)
+                journal.add_pool_delegator(
+                    str(pool_id), certificate.stake_credential.credential
                 )
         for address in tx.transaction_body.withdraws or {}:
             value = tx.transaction_body.withdraws[address]
@@ -287,19 +819,25 @@ class MockFrostApi:
             assert is_witnessed(
                 stake_address, tx.transaction_witness_set
             ), f"Withdrawal from address {stake_address} is not witnessed"
-            assert (
-                str(stake_address) in self._reward_account
-            ), "Address {stake_address} not registered"
-            rewards = self._reward_account[str(stake_address)]["delegation"]["rewards"]
+            account = journal.get_reward_account(str(stake_address))
+            assert account is not None, f"Address {stake_address} not registered"
+            rewards = account["delegation"]["rewards"]
             assert (
                 rewards == value
-            ), "All rewards must be withdrawn. Requested {value} but account contains {rewards}"
-            self._reward_account[str(stake_address)]["delegation"]["rewards"] == 0
+            ), f"All rewards must be withdrawn. Requested {value} but account contains {rewards}"
+            journal.update_reward_account(str(stake_address))["delegation"][
+                "rewards"
+            ] = 0
+        if not dry_run:
+            journal.commit()
+        return journal
 
     def submit_tx_cbor(self, cbor: Union[bytes, str]):
-        return self.submit_tx(Transaction.from_cbor(cbor))
+        if isinstance(cbor, str):
+            cbor = bytes.fromhex(cbor)
+        return self.submit_tx(Transaction.from_cbor(cbor), cbor=cbor)
 
-    def evaluate_tx(self, tx: Transaction) -> Dict[str, ExecutionUnits]:
+    def _resolve_inputs(self, tx: Transaction) -> Tuple[List[UTxO], List[UTxO]]:
         input_utxos = [
             self.get_utxo_from_txid(input.transaction_id, input.index)
             for input in tx.transaction_body.inputs
@@ -312,43 +850,302 @@ class MockFrostApi:
             if tx.transaction_body.reference_inputs is not None
             else []
         )
-        script_invocations = generate_script_contexts_resolved(
-            tx, input_utxos, ref_input_utxos, lambda s: self.posix_from_slot(s)
+        return input_utxos, ref_input_utxos
+
+    def _evaluation_key(self, tx: Transaction) -> Tuple[TransactionId, bytes, int]:
+        # the body hash does not cover the scripts in the witness set
+        witness_hash = hashlib.sha256(tx.transaction_witness_set.to_cbor()).digest()
+        return tx.id, witness_hash, self._last_block_slot
+
+    def _reuse_evaluation(self, tx: Transaction) -> bool:
+        """
+        Reuse the outcome of evaluating the same transaction at the same slot
+        if all its inputs still resolve to the same UTxOs.
+        Raises the original error if that evaluation failed.
+        """
+        memoized = self._evaluations.get(self._evaluation_key(tx))
+        if memoized is None:
+            return False
+        resolved, outcome = memoized
+        try:
+            input_utxos, ref_input_utxos = self._resolve_inputs(tx)
+        except KeyError:
+            return False
+        if len(resolved) != len(input_utxos) + len(ref_input_utxos) or any(
+            a is not b for a, b in zip(resolved, input_utxos + ref_input_utxos)
+        ):
+            return False
+        if isinstance(outcome, Exception):
+            raise outcome
+        return True
+
+    def evaluate_tx(
+        self, tx: Transaction, tx_datums: Optional[TransactionDatums] = None
+    ) -> Dict[str, ExecutionUnits]:
+        input_utxos, ref_input_utxos = self._resolve_inputs(tx)
+        key = self._evaluation_key(tx)
+        try:
+            ret = self._evaluate_resolved(tx, input_utxos, ref_input_utxos, tx_datums)
+        except Exception as e:
+            self._memoize_evaluation(key, input_utxos + ref_input_utxos, e)
+            raise
+        self._memoize_evaluation(key, input_utxos + ref_input_utxos, ret)
+        return ret
+
+    def _memoize_evaluation(
+        self,
+        key: Tuple[TransactionId, bytes, int],
+        resolved: List[UTxO],
+        outcome: Union[Dict[str, ExecutionUnits], Exception],
+    ):
+        # single dict operations, as concurrent requests of the server evaluate on the same chain
+        self._evaluations.pop(key, None)
+        self._evaluations[key] = (resolved, outcome)
+        while len(self._evaluations) > self.max_memoized_evaluations:
+            self._evaluations.popitem(last=False)
+
+    def _evaluate_resolved(
+        self,
+        tx: Transaction,
+        input_utxos: List[UTxO],
+        ref_input_utxos: List[UTxO],
+        tx_datums: Optional[TransactionDatums] = None,
+    ) -> Dict[str, ExecutionUnits]:
+        plan = self._evaluation_plan(tx, input_utxos, ref_input_utxos, tx_datums)
+        return self._evaluation_outcome(
+            tx, plan, self.evaluator.evaluate(uplc_invocations(plan))
         )
+
+    def _evaluation_plan(
+        self,
+        tx: Transaction,
+        input_utxos: List[UTxO],
+        ref_input_utxos: List[UTxO],
+        tx_datums: Optional[TransactionDatums] = None,
+    ) -> List[PlannedInvocation]:
+        """Script invocations of the transaction, with their native validator and whether they are sampled"""
+        script_invocations = self._script_invocations(
+            tx, input_utxos, ref_input_utxos, tx_datums
+        )
+        if self.flamegraph_directory is not None:
+            self._write_flamegraphs(tx, script_invocations)
+        plan = []
+        for invocation in script_invocations:
+            validator = self.opshin_scripts.get(invocation.script)
+            # invocations run natively and also as UPLC
+            sample = (
+                validator is not None
+                and self._sample_random.random() < self.opshin_sample_rate
+            )
+            plan.append((invocation, validator, sample))
+        return plan
+
+    def _evaluation_outcome(
+        self,
+        tx: Transaction,
+        plan: List[PlannedInvocation],
+        uplc_results: typing.Iterator[EvaluationResult],
+    ) -> Dict[str, ExecutionUnits]:
+        """Combine the native evaluations with the results of the invocations evaluated as UPLC"""
         ret = {}
+        for invocation, validator, sample in plan:
+            redeemer = invocation.redeemer
+            key = redeemer_key(redeemer)
+            if validator is not None:
+                native_error, _, native_logs = evaluate_native(validator, invocation)
+            if validator is None or sample:
+                error, (cpu, mem), logs = next(uplc_results)
+            else:
+                error, (cpu, mem), logs = native_error, (0, 0), native_logs
+            if sample and (native_error is None) != (error is None):
+                self._flag_divergence(
+                    EvaluationDivergence(tx.id, key, native_error, error)
+                )
+            if error is not None:
+                raise ExecutionException(
+                    f"Error while evaluating script: {error}", logs=logs
+                )
+            ret[key] = ExecutionUnits(mem, cpu)
+        return ret
+
+    def _flag_divergence(self, divergence: EvaluationDivergence):
+        self.divergences.append(divergence)
+        warnings.warn(
+            f"Native and UPLC evaluation of {divergence.redeemer} in transaction {divergence.transaction_id} diverge: "
+            f"native error {divergence.native_error!r}, UPLC error {divergence.uplc_error!r}",
+            EvaluationDivergenceWarning,
+        )
+
+    def _script_invocations(
+        self,
+        tx: Transaction,
+        input_utxos: List[UTxO],
+        ref_input_utxos: List[UTxO],
+        tx_datums: Optional[TransactionDatums] = None,
+    ) -> List[ScriptInvocation]:
+        """Script invocations of the transaction, with the maximum budget where the redeemer sets none"""
+        script_invocations = generate_script_contexts_resolved(
+            tx,
+            input_utxos,
+            ref_input_utxos,
+            lambda s: self.posix_from_slot(s),
+            {
+                u.input: self._utxo_state.datum_hash(u.input)
+                for u in input_utxos + ref_input_utxos
+                if u.output.datum is not None
+            },
+            tx_datums,
+        )
         for invocation in script_invocations:
-            # run opshin script if available
-            if self.opshin_scripts.get(invocation.script) is not None:
-                raise NotImplementedError("This code never seems to be reached")
-                opshin_validator = self.opshin_scripts[invocation.script]
-                evaluate_opshin_validator(opshin_validator, invocation)
             redeemer = invocation.redeemer
             if redeemer.ex_units.steps <= 0 and redeemer.ex_units.mem <= 0:
+                # copy, the redeemer may be shared with the caller's transaction
+                redeemer = invocation.redeemer = copy.copy(redeemer)
                 redeemer.ex_units = ExecutionUnits(
                     self.protocol_param.max_tx_ex_mem,
                     self.protocol_param.max_tx_ex_steps,
                 )
+        return script_invocations
 
-            res, (cpu, mem), logs = evaluate_script(invocation)
-            if isinstance(res, Exception):
-                raise ExecutionException(
-                    f"Error while evaluating script: {res}", logs=logs
-                )
-            key = f"{redeemer.tag.name.lower()}:{redeemer.index}"
-            ret[key] = ExecutionUnits(mem, cpu)
+    def profile_tx(self, tx: Transaction) -> Dict[str, CostProfile]:
+        """
+        Evaluate the scripts of the transaction and break their cost down by builtin and machine step.
+
+        Unlike evaluate_tx, failing scripts do not raise, their profile contains the error.
+        """
+        input_utxos, ref_input_utxos = self._resolve_inputs(tx)
+        data_cache = {}
+        ret = {}
+        for invocation in self._script_invocations(tx, input_utxos, ref_input_utxos):
+            redeemer = invocation.redeemer
+            ret[redeemer_key(redeemer)] = profile_uplc(
+                uplc_unflat(invocation.script),
+                uplc_arguments(invocation, data_cache),
+                redeemer.ex_units.steps,
+                redeemer.ex_units.mem,
+            )
         return ret
 
+    def source_profile_tx(self, tx: Transaction) -> Dict[str, SourceProfile]:
+        """
+        Evaluate the scripts of the transaction with registered OpShin source
+        and attribute their cost to the source functions.
+        """
+        input_utxos, ref_input_utxos = self._resolve_inputs(tx)
+        return self._source_profiles(
+            self._script_invocations(tx, input_utxos, ref_input_utxos)
+        )
+
+    def _source_profiles(
+        self, script_invocations: List[ScriptInvocation]
+    ) -> Dict[str, SourceProfile]:
+        data_cache = {}
+        ret = {}
+        for invocation in script_invocations:
+            registered = self._opshin_programs.get(bytes(invocation.script))
+            if registered is None:
+                continue
+            root, program = registered
+            redeemer = invocation.redeemer
+            ret[redeemer_key(redeemer)] = profile_source(
+                program,
+                uplc_arguments(invocation, data_cache),
+                redeemer.ex_units.steps,
+                redeemer.ex_units.mem,
+                root=root,
+            )
+        return ret
+
+    def _write_flamegraphs(
+        self, tx: Transaction, script_invocations: List[ScriptInvocation]
+    ):
+        directory = pathlib.Path(self.flamegraph_directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for key, profile in self._source_profiles(script_invocations).items():
+            profile.write(directory / f"{tx.id}.{key.replace(':', '_')}.folded")
+
+    def profile_tx_cbor(self, cbor: Union[bytes, str]) -> Dict[str, CostProfile]:
+        if isinstance(cbor, str):
+            cbor = bytes.fromhex(cbor)
+        return self.profile_tx(Transaction.from_cbor(cbor))
+
     def evaluate_tx_cbor(self, cbor: Union[bytes, str]) -> Dict[str, ExecutionUnits]:
         if isinstance(cbor, str):
             cbor = bytes.fromhex(cbor)
         return self.evaluate_tx(Transaction.from_cbor(cbor))
 
+    def evaluate_txs(
+        self,
+        txs: List[Transaction],
+        evaluator: Optional[ScriptEvaluator] = None,
+    ) -> List[Union[Dict[str, ExecutionUnits], Exception]]:
+        """
+        Evaluate several transactions against the current ledger, each like evaluate_tx.
+
+        The script invocations of all transactions are passed to the evaluator at once,
+        so they share the conversion of datums and redeemers
+        and a ProcessPoolEvaluator evaluates them all in parallel.
+
+        Args:
+            txs: The transactions to evaluate.
+            evaluator: Evaluates the scripts of the batch, defaults to the evaluator of the chain.
+
+        Returns:
+            The execution units of every transaction, or the exception its evaluation raised.
+        """
+        if evaluator is None:
+            evaluator = self.evaluator
+        outcomes: List[Union[Dict[str, ExecutionUnits], Exception, None]] = []
+        plans = []
+        for tx in txs:
+            try:
+                input_utxos, ref_input_utxos = self._resolve_inputs(tx)
+                plan = self._evaluation_plan(tx, input_utxos, ref_input_utxos)
+            except Exception as e:
+                outcomes.append(e)
+                continue
+            outcomes.append(None)
+            plans.append((len(outcomes) - 1, tx, input_utxos + ref_input_utxos, plan))
+        uplc_results = iter(
+            list(
+                evaluator.evaluate(
+                    [i for _, _, _, plan in plans for i in uplc_invocations(plan)]
+                )
+            )
+        )
+        for position, tx, resolved, plan in plans:
+            results = itertools.islice(uplc_results, len(uplc_invocations(plan)))
+            try:
+                outcome = self._evaluation_outcome(tx, plan, iter(list(results)))
+            except Exception as e:
+                outcome = e
+            self._memoize_evaluation(self._evaluation_key(tx), resolved, outcome)
+            outcomes[position] = outcome
+        return outcomes
+
+    def evaluate_txs_cbor(
+        self,
+        cbors: List[Union[bytes, str]],
+        evaluator: Optional[ScriptEvaluator] = None,
+    ) -> List[Union[Dict[str, ExecutionUnits], Exception]]:
+        """Like evaluate_txs, transactions that can not be decoded fail with the decoding error"""
+        txs = []
+        failed = {}
+        for i, cbor in enumerate(cbors):
+            try:
+                if isinstance(cbor, str):
+                    cbor = bytes.fromhex(cbor)
+                txs.append(Transaction.from_cbor(cbor))
+            except Exception as e:
+                failed[i] = e
+        outcomes = iter(self.evaluate_txs(txs, evaluator))
+        return [failed[i] if i in failed else next(outcomes) for i in range(len(cbors))]
+
     def get_utxo_from_txid(self, transaction_id: TransactionId, index: int) -> UTxO:
-        return self._utxo_from_txid[transaction_id][index]
+        return self._utxo_state.get(TransactionInput(transaction_id, index))
 
     def wait(self, slots):
-        self._last_block_slot += slots
-        self._epoch = self._last_block_slot // self._genesis_param.epoch_length
+        self.set_block_slot(self._last_block_slot + slots)
 
     def posix_from_slot(self, slot: int) -> int:
         """Convert a slot to POSIX time (seconds)"""
@@ -364,13 +1161,8 @@ class MockFrostApi:
         self._pool_delegators[pool_id] = []
 
     def get_controlled_amount(self, stake_address: str):
-        total = 0
         credential = pycardano.Address.from_primitive(stake_address).staking_part
-        for address, utxos in self._utxo_state.items():
-            staking_part = pycardano.Address.from_primitive(address).staking_part
-            if staking_part == credential:
-                for utxo in utxos:
-                    total += utxo.output.amount.coin
+        total = self._utxo_state.stake_lovelace(credential)
         total += self._reward_account[stake_address]["delegation"]["rewards"]
         return total
 
@@ -409,23 +1201,24 @@ class MockFrostApi:
 
     @request_wrapper
     def block_latest(self, **kwargs):
+        block = self.latest_block
         return {
-            "time": self.posix_from_slot(self.last_block_slot),
-            "height": self.last_block_slot,
-            "hash": "4ea1ba291e8eef538635a53e59fddba7810d1679631cc3aed7c8e6c4091a516a",
-            "slot": self.last_block_slot,
-            "epoch": self.epoch,
-            "epoch_slot": self.last_block_slot % self.genesis_param.epoch_length,
+            "time": self.posix_from_slot(block.slot),
+            "height": block.height,
+            "hash": block.hash,
+            "slot": block.slot,
+            "epoch": block.slot // self.genesis_param.epoch_length,
+            "epoch_slot": block.slot % self.genesis_param.epoch_length,
             "slot_leader": "pool1pu5jlj4q9w9jlxeu370a3c9myx47md5j5m2str0naunn2qnikdy",
-            "size": 0,
-            "tx_count": 0,
-            "output": 0,
-            "fees": 0,
+            "size": block.size,
+            "tx_count": len(block.transactions),
+            "output": str(block.output),
+            "fees": str(block.fees),
             "block_vrf": "vrf_vk1wf2k6lhujezqcfe00l6zetxpnmh9n6mwhpmhm0dvfh3fxgmdnrfqkms8ty",
             "op_cert": "da905277534faf75dae41732650568af545134ee08a3c0392dbefc8096ae177c",
             "op_cert_counter": 0,
-            "previous_block": "4ea1ba291e8eef538635a53e59fddba7810d1679631cc3aed7c8e6c4091a516a",
-            "next_block": "4ea1ba291e8eef538635a53e59fddba7810d1679631cc3aed7c8e6c4091a516a",
+            "previous_block": block.previous_block,
+            "next_block": None,
             "confirmations": 0,
         }
 
@@ -498,10 +1291,20 @@ class MockFrostApi:
             raise ValueError("Script not found")
         return {"json": self._scripts[script_hash].to_dict()}
 
+    @request_wrapper
+    def script_datum_cbor(self, datum_hash: str, **kwargs):
+        try:
+            datum = self._utxo_state.datum(DatumHash(bytes.fromhex(datum_hash)))
+        except KeyError:
+            raise ValueError("Datum not found")
+        return {"cbor": datum_to_cbor(datum).hex()}
+
     @request_wrapper
     def address_utxos(self, address: str, **kwargs):
         l = []
-        for utxo in self._utxos(address):
+        # inline datums are already serialized in the store
+        for utxo in self._utxo_state.address_utxos(address, serialized_datums=True):
+            data_hash = self._utxo_state.datum_hash(utxo.input)
             amount_list = [
                 {
                     "unit": "lovelace",
@@ -525,18 +1328,10 @@ class MockFrostApi:
                     "amount": amount_list,
                     "block": "4ea1ba291e8eef538635a53e59fddba7810d1679631cc3aed7c8e6c4091a516a",
                     "data_hash": (
-                        datum_hash(utxo.output.datum).payload.hex()
-                        if utxo.output.datum
-                        else (
-                            utxo.output.datum_hash.payload.hex()
-                            if utxo.output.datum_hash
-                            else None
-                        )
+                        data_hash.payload.hex() if data_hash is not None else None
                     ),
                     "inline_datum": (
-                        datum_to_cbor(utxo.output.datum).hex()
-                        if utxo.output.datum
-                        else None
+                        utxo.output.datum.cbor.hex() if utxo.output.datum else None
                     ),
                     "reference_script_hash": (
                         utxo.output.script.hash().payload.hex()
@@ -551,7 +1346,7 @@ class MockFrostApi:
     @request_wrapper
     def transaction_submit_raw(self, tx_cbor: bytes, **kwargs):
         tx = Transaction.from_cbor(tx_cbor)
-        self.submit_tx(tx)
+        self.submit_tx(tx, cbor=tx_cbor)
         return tx.id.payload.hex()
 
     def transaction_submit(self, file_path: str, **kwargs):
@@ -563,6 +1358,29 @@ class MockFrostApi:
     def transaction_evaluate_raw(self, tx_cbor: bytes, **kwargs):
         try:
             res = self.evaluate_tx_cbor(tx_cbor)
+        except Exception as e:
+            return evaluation_json(e)
+        return evaluation_json(res)
+
+    @request_wrapper
+    def transaction_evaluate_batch_raw(
+        self,
+        tx_cbors: List[bytes],
+        evaluator: Optional[ScriptEvaluator] = None,
+        **kwargs,
+    ):
+        """Like transaction_evaluate_raw for every transaction, see evaluate_txs"""
+        return [
+            evaluation_json(res) for res in self.evaluate_txs_cbor(tx_cbors, evaluator)
+        ]
+
+    @request_wrapper
+    def transaction_profile_raw(self, tx_cbor: bytes, **kwargs):
+        """
+        Like transaction_evaluate_raw, with the cost of every script broken down by builtin and machine step
+        """
+        try:
+            res = self.profile_tx_cbor(tx_cbor)
         except Exception as e:
             return {
                 "result": {
@@ -570,16 +1388,24 @@ class MockFrostApi:
                     "Trace": traceback.format_exception(e),
                 }
             }
-        return {
-            "result": {
+        failed = {k: p.error for k, p in res.items() if p.error is not None}
+        if failed:
+            evaluation = {"EvaluationFailure": failed}
+        else:
+            evaluation = {
                 "EvaluationResult": {
                     k: {
-                        "steps": v.steps,
-                        "memory": v.mem,
+                        "steps": p.cpu,
+                        "memory": p.mem,
                     }
-                    for k, v in res.items()
+                    for k, p in res.items()
                 }
             }
+        return {
+            "result": {
+                **evaluation,
+                "Profile": {k: p.to_json() for k, p in res.items()},
+            }
         }
 
     def transaction_evaluate(self, file_path: str, **kwargs):
@@ -634,6 +1460,68 @@ class MockChainContext(BlockFrostChainContext):
         self._protocol_param = None
 
 
+class NativeMockChainContext(ChainContext):
+    """
+    A chain context that reads directly from a MockFrostApi.
+
+    In contrast to MockChainContext, UTxOs and parameters are taken from the mock ledger as stored,
+    without the round trip through Blockfrost-shaped JSON.
+    The returned UTxOs are shared with the ledger and must not be modified.
+    """
+
+    def __init__(self, api: Optional[MockFrostApi] = None):
+        self.api = api or MockFrostApi()
+
+    @property
+    def protocol_param(self) -> ProtocolParameters:
+        return self.api.protocol_param
+
+    @property
+    def genesis_param(self) -> GenesisParameters:
+        return self.api.genesis_param
+
+    @property
+    def network(self) -> Network:
+        return self.api.network
+
+    @property
+    def epoch(self) -> int:
+        return self.api.epoch
+
+    @property
+    def last_block_slot(self) -> int:
+        return self.api.last_block_slot
+
+    def _utxos(self, address: str) -> List[UTxO]:
+        # chain backends return inline datums in their serialized form
+        return self.api._utxo_state.address_utxos(address, serialized_datums=True)
+
+    def submit_tx_cbor(self, cbor: Union[bytes, str]) -> str:
+        if isinstance(cbor, str):
+            cbor = bytes.fromhex(cbor)
+        tx = Transaction.from_cbor(cbor)
+        try:
+            self.api.submit_tx(tx, cbor=cbor)
+        except Exception as e:
+            raise TransactionFailedException(
+                f"Failed to submit transaction: {e}"
+            ) from e
+        return tx.id.payload.hex()
+
+    def evaluate_tx(self, tx: Transaction) -> Dict[str, ExecutionUnits]:
+        try:
+            return self.api.evaluate_tx(tx)
+        except Exception as e:
+            raise TransactionFailedException(
+                f"Failed to evaluate transaction: {e}"
+            ) from e
+
+    def evaluate_tx_cbor(self, cbor: Union[bytes, str]) -> Dict[str, ExecutionUnits]:
+        if isinstance(cbor, str):
+            cbor = bytes.fromhex(cbor)
+        return self.evaluate_tx(Transaction.from_cbor(cbor))
+
+
 class MockUser:
     def __init__(self, api: MockFrostApi):
         self.api = api
@@ -0,0 +1,143 @@
+import json
+from typing import List, Optional, Tuple
+
+# CBOR break code that ends indefinite length items
+BREAK = 0xFF
+
+
+def _header(data: bytes, pos: int) -> Optional[Tuple[int, Optional[int], int]]:
+    """
+    Major type, argument (None for indefinite length) and end offset of the CBOR item header at pos,
+    None if data ends before the header does.
+    """
+    if pos >= len(data):
+        return None
+    major, info = data[pos] >> 5, data[pos] & 0x1F
+    if info < 24:
+        return major, info, pos + 1
+    if info <= 27:
+        width = 1 << (info - 24)
+        if pos + 1 + width > len(data):
+            return None
+        return (
+            major,
+            int.from_bytes(data[pos + 1 : pos + 1 + width], "big"),
+            pos + 1 + width,
+        )
+    if info == 31 and major in (2, 3, 4, 5):
+        return major, None, pos + 1
+    raise ValueError(f"Invalid CBOR item header {data[pos]:#x}")
+
+
+def _item_end(data: bytes, pos: int) -> Optional[int]:
+    """
+    The offset after the CBOR item that starts at pos, None if data ends before the item does.
+    Only looks at the structure of the item, the item is not decoded.
+    """
+    header = _header(data, pos)
+    if header is None:
+        return None
+    major, argument, pos = header
+    if argument is None:
+        # indefinite length, the items end with a break
+        while pos < len(data):
+            if data[pos] == BREAK:
+                return pos + 1
+            pos = _item_end(data, pos)
+            if pos is None:
+                return None
+        return None
+    if major in (0, 1, 7):
+        return pos
+    if major in (2, 3):
+        return pos + argument if pos + argument <= len(data) else None
+    if major == 6:
+        # the tag content follows
+        return _item_end(data, pos)
+    # arrays and maps
+    for _ in range(argument if major == 4 else 2 * argument):
+        pos = _item_end(data, pos)
+        if pos is None:
+            return None
+    return pos
+
+
+class CBORArrayReader:
+    """
+    Splits a CBOR array that arrives in chunks into the encodings of its items.
+
+    Feed the chunks in order, every call returns the items that were completed by the chunk.
+    Both definite and indefinite length arrays are accepted.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._started = False
+        # items left in a definite length array, None for indefinite length arrays
+        self._remaining: Optional[int] = None
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        self._buffer += chunk
+        items = []
+        pos = 0
+        if not self._started:
+            header = _header(self._buffer, 0)
+            if header is None:
+                return items
+            major, self._remaining, pos = header
+            if major != 4:
+                raise ValueError("Expected a CBOR array")
+            self._started = True
+        while not self.done:
+            if self._remaining == 0:
+                self.done = True
+            elif self._remaining is None and self._buffer[pos : pos + 1] == bytes(
+                [BREAK]
+            ):
+                pos += 1
+                self.done = True
+            else:
+                end = _item_end(self._buffer, pos)
+                if end is None:
+                    break
+                items.append(self._buffer[pos:end])
+                pos = end
+                if self._remaining is not None:
+                    self._remaining -= 1
+        self._buffer = self._buffer[pos:]
+        if self.done and self._buffer:
+            raise ValueError("Unexpected data after the CBOR array")
+        return items
+
+    def close(self) -> List[bytes]:
+        """Check that the whole array was read"""
+        if not self.done:
+            raise ValueError("The CBOR array is incomplete")
+        return []
+
+
+class NDJSONReader:
+    """
+    Splits newline delimited JSON that arrives in chunks into the CBOR encodings of its items,
+    every line is a JSON string with the hex encoded CBOR of one item.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        *lines, self._buffer = (self._buffer + chunk).split(b"\n")
+        return [self._parse(line) for line in lines if line.strip()]
+
+    def close(self) -> List[bytes]:
+        """The item on the last line, if it does not end with a newline"""
+        lines, self._buffer = [self._buffer], b""
+        return [self._parse(line) for line in lines if line.strip()]
+
+    @staticmethod
+    def _parse(line: bytes) -> bytes:
+        value = json.loads(line)
+        if not isinstance(value, str):
+            raise ValueError("Expected a hex encoded CBOR string on every line")
+        return bytes.fromhex(value)
@@ -1,11 +1,13 @@
 import uuid
 from dataclasses import dataclass
-from typing import Union
+from typing import Iterable, Iterator, List, Union
 
 import requests
 from pycardano.pool_params import PoolId
 from pycardano.crypto.bech32 import decode, encode
 from pycardano import (
+    CBORSerializable,
+    Transaction,
     TransactionOutput,
     UTxO,
     TransactionInput,
@@ -21,6 +23,14 @@ from pycardano import (
 from blockfrost import BlockFrostApi
 
 
+def cbor_array(items: Iterable[CBORSerializable]) -> Iterator[bytes]:
+    """Encode the items as indefinite length CBOR array, item by item so the request body is streamed"""
+    yield b"\x9f"
+    for item in items:
+        yield item.to_cbor()
+    yield b"\xff"
+
+
 @dataclass
 class MockFrostSession:
     client: "MockFrostClient"
@@ -32,6 +42,17 @@ class MockFrostSession:
     def delete(self):
         return self.client._del(f"/session/{self.session_id}")
 
+    def clone(self) -> "MockFrostSession":
+        return MockFrostSession(
+            client=self.client,
+            session_id=self.client._post(f"/session/{self.session_id}/clone"),
+        )
+
+    def save_template(self, name: str) -> str:
+        return self.client._put(
+            f"/template/{name}", json={"session_id": self.session_id}
+        )
+
     def add_txout(self, txout: TransactionOutput) -> dict:
         return self.client._post(
             f"/{self.session_id}/ledger/txo", json={"tx_cbor": txout.to_cbor().hex()}
@@ -51,6 +72,39 @@ class MockFrostSession:
             f"/{self.session_id}/ledger/utxo", json={"utxo": utxo.to_cbor().hex()}
         )
 
+    def add_txouts(self, txouts: Iterable[TransactionOutput]) -> List[dict]:
+        """Add many transaction outputs in one request, returns their inputs in order"""
+        return self.client._post(
+            f"/{self.session_id}/ledger/txos",
+            data=cbor_array(txouts),
+            headers={"Content-Type": "application/cbor"},
+        )
+
+    def add_utxos(self, utxos: Iterable[UTxO]) -> List[dict]:
+        """Add many UTxOs in one request, returns their inputs in order"""
+        return self.client._put(
+            f"/{self.session_id}/ledger/utxos",
+            data=cbor_array(utxos),
+            headers={"Content-Type": "application/cbor"},
+        )
+
+    def evaluate_txs(self, txs: List[Transaction], parallel: bool = False) -> list:
+        return self.client._post(
+            f"/{self.session_id}/utils/txs/evaluate/batch",
+            params={"parallel": parallel},
+            json=[tx.to_cbor().hex() for tx in txs],
+        )
+
+    def profile_tx(self, tx: Transaction) -> dict:
+        return self.client._post(
+            f"/{self.session_id}/utils/txs/profile",
+            data=tx.to_cbor().hex(),
+            headers={"Content-Type": "application/cbor"},
+        )
+
+    def block_statistics(self) -> dict:
+        return self.client._get(f"/{self.session_id}/blocks/statistics")
+
     def set_slot(self, slot: int) -> int:
         return self.client._put(f"/{self.session_id}/slot", json={"slot": slot})
 
@@ -100,10 +154,18 @@ class MockFrostClient:
         return self.session.delete(self.base_url + path, **kwargs).json()
 
     def create_session(
-        self, protocol_parameters=None, genesis_parameters=None
+        self,
+        protocol_parameters=None,
+        genesis_parameters=None,
+        verify_signatures=True,
+        block_production=False,
     ) -> MockFrostSession:
         session_id = self._post(
             "/session",
+            params={
+                "verify_signatures": verify_signatures,
+                "block_production": block_production,
+            },
             json={
                 "protocol_parameters": protocol_parameters,
                 "genesis_parameters": genesis_parameters,
@@ -111,6 +173,17 @@ class MockFrostClient:
         )
         return MockFrostSession(client=self, session_id=session_id)
 
+    def create_session_from_template(self, name: str) -> MockFrostSession:
+        return MockFrostSession(
+            client=self, session_id=self._post(f"/template/{name}/session")
+        )
+
+    def templates(self) -> List[str]:
+        return self._get("/template")
+
+    def delete_template(self, name: str) -> bool:
+        return self._del(f"/template/{name}")
+
 
 class MockFrostUser:
     def __init__(self, api: MockFrostSession, network=Network.TESTNET):
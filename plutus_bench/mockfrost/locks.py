@@ -0,0 +1,54 @@
+import asyncio
+import contextlib
+
+
+class ReadWriteLock:
+    """
+    Asyncio lock that admits any number of readers at the same time, but a writer only alone.
+
+    Waiting writers take precedence over new readers, so a session that is polled constantly
+    still gets its transactions submitted.
+    """
+
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @property
+    def idle(self) -> bool:
+        """Whether nobody holds or waits for the lock"""
+        return not (self._readers or self._writing or self._waiting_writers)
+
+    @contextlib.asynccontextmanager
+    async def read(self):
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: not self._writing and not self._waiting_writers
+            )
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def write(self):
+        async with self._condition:
+            self._waiting_writers += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: not self._writing and not self._readers
+                )
+            finally:
+                self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writing = False
+                self._condition.notify_all()
@@ -1,15 +1,19 @@
+import asyncio
+import contextlib
 import dataclasses
 import datetime
+import os
 import tempfile
 import uuid
 
 import fastapi
 import frozendict
-from typing import Dict, Optional, Annotated
+from typing import Callable, Dict, List, Optional, Annotated
 from multiprocessing import Manager
 
 import pycardano
 from fastapi import FastAPI, Body
+from starlette.concurrency import run_in_threadpool
 from pycardano import (
     ProtocolParameters,
     GenesisParameters,
@@ -18,21 +22,74 @@ from pycardano import (
 )
 from pydantic import BaseModel
 
+from plutus_bench.evaluator import ProcessPoolEvaluator
 from plutus_bench.mock import MockFrostApi
+from plutus_bench.mockfrost.bulk import CBORArrayReader, NDJSONReader
+from plutus_bench.mockfrost.store import (
+    MemorySessionStore,
+    Session,
+    SessionStore,
+    SQLiteSessionStore,
+)
 from plutus_bench.protocol_params import (
     DEFAULT_PROTOCOL_PARAMETERS,
     DEFAULT_GENESIS_PARAMETERS,
 )
 
 
-@dataclasses.dataclass
-class Session:
-    chain_state: MockFrostApi
-    creation_time: datetime.datetime
-    last_access_time: datetime.datetime
+# number of worker processes that evaluate the scripts of all sessions,
+# 0 evaluates them in the server process (in a thread, off the event loop)
+EVALUATION_WORKERS = int(os.environ.get("MOCKFROST_EVALUATION_WORKERS", "0"))
+# started on first use, also evaluates batches with parallel set
+EVALUATOR = ProcessPoolEvaluator(max_workers=EVALUATION_WORKERS or None)
+
+# sessions that were not accessed for this many seconds are removed, 0 keeps them forever
+SESSION_TTL = float(os.environ.get("MOCKFROST_SESSION_TTL", "0"))
+# with a database, sessions are kept in SQLite and shared by all worker processes of the server
+SESSION_DATABASE = os.environ.get("MOCKFROST_SESSION_DATABASE")
+
+
+def session_evaluator() -> Optional[ProcessPoolEvaluator]:
+    return EVALUATOR if EVALUATION_WORKERS else None
+
+
+def create_store() -> SessionStore:
+    if SESSION_DATABASE:
+        return SQLiteSessionStore(SESSION_DATABASE, evaluator=session_evaluator())
+    return MemorySessionStore(
+        # limits of the number and the estimated size in bytes of the sessions kept in memory
+        max_sessions=int(os.environ.get("MOCKFROST_MAX_SESSIONS", "0")),
+        max_bytes=int(os.environ.get("MOCKFROST_MAX_SESSION_BYTES", "0")),
+        spill_directory=os.environ.get("MOCKFROST_SPILL_DIRECTORY"),
+        evaluator=session_evaluator(),
+    )
+
+
+STORE = create_store()
+# sessions loaded in this process
+SESSIONS = STORE.sessions
+
+
+def remove_expired_sessions():
+    """Remove the sessions that were not accessed within the TTL"""
+    STORE.remove_expired(
+        datetime.datetime.now() - datetime.timedelta(seconds=SESSION_TTL)
+    )
 
 
-SESSIONS: Dict[uuid.UUID, "Session"] = {}
+async def reap_sessions():
+    while True:
+        await asyncio.sleep(min(SESSION_TTL / 4, 60))
+        remove_expired_sessions()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    reaper = asyncio.create_task(reap_sessions()) if SESSION_TTL else None
+    yield
+    if reaper is not None:
+        reaper.cancel()
+    EVALUATOR.close()
 
 
 class SessionModel(BaseModel):
@@ -64,6 +121,7 @@ There are two variants of this documentation available:
 - [Swagger UI](/docs): A more interactive documentation with a UI.
 - [Redoc](/redoc): A more static documentation with a focus on readability.
 """,
+    lifespan=lifespan,
 )
 from fastapi.responses import RedirectResponse
 
@@ -74,14 +132,18 @@ async def redirect_fastapi():
 
 
 @app.post("/session")
-def create_session(
+async def create_session(
     seed: int = 0,
+    verify_signatures: bool = True,
+    block_production: bool = False,
     protocol_parameters: dict = dataclasses.asdict(DEFAULT_PROTOCOL_PARAMETERS),
     genesis_parameters: dict = dataclasses.asdict(DEFAULT_GENESIS_PARAMETERS),
 ) -> uuid.UUID:
     """
     Create a new session.
     Sets all parameters not specified in protocol and genesis to their default values.
+    Benchmarks that do not care about signatures can disable their verification.
+    With block production, submitted transactions wait in a mempool until the slot is advanced.
     """
     protocol_parameters = frozendict.frozendict(
         protocol_parameters
@@ -89,26 +151,39 @@ def create_session(
     genesis_parameters = frozendict.frozendict(genesis_parameters) | dataclasses.asdict(
         DEFAULT_GENESIS_PARAMETERS
     )
-    session_id = uuid.uuid4()
-    SESSIONS[session_id] = Session(
-        chain_state=MockFrostApi(
+    return new_session(
+        MockFrostApi(
             protocol_param=ProtocolParameters(**protocol_parameters),
             genesis_param=GenesisParameters(**genesis_parameters),
             seed=seed,
+            verify_signatures=verify_signatures,
+            block_production=block_production,
+            evaluator=session_evaluator(),
+        )
+    )
+
+
+def new_session(chain_state: MockFrostApi) -> uuid.UUID:
+    session_id = uuid.uuid4()
+    STORE.create(
+        session_id,
+        Session(
+            chain_state=chain_state,
+            creation_time=datetime.datetime.now(),
+            last_access_time=datetime.datetime.now(),
         ),
-        creation_time=datetime.datetime.now(),
-        last_access_time=datetime.datetime.now(),
     )
     return session_id
 
 
 @app.get("/session/{session_id}")
-def get_session_info(session_id: uuid.UUID) -> Optional[SessionModel]:
+async def get_session_info(session_id: uuid.UUID) -> Optional[SessionModel]:
     """
     Remove a session after usage.
     """
-    session = SESSIONS.get(session_id)
-    if not session:
+    try:
+        session = get_session(session_id)
+    except fastapi.HTTPException:
         return None
     return SessionModel(
         creation_time=session.creation_time,
@@ -117,14 +192,18 @@ def get_session_info(session_id: uuid.UUID) -> Optional[SessionModel]:
 
 
 @app.delete("/session/{session_id}")
-def delete_session(session_id: uuid.UUID) -> bool:
+async def delete_session(session_id: uuid.UUID) -> bool:
     """
     Remove a session after usage.
     """
-    if session_id in SESSIONS:
-        del SESSIONS[session_id]
-        return True
-    return False
+    session = SESSIONS.get(session_id)
+    if not STORE.delete(session_id):
+        return False
+    if session is not None:
+        # wait for running requests of the session
+        async with session.lock.write():
+            pass
+    return True
 
 
 def model_from_transaction_input(tx_in: TransactionInput):
@@ -134,177 +213,381 @@ def model_from_transaction_input(tx_in: TransactionInput):
 
 
 def get_session(session_id):
-    if session_id not in SESSIONS:
+    session = STORE.get(session_id)
+    if session is None:
         raise fastapi.HTTPException(status_code=404, detail="Session not found")
-    return SESSIONS[session_id]
+    return session
+
+
+@contextlib.asynccontextmanager
+async def reading(session_id: uuid.UUID):
+    """The session, for a request that only reads its chain state"""
+    session = get_session(session_id)
+    async with session.lock.read():
+        yield session
+
+
+@contextlib.asynccontextmanager
+async def writing(session_id: uuid.UUID):
+    """The session, for a request that changes its chain state"""
+    session = get_session(session_id)
+    async with session.lock.write():
+        try:
+            async with STORE.writing(session_id, session):
+                yield session
+        except KeyError as e:
+            if e.args != (session_id,):
+                raise
+            # removed while waiting for the lock
+            raise fastapi.HTTPException(status_code=404, detail="Session not found")
+
+
+@app.post("/session/{session_id}/clone")
+async def clone_session(session_id: uuid.UUID) -> uuid.UUID:
+    """
+    Create a new session with a copy of the chain state of this session.
+    The sessions share their UTxOs and scripts until either of them changes them, so this is cheap even for large ledgers.
+    """
+    # forking reorganises the shared state of the session, so no other request may run meanwhile
+    async with writing(session_id) as session:
+        return new_session(session.chain_state.fork())
+
+
+@app.put("/template/{name}")
+async def save_template(
+    name: str, session_id: Annotated[uuid.UUID, Body(embed=True)]
+) -> str:
+    """
+    Register the current chain state of the session as a template with the given name,
+    replacing any previous template of that name.
+    Later changes of the session do not change the template.
+    """
+    async with writing(session_id) as session:
+        STORE.save_template(name, session.chain_state.fork())
+    return name
+
+
+@app.get("/template")
+async def list_templates() -> List[str]:
+    """
+    Return the names of all templates.
+    """
+    return STORE.template_names()
+
+
+@app.delete("/template/{name}")
+async def delete_template(name: str) -> bool:
+    """
+    Remove a template. Sessions created from it are not affected.
+    """
+    return STORE.delete_template(name)
+
+
+@app.post("/template/{name}/session")
+async def create_session_from_template(name: str) -> uuid.UUID:
+    """
+    Create a new session with the chain state of the template.
+    Use this to set up the same ledger for many tests at once: fund users and add script outputs
+    in a session, register it as a template and create a session from the template for every test.
+    """
+    template = STORE.get_template(name)
+    if template is None:
+        raise fastapi.HTTPException(status_code=404, detail="Template not found")
+    return new_session(template.fork())
 
 
 @app.post("/{session_id}/ledger/txo")
-def add_transaction_output(
+async def add_transaction_output(
     session_id: uuid.UUID, tx_cbor: Annotated[str, Body(embed=True)]
 ) -> TransactionInputModel:
     """
     Add a transaction output to the UTxO, without specifying the transaction hash and index (the "input").
     These will be created randomly and the corresponding CBOR is returned.
     """
-    tx_in = get_session(session_id).chain_state.add_txout(
-        pycardano.TransactionOutput.from_cbor(tx_cbor)
-    )
-    return model_from_transaction_input(tx_in)
+    async with writing(session_id) as session:
+        tx_in = session.chain_state.add_txout(
+            pycardano.TransactionOutput.from_cbor(tx_cbor)
+        )
+        return model_from_transaction_input(tx_in)
 
 
 @app.put("/{session_id}/ledger/utxo")
-def add_utxo(session_id: uuid.UUID, tx_cbor: bytes) -> TransactionInputModel:
+async def add_utxo(session_id: uuid.UUID, tx_cbor: bytes) -> TransactionInputModel:
     """
     Add a transaction output and input to the UTxO.
     Potentially overwrites existing inputs with the same transaction hash and index.
     Returns the created transaction input.
     """
-    utxo = pycardano.UTxO.from_cbor(tx_cbor)
-    get_session(session_id).chain_state.add_utxo(utxo)
-    return model_from_transaction_input(utxo.input)
+    async with writing(session_id) as session:
+        utxo = pycardano.UTxO.from_cbor(tx_cbor)
+        session.chain_state.add_utxo(utxo)
+        return model_from_transaction_input(utxo.input)
+
+
+# readers of the bodies of the bulk ledger routes, by content type
+BULK_READERS = {
+    "application/cbor": CBORArrayReader,
+    "application/x-ndjson": NDJSONReader,
+}
+BULK_REQUEST_BODY = {
+    "requestBody": {
+        "content": {
+            media_type: {"schema": {"type": "string", "format": "binary"}}
+            for media_type in BULK_READERS
+        },
+        "required": True,
+    }
+}
+
+
+async def add_bulk(
+    request: fastapi.Request,
+    session: Session,
+    add: Callable[[MockFrostApi, bytes], TransactionInput],
+) -> List[TransactionInputModel]:
+    """
+    Add the items of the request body to the ledger of the session while the body is received.
+    Either all items are added or, if one of them is invalid, none.
+    """
+    media_type = request.headers.get("content-type", "application/cbor")
+    reader_type = BULK_READERS.get(media_type.split(";")[0].strip())
+    if reader_type is None:
+        raise fastapi.HTTPException(
+            status_code=415, detail=f"Expected one of {', '.join(BULK_READERS)}"
+        )
+    reader = reader_type()
+    chain_state = session.chain_state
+    snapshot = chain_state.snapshot()
+    tx_ins = []
+
+    def add_items(items: List[bytes]):
+        for item in items:
+            tx_ins.append(add(chain_state, item))
+
+    try:
+        async for chunk in request.stream():
+            items = reader.feed(chunk)
+            if items:
+                await run_in_threadpool(add_items, items)
+        await run_in_threadpool(add_items, reader.close())
+    except Exception as e:
+        chain_state.restore(snapshot)
+        raise fastapi.HTTPException(
+            status_code=400, detail=f"Invalid item {len(tx_ins)}: {e}"
+        )
+    return [model_from_transaction_input(tx_in) for tx_in in tx_ins]
+
+
+def add_txout_cbor(chain_state: MockFrostApi, cbor: bytes) -> TransactionInput:
+    return chain_state.add_txout(pycardano.TransactionOutput.from_cbor(cbor))
+
+
+def add_utxo_cbor(chain_state: MockFrostApi, cbor: bytes) -> TransactionInput:
+    utxo = pycardano.UTxO.from_cbor(cbor)
+    chain_state.add_utxo(utxo)
+    return utxo.input
+
+
+@app.post("/{session_id}/ledger/txos", openapi_extra=BULK_REQUEST_BODY)
+async def add_transaction_outputs(
+    session_id: uuid.UUID, request: fastapi.Request
+) -> List[TransactionInputModel]:
+    """
+    Add many transaction outputs to the UTxO at once, each with a random transaction hash as with `/ledger/txo`.
+    The body is either a CBOR array of transaction outputs (`application/cbor`)
+    or one hex encoded CBOR transaction output as JSON string per line (`application/x-ndjson`).
+    Outputs are added while the body is received, so it may be streamed.
+    Returns the created transaction inputs in the order of the outputs.
+    """
+    async with writing(session_id) as session:
+        return await add_bulk(request, session, add_txout_cbor)
+
+
+@app.put("/{session_id}/ledger/utxos", openapi_extra=BULK_REQUEST_BODY)
+async def add_utxos(
+    session_id: uuid.UUID, request: fastapi.Request
+) -> List[TransactionInputModel]:
+    """
+    Add many transaction outputs and inputs to the UTxO at once, as with `/ledger/utxo`.
+    The body is either a CBOR array of UTxOs (`application/cbor`)
+    or one hex encoded CBOR UTxO as JSON string per line (`application/x-ndjson`).
+    UTxOs are added while the body is received, so it may be streamed.
+    Returns their transaction inputs in order.
+    """
+    async with writing(session_id) as session:
+        return await add_bulk(request, session, add_utxo_cbor)
 
 
 @app.delete("/{session_id}/ledger/txo")
-def delete_transaction_output(
+async def delete_transaction_output(
     session_id: uuid.UUID, tx_input: TransactionInputModel
 ) -> bool:
     """
     Delete a transaction output from the UTxO.
     Returns whether the transaction output was in the UTxO
     """
-    try:
-        get_session(session_id).chain_state.remove_txi(
-            TransactionInput(
-                transaction_id=TransactionId(tx_input.tx_id),
-                index=tx_input.output_index,
+    async with writing(session_id) as session:
+        try:
+            session.chain_state.remove_txi(
+                TransactionInput(
+                    transaction_id=TransactionId(tx_input.tx_id),
+                    index=tx_input.output_index,
+                )
             )
-        )
-    except:
-        return False
+        except:
+            return False
 
 
 @app.put("/{session_id}/ledger/slot")
-def set_slot(session_id: uuid.UUID, slot: int) -> int:
+async def set_slot(session_id: uuid.UUID, slot: int) -> int:
     """
     Set the current slot of the ledger to a specified value.
     Essentially acts as a "time travel" tool.
     """
-    get_session(session_id).chain_state.set_block_slot(slot)
-    return slot
+    async with writing(session_id) as session:
+        session.chain_state.set_block_slot(slot)
+        return slot
+
+
+@app.get("/{session_id}/blocks/statistics")
+async def block_statistics(session_id: uuid.UUID) -> dict:
+    """
+    Return the number of produced blocks and transactions and how much of the block size
+    and execution unit limits the transactions used.
+    """
+    async with reading(session_id) as session:
+        return session.chain_state.block_statistics()
 
 
 @app.put("/{session_id}/pools/pool")
-def add_pool(session_id: uuid.UUID, pool_id: Annotated[str, Body(embed=True)]) -> str:
+async def add_pool(
+    session_id: uuid.UUID, pool_id: Annotated[str, Body(embed=True)]
+) -> str:
     """
     Add a fake staking pool. This may be delegated to mimic rewards.
     """
-    get_session(session_id).chain_state.add_mock_pool(pool_id)
-    return pool_id
+    async with writing(session_id) as session:
+        session.chain_state.add_mock_pool(pool_id)
+        return pool_id
 
 
 @app.put("/{session_id}/pools/distribute")
-def distribute_rewards(session_id: uuid.UUID, rewards: int) -> int:
+async def distribute_rewards(session_id: uuid.UUID, rewards: int) -> int:
     """
     Distributed rewards to staked accounts. Emulates the behaviour of reward distribution at epoch boundaries.
     """
-    get_session(session_id).chain_state.distribute_rewards(rewards)
-    return rewards
+    async with writing(session_id) as session:
+        session.chain_state.distribute_rewards(rewards)
+        return rewards
 
 
 @app.get("/{session_id}/api/v0/epochs/latest")
-def latest_epoch(session_id: uuid.UUID) -> dict:
+async def latest_epoch(session_id: uuid.UUID) -> dict:
     """
     Return the information about the latest, therefore current, epoch.
 
     https://docs.blockfrost.io/#tag/Cardano-Epochs/paths/~1epochs~1latest/get
     """
-    session = get_session(session_id)
-    return session.chain_state.epoch_latest(return_type="json")
+    async with reading(session_id) as session:
+        return session.chain_state.epoch_latest(return_type="json")
 
 
 @app.get("/{session_id}/api/v0/blocks/latest")
-def latest_block(session_id: uuid.UUID) -> dict:
+async def latest_block(session_id: uuid.UUID) -> dict:
     """
     Return the latest block available to the backends, also known as the tip of the blockchain.
 
     https://docs.blockfrost.io/#tag/Cardano-Blocks/paths/~1blocks~1latest/get
     """
-    return get_session(session_id).chain_state.block_latest(return_type="json")
+    async with reading(session_id) as session:
+        return session.chain_state.block_latest(return_type="json")
 
 
 @app.get("/{session_id}/api/v0/genesis")
-def genesis(session_id: uuid.UUID) -> dict:
+async def genesis(session_id: uuid.UUID) -> dict:
     """
     Return the information about blockchain genesis.
 
     https://docs.blockfrost.io/#tag/Cardano-Ledger/paths/~1genesis/get
     """
-    return get_session(session_id).chain_state.genesis(return_type="json")
+    async with reading(session_id) as session:
+        return session.chain_state.genesis(return_type="json")
 
 
 @app.get("/{session_id}/api/v0/epochs/latest/parameters")
-def latest_epoch_protocol_parameters(session_id: uuid.UUID) -> dict:
+async def latest_epoch_protocol_parameters(session_id: uuid.UUID) -> dict:
     """
     Return the protocol parameters for the latest epoch.
 
     https://docs.blockfrost.io/#tag/Cardano-Epochs/paths/~1epochs~1latest~1parameters/get
     """
-    return get_session(session_id).chain_state.epoch_latest_parameters(
-        return_type="json"
-    )
+    async with reading(session_id) as session:
+        return session.chain_state.epoch_latest_parameters(return_type="json")
 
 
 @app.get("/{session_id}/api/v0/scripts/{script_hash}")
-def specific_script(session_id: uuid.UUID, script_hash: str) -> dict:
+async def specific_script(session_id: uuid.UUID, script_hash: str) -> dict:
     """
     Information about a specific script
 
     https://docs.blockfrost.io/#tag/Cardano-Scripts/paths/~1scripts~1%7Bscript_hash%7D/get
     """
-    return get_session(session_id).chain_state.script(
-        script_hash=script_hash, return_type="json"
-    )
+    async with reading(session_id) as session:
+        return session.chain_state.script(script_hash=script_hash, return_type="json")
 
 
 @app.get("/{session_id}/api/v0/scripts/{script_hash}/cbor")
-def script_cbor(session_id: uuid.UUID, script_hash: str) -> dict:
+async def script_cbor(session_id: uuid.UUID, script_hash: str) -> dict:
     """
     CBOR representation of a `plutus` script
 
     https://docs.blockfrost.io/#tag/Cardano-Scripts/paths/~1scripts~1%7Bscript_hash%7D~1cbor/get
     """
-    return get_session(session_id).chain_state.script_cbor(
-        script_hash=script_hash, return_type="json"
-    )
+    async with reading(session_id) as session:
+        return session.chain_state.script_cbor(
+            script_hash=script_hash, return_type="json"
+        )
 
 
 @app.get("/{session_id}/api/v0/scripts/{script_hash}/json")
-def script_json(session_id: uuid.UUID, script_hash: str) -> dict:
+async def script_json(session_id: uuid.UUID, script_hash: str) -> dict:
     """
     JSON representation of a `timelock` script
 
     https://docs.blockfrost.io/#tag/Cardano-Scripts/paths/~1scripts~1%7Bscript_hash%7D~1json/get
     """
-    return get_session(session_id).chain_state.script_cbor(
-        script_hash=script_hash, return_type="json"
-    )
+    async with reading(session_id) as session:
+        return session.chain_state.script_cbor(
+            script_hash=script_hash, return_type="json"
+        )
+
+
+@app.get("/{session_id}/api/v0/scripts/datum/{datum_hash}/cbor")
+async def script_datum_cbor(session_id: uuid.UUID, datum_hash: str) -> dict:
+    """
+    CBOR serialised datum value
+
+    https://docs.blockfrost.io/#tag/Cardano-Scripts/paths/~1scripts~1datum~1%7Bdatum_hash%7D~1cbor/get
+    """
+    async with reading(session_id) as session:
+        return session.chain_state.script_datum_cbor(
+            datum_hash=datum_hash, return_type="json"
+        )
 
 
 @app.get("/{session_id}/api/v0/addresses/{address}/utxos")
-def address_utxos(session_id: uuid.UUID, address: str) -> list:
+async def address_utxos(session_id: uuid.UUID, address: str) -> list:
     """
     UTXOs of the address.
 
     https://docs.blockfrost.io/#tag/Cardano-Addresses/paths/~1addresses~1%7Baddress%7D~1utxos/get
     """
-    return get_session(session_id).chain_state.address_utxos(
-        address=address, return_type="json"
-    )
+    async with reading(session_id) as session:
+        return session.chain_state.address_utxos(address=address, return_type="json")
 
 
 @app.post("/{session_id}/api/v0/tx/submit")
-def submit_a_transaction(
+async def submit_a_transaction(
     session_id: uuid.UUID,
     transaction: Annotated[bytes, Body(media_type="application/cbor")],
 ) -> str:
@@ -313,13 +596,14 @@ def submit_a_transaction(
 
     https://docs.blockfrost.io/#tag/Cardano-Transactions/paths/~1tx~1submit/post
     """
-    return get_session(session_id).chain_state.transaction_submit_raw(
-        transaction, return_type="json"
-    )
+    async with writing(session_id) as session:
+        return await run_in_threadpool(
+            session.chain_state.transaction_submit_raw, transaction, return_type="json"
+        )
 
 
 @app.post("/{session_id}/api/v0/utils/txs/evaluate")
-def submit_a_transaction_for_execution_units_evaluation(
+async def submit_a_transaction_for_execution_units_evaluation(
     session_id: uuid.UUID,
     transaction: Annotated[str, Body(media_type="application/cbor")],
 ) -> dict:
@@ -328,18 +612,59 @@ def submit_a_transaction_for_execution_units_evaluation(
 
     https://docs.blockfrost.io/#tag/Cardano-Utilities/paths/~1utils~1txs~1evaluate/post
     """
-    return get_session(session_id).chain_state.transaction_evaluate_raw(
-        bytes.fromhex(transaction), return_type="json"
-    )
+    async with reading(session_id) as session:
+        return await run_in_threadpool(
+            session.chain_state.transaction_evaluate_raw,
+            bytes.fromhex(transaction),
+            return_type="json",
+        )
+
+
+@app.post("/{session_id}/utils/txs/evaluate/batch")
+async def evaluate_transaction_batch(
+    session_id: uuid.UUID,
+    transactions: Annotated[List[str], Body()],
+    parallel: bool = False,
+) -> list:
+    """
+    Evaluate a list of already serialized (hex encoded) transactions like `/api/v0/utils/txs/evaluate`.
+    Returns one result per transaction, in order. A failing transaction does not affect the others.
+    With parallel set, the scripts of all transactions are evaluated on a pool of worker processes.
+    """
+    async with reading(session_id) as session:
+        return await run_in_threadpool(
+            session.chain_state.transaction_evaluate_batch_raw,
+            transactions,
+            evaluator=EVALUATOR if parallel else None,
+            return_type="json",
+        )
+
+
+@app.post("/{session_id}/utils/txs/profile")
+async def profile_transaction(
+    session_id: uuid.UUID,
+    transaction: Annotated[str, Body(media_type="application/cbor")],
+) -> dict:
+    """
+    Evaluate an already serialized transaction like `/api/v0/utils/txs/evaluate`
+    and break down the cost of every script by builtin and machine step.
+    """
+    async with reading(session_id) as session:
+        return await run_in_threadpool(
+            session.chain_state.transaction_profile_raw,
+            bytes.fromhex(transaction),
+            return_type="json",
+        )
 
 
 @app.get("/{session_id}/api/v0/accounts/{stake_address}")
-def specific_account_address(session_id: uuid.UUID, stake_address: str) -> dict:
+async def specific_account_address(session_id: uuid.UUID, stake_address: str) -> dict:
     """
     Obtain information about a specific stake account
 
     https://docs.blockfrost.io/#tag/cardano--accounts/GET/accounts/{stake_address}
     """
-    return get_session(session_id).chain_state.accounts(
-        stake_address=stake_address, return_type="json"
-    )
+    async with reading(session_id) as session:
+        return session.chain_state.accounts(
+            stake_address=stake_address, return_type="json"
+        )
@@ -0,0 +1,425 @@
+import asyncio
+import contextlib
+import dataclasses
+import datetime
+import os
+import pathlib
+import pickle
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+from starlette.concurrency import run_in_threadpool
+
+from plutus_bench.evaluator import ScriptEvaluator
+from plutus_bench.mock import MockFrostApi
+from plutus_bench.mockfrost.locks import ReadWriteLock
+
+
+@dataclasses.dataclass
+class Session:
+    chain_state: MockFrostApi
+    creation_time: datetime.datetime
+    last_access_time: datetime.datetime
+    # reads of the chain state may run concurrently, changes are serialised
+    lock: ReadWriteLock = dataclasses.field(default_factory=ReadWriteLock)
+
+
+class SessionStore:
+    """
+    Keeps the sessions of the MockFrost server.
+
+    Every request looks up its session with get. Requests that change the chain state
+    run inside writing, which lets the store persist the changes.
+    """
+
+    # sessions currently loaded in this process
+    sessions: Dict[uuid.UUID, Session]
+
+    def create(self, session_id: uuid.UUID, session: Session):
+        raise NotImplementedError()
+
+    def get(self, session_id: uuid.UUID) -> Optional[Session]:
+        """The session, None if it does not exist. Counts as an access of the session."""
+        raise NotImplementedError()
+
+    def delete(self, session_id: uuid.UUID) -> bool:
+        """Delete the session, returns whether it existed"""
+        raise NotImplementedError()
+
+    def remove_expired(self, cutoff: datetime.datetime):
+        """Remove the sessions that were not accessed since the cutoff"""
+        raise NotImplementedError()
+
+    @contextlib.asynccontextmanager
+    async def writing(self, session_id: uuid.UUID, session: Session):
+        """Context of a request that changes the session, holding the local write lock of the session"""
+        yield
+
+    def save_template(self, name: str, chain_state: MockFrostApi):
+        """Register the chain state as template under the name, replacing a previous template of that name"""
+        raise NotImplementedError()
+
+    def get_template(self, name: str) -> Optional[MockFrostApi]:
+        """
+        The chain state of the template, None if it does not exist.
+        It must not be changed, sessions are created from forks of it.
+        """
+        raise NotImplementedError()
+
+    def delete_template(self, name: str) -> bool:
+        """Delete the template, returns whether it existed"""
+        raise NotImplementedError()
+
+    def template_names(self) -> List[str]:
+        raise NotImplementedError()
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Keeps the sessions in the memory of the server process.
+
+    The least recently used sessions are evicted once there are more than max_sessions sessions
+    or their estimated size exceeds max_bytes (0 for no limit).
+    Evicted sessions are written to the spill directory, if given, and restored on their next access.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 0,
+        max_bytes: int = 0,
+        spill_directory: Optional[Union[str, os.PathLike]] = None,
+        evaluator: Optional[ScriptEvaluator] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.spill_directory = spill_directory
+        # evaluator of restored sessions
+        self.evaluator = evaluator
+        # least recently used first
+        self.sessions: "OrderedDict[uuid.UUID, Session]" = OrderedDict()
+        # templates are few and never evicted
+        self.templates: Dict[str, MockFrostApi] = {}
+
+    def create(self, session_id: uuid.UUID, session: Session):
+        self.sessions[session_id] = session
+        self.evict()
+
+    def get(self, session_id: uuid.UUID) -> Optional[Session]:
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self._restore(session_id)
+            if session is None:
+                return None
+        session.last_access_time = datetime.datetime.now()
+        self.sessions.move_to_end(session_id)
+        self.evict()
+        return session
+
+    def delete(self, session_id: uuid.UUID) -> bool:
+        if self.sessions.pop(session_id, None) is not None:
+            return True
+        if self.spill_directory is None or not self.spill_path(session_id).exists():
+            return False
+        self.spill_path(session_id).unlink(missing_ok=True)
+        return True
+
+    def spill_path(self, session_id: uuid.UUID) -> pathlib.Path:
+        return pathlib.Path(self.spill_directory) / f"{session_id}.session"
+
+    def _spill(self, session_id: uuid.UUID, session: Session):
+        path = self.spill_path(session_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(
+            pickle.dumps(
+                {
+                    "chain_state": session.chain_state.dumps(),
+                    "creation_time": session.creation_time,
+                    "last_access_time": session.last_access_time,
+                }
+            )
+        )
+        # the modification time tells remove_expired when the session was last used
+        access_time = session.last_access_time.timestamp()
+        os.utime(tmp, (access_time, access_time))
+        os.replace(tmp, path)
+
+    def _restore(self, session_id: uuid.UUID) -> Optional[Session]:
+        """Load a spilled session back into memory"""
+        if self.spill_directory is None:
+            return None
+        path = self.spill_path(session_id)
+        try:
+            stored = pickle.loads(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        session = Session(
+            chain_state=MockFrostApi.loads(
+                stored["chain_state"], evaluator=self.evaluator
+            ),
+            creation_time=stored["creation_time"],
+            last_access_time=stored["last_access_time"],
+        )
+        self.sessions[session_id] = session
+        path.unlink()
+        return session
+
+    def evict(self):
+        """
+        Evict the least recently used sessions until the sessions in memory are within the limits.
+        Sessions with running requests and the most recently used session are kept.
+        """
+        total = (
+            sum(s.chain_state.estimated_size() for s in self.sessions.values())
+            if self.max_bytes
+            else 0
+        )
+        for session_id, session in list(self.sessions.items())[:-1]:
+            if not (
+                (self.max_sessions and len(self.sessions) > self.max_sessions)
+                or (self.max_bytes and total > self.max_bytes)
+            ):
+                break
+            if not session.lock.idle:
+                continue
+            del self.sessions[session_id]
+            total -= session.chain_state.estimated_size()
+            if self.spill_directory is not None:
+                self._spill(session_id, session)
+
+    def remove_expired(self, cutoff: datetime.datetime):
+        for session_id, session in list(self.sessions.items()):
+            if session.last_access_time < cutoff and session.lock.idle:
+                del self.sessions[session_id]
+        if self.spill_directory is not None:
+            for path in pathlib.Path(self.spill_directory).glob("*.session"):
+                if path.stat().st_mtime < cutoff.timestamp():
+                    path.unlink(missing_ok=True)
+
+    def save_template(self, name: str, chain_state: MockFrostApi):
+        self.templates[name] = chain_state
+
+    def get_template(self, name: str) -> Optional[MockFrostApi]:
+        return self.templates.get(name)
+
+    def delete_template(self, name: str) -> bool:
+        return self.templates.pop(name, None) is not None
+
+    def template_names(self) -> List[str]:
+        return sorted(self.templates)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Keeps the sessions in a SQLite database that all worker processes of the server share,
+    e.g. when running `uvicorn --workers N`.
+
+    Every process caches the sessions it loaded and reloads a session once another process changed it.
+    Changes of a session are serialised across processes by a lease on the session,
+    and each change writes the whole serialized chain state,
+    so changing large ledgers is slower than with the in-memory store.
+    """
+
+    # a lease that was not released after this many seconds, e.g. because its process died, can be taken over
+    lease_seconds = 300
+    # the interval in which a request polls for the lease of a session that another process changes
+    lease_poll_seconds = 0.01
+
+    def __init__(
+        self,
+        path: Union[str, os.PathLike],
+        evaluator: Optional[ScriptEvaluator] = None,
+    ):
+        self.path = path
+        # evaluator of loaded sessions
+        self.evaluator = evaluator
+        self.sessions: Dict[uuid.UUID, Session] = {}
+        # version of every loaded session
+        self._versions: Dict[uuid.UUID, int] = {}
+        # the server only uses the store from its event loop, but not always from the same thread
+        self._db = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                creation_time REAL NOT NULL,
+                last_access_time REAL NOT NULL,
+                lease_owner TEXT,
+                lease_until REAL,
+                state BLOB NOT NULL
+            )
+            """
+        )
+        # the token changes whenever a template is replaced
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS templates (
+                name TEXT PRIMARY KEY,
+                token TEXT NOT NULL,
+                state BLOB NOT NULL
+            )
+            """
+        )
+        # token and chain state of every loaded template
+        self._templates: Dict[str, Tuple[str, MockFrostApi]] = {}
+        # access times are updated on a best effort basis and never wait for the database
+        self._access_db = sqlite3.connect(
+            path, timeout=0, isolation_level=None, check_same_thread=False
+        )
+
+    def create(self, session_id: uuid.UUID, session: Session):
+        self._db.execute(
+            "INSERT INTO sessions (id, version, creation_time, last_access_time, state) VALUES (?, 0, ?, ?, ?)",
+            (
+                str(session_id),
+                session.creation_time.timestamp(),
+                session.last_access_time.timestamp(),
+                session.chain_state.dumps(),
+            ),
+        )
+        self.sessions[session_id] = session
+        self._versions[session_id] = 0
+
+    def _load(self, session_id: uuid.UUID, session: Optional[Session]) -> bool:
+        """Load the latest version of the session from the database, returns False if it does not exist"""
+        row = self._db.execute(
+            "SELECT version FROM sessions WHERE id = ?", (str(session_id),)
+        ).fetchone()
+        if row is None:
+            self.sessions.pop(session_id, None)
+            self._versions.pop(session_id, None)
+            return False
+        if session is not None and self._versions.get(session_id) == row[0]:
+            return True
+        version, creation_time, last_access_time, state = self._db.execute(
+            "SELECT version, creation_time, last_access_time, state FROM sessions WHERE id = ?",
+            (str(session_id),),
+        ).fetchone()
+        chain_state = MockFrostApi.loads(state, evaluator=self.evaluator)
+        if session is None:
+            self.sessions[session_id] = Session(
+                chain_state=chain_state,
+                creation_time=datetime.datetime.fromtimestamp(creation_time),
+                last_access_time=datetime.datetime.fromtimestamp(last_access_time),
+            )
+        else:
+            # keep the session and its lock, requests of this process may be waiting for it
+            session.chain_state = chain_state
+        self._versions[session_id] = version
+        return True
+
+    def get(self, session_id: uuid.UUID) -> Optional[Session]:
+        if not self._load(session_id, self.sessions.get(session_id)):
+            return None
+        session = self.sessions[session_id]
+        session.last_access_time = datetime.datetime.now()
+        try:
+            self._access_db.execute(
+                "UPDATE sessions SET last_access_time = ? WHERE id = ?",
+                (session.last_access_time.timestamp(), str(session_id)),
+            )
+        except sqlite3.OperationalError:
+            # the database is busy, the next access updates the access time
+            pass
+        return session
+
+    def delete(self, session_id: uuid.UUID) -> bool:
+        self.sessions.pop(session_id, None)
+        self._versions.pop(session_id, None)
+        return (
+            self._db.execute(
+                "DELETE FROM sessions WHERE id = ?", (str(session_id),)
+            ).rowcount
+            > 0
+        )
+
+    def remove_expired(self, cutoff: datetime.datetime):
+        self._db.execute(
+            "DELETE FROM sessions WHERE last_access_time < ? AND (lease_until IS NULL OR lease_until < ?)",
+            (cutoff.timestamp(), time.time()),
+        )
+        # loaded sessions that were removed are dropped on their next access
+
+    async def _acquire_lease(self, session_id: uuid.UUID) -> str:
+        owner = uuid.uuid4().hex
+        while True:
+            now = time.time()
+            acquired = self._db.execute(
+                "UPDATE sessions SET lease_owner = ?, lease_until = ? "
+                "WHERE id = ? AND (lease_owner IS NULL OR lease_until < ?)",
+                (owner, now + self.lease_seconds, str(session_id), now),
+            ).rowcount
+            if acquired:
+                return owner
+            if not self._load(session_id, self.sessions.get(session_id)):
+                raise KeyError(session_id)
+            await asyncio.sleep(self.lease_poll_seconds)
+
+    @contextlib.asynccontextmanager
+    async def writing(self, session_id: uuid.UUID, session: Session):
+        owner = await self._acquire_lease(session_id)
+        try:
+            # another process may have changed the session before we got the lease
+            if not self._load(session_id, session):
+                raise KeyError(session_id)
+            yield
+            state = await run_in_threadpool(session.chain_state.dumps)
+            saved = self._db.execute(
+                "UPDATE sessions SET state = ?, version = version + 1 WHERE id = ? AND lease_owner = ?",
+                (state, str(session_id), owner),
+            ).rowcount
+            if not saved:
+                raise RuntimeError(
+                    f"The lease on session {session_id} expired before its changes were saved"
+                )
+            self._versions[session_id] += 1
+        finally:
+            self._db.execute(
+                "UPDATE sessions SET lease_owner = NULL, lease_until = NULL WHERE id = ? AND lease_owner = ?",
+                (str(session_id), owner),
+            )
+
+    def save_template(self, name: str, chain_state: MockFrostApi):
+        token = uuid.uuid4().hex
+        self._db.execute(
+            "INSERT OR REPLACE INTO templates (name, token, state) VALUES (?, ?, ?)",
+            (name, token, chain_state.dumps()),
+        )
+        self._templates[name] = (token, chain_state)
+
+    def get_template(self, name: str) -> Optional[MockFrostApi]:
+        row = self._db.execute(
+            "SELECT token FROM templates WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            self._templates.pop(name, None)
+            return None
+        cached = self._templates.get(name)
+        if cached is not None and cached[0] == row[0]:
+            return cached[1]
+        token, state = self._db.execute(
+            "SELECT token, state FROM templates WHERE name = ?", (name,)
+        ).fetchone()
+        chain_state = MockFrostApi.loads(state, evaluator=self.evaluator)
+        self._templates[name] = (token, chain_state)
+        return chain_state
+
+    def delete_template(self, name: str) -> bool:
+        self._templates.pop(name, None)
+        return (
+            self._db.execute("DELETE FROM templates WHERE name = ?", (name,)).rowcount
+            > 0
+        )
+
+    def template_names(self) -> List[str]:
+        return [
+            name
+            for (name,) in self._db.execute("SELECT name FROM templates ORDER BY name")
+        ]
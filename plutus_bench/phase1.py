@@ -0,0 +1,245 @@
+"""
+Phase-1 validation: the ledger rules a transaction has to satisfy before its scripts are run.
+
+The checks are ordered from cheapest to most expensive,
+so malformed transactions are rejected before signatures are verified or scripts are evaluated.
+"""
+
+import hashlib
+import io
+from typing import List, Optional
+
+import cbor2
+import pycardano
+from pycardano import (
+    Address,
+    ChainContext,
+    NativeScript,
+    Transaction,
+    TransactionInput,
+    UTxO,
+    Value,
+    VerificationKey,
+    VerificationKeyHash,
+)
+from pycardano.utils import fee as min_fee
+
+from .signatures import SignatureVerifier, vkey_signatures
+from .tx_tools import transaction_ex_units
+from .utxo_store import UTxOStore
+
+
+class ValidationException(Exception):
+    """The transaction violates a phase-1 ledger rule"""
+
+
+def check_validity_interval(tx: Transaction, slot: int):
+    body = tx.transaction_body
+    if body.validity_start is not None and slot < body.validity_start:
+        raise ValidationException(
+            f"Transaction is not valid yet, validity starts at slot {body.validity_start} but the current slot is {slot}"
+        )
+    if body.ttl is not None and slot >= body.ttl:
+        raise ValidationException(
+            f"Transaction expired at slot {body.ttl}, the current slot is {slot}"
+        )
+
+
+def resolve_inputs(
+    inputs: Optional[List[TransactionInput]], utxos: UTxOStore, kind: str
+) -> List[UTxO]:
+    """Resolve the inputs, rejecting missing and duplicate ones"""
+    if not inputs:
+        return []
+    if len(set(inputs)) != len(inputs):
+        raise ValidationException(f"Duplicate {kind} in transaction")
+    resolved = []
+    for txi in inputs:
+        if txi not in utxos:
+            raise ValidationException(
+                f"{kind.capitalize()} {txi} does not exist or was already spent"
+            )
+        resolved.append(utxos.get(txi))
+    return resolved
+
+
+def reference_script_size(utxos: List[UTxO]) -> int:
+    size = 0
+    for utxo in utxos:
+        script = utxo.output.script
+        if isinstance(script, NativeScript):
+            size += len(script.to_cbor())
+        elif script is not None:
+            size += len(script)
+    return size
+
+
+def check_size_and_fee(
+    tx: Transaction, context: ChainContext, ref_script_size: int, size: int
+):
+    max_size = context.protocol_param.max_tx_size
+    if size > max_size:
+        raise ValidationException(
+            f"Transaction size {size} exceeds the maximum of {max_size}"
+        )
+    mem, steps = transaction_ex_units(tx)
+    if steps > context.protocol_param.max_tx_ex_steps:
+        raise ValidationException(
+            f"Transaction requests {steps} steps, the maximum is {context.protocol_param.max_tx_ex_steps}"
+        )
+    if mem > context.protocol_param.max_tx_ex_mem:
+        raise ValidationException(
+            f"Transaction requests {mem} memory, the maximum is {context.protocol_param.max_tx_ex_mem}"
+        )
+    required = min_fee(context, size, steps, mem, ref_script_size)
+    if tx.transaction_body.fee < required:
+        raise ValidationException(
+            f"Fee {tx.transaction_body.fee} is below the minimum fee of {required}"
+        )
+
+
+def check_balance(tx: Transaction, inputs: List[UTxO], context: ChainContext):
+    """Check that the consumed value equals the produced value"""
+    body = tx.transaction_body
+    deposits = 0
+    refunds = 0
+    for certificate in body.certificates or []:
+        if isinstance(certificate, pycardano.StakeRegistration):
+            deposits += context.protocol_param.key_deposit
+        elif isinstance(certificate, pycardano.StakeDeregistration):
+            refunds += context.protocol_param.key_deposit
+        elif isinstance(certificate, pycardano.PoolRegistration):
+            deposits += context.protocol_param.pool_deposit
+    withdrawals = sum((body.withdraws or {}).values())
+    consumed = sum((u.output.amount for u in inputs), Value(withdrawals + refunds))
+    if body.mint:
+        consumed += Value(0, body.mint)
+    produced = sum((o.amount for o in body.outputs), Value(body.fee + deposits))
+    difference = consumed - produced
+    if difference.coin != 0 or difference.multi_asset.normalize():
+        raise ValidationException(
+            f"Transaction is not balanced, consumed {consumed} but produced {produced}"
+        )
+
+
+def check_collateral(tx: Transaction, collateral: List[UTxO], context: ChainContext):
+    body = tx.transaction_body
+    if not collateral:
+        raise ValidationException("Transaction runs scripts but has no collateral")
+    if len(collateral) > context.protocol_param.max_collateral_inputs:
+        raise ValidationException(
+            f"Transaction has {len(collateral)} collateral inputs, the maximum is {context.protocol_param.max_collateral_inputs}"
+        )
+    for utxo in collateral:
+        if not isinstance(utxo.output.address.payment_part, VerificationKeyHash):
+            raise ValidationException(f"Collateral {utxo.input} is not locked by a key")
+    total = sum((u.output.amount for u in collateral), Value())
+    if body.collateral_return is not None:
+        total -= body.collateral_return.amount
+    if total.multi_asset.normalize():
+        raise ValidationException("Collateral contains tokens that are not returned")
+    if body.total_collateral is not None and body.total_collateral != total.coin:
+        raise ValidationException(
+            f"Total collateral is set to {body.total_collateral} but the collateral is {total.coin}"
+        )
+    if total.coin * 100 < body.fee * context.protocol_param.collateral_percent:
+        raise ValidationException(
+            f"Collateral {total.coin} is below {context.protocol_param.collateral_percent}% of the fee {body.fee}"
+        )
+
+
+def required_signers(
+    tx: Transaction, inputs: List[UTxO], collateral: List[UTxO]
+) -> List[VerificationKeyHash]:
+    """Key hashes that have to sign the transaction"""
+    body = tx.transaction_body
+    required = list(body.required_signers or [])
+    for utxo in inputs + collateral:
+        if isinstance(utxo.output.address.payment_part, VerificationKeyHash):
+            required.append(utxo.output.address.payment_part)
+    for address in body.withdraws or {}:
+        staking_part = Address.from_primitive(address).staking_part
+        if isinstance(staking_part, VerificationKeyHash):
+            required.append(staking_part)
+    for certificate in body.certificates or []:
+        if isinstance(
+            certificate, (pycardano.StakeDeregistration, pycardano.StakeDelegation)
+        ):
+            credential = certificate.stake_credential.credential
+            if isinstance(credential, VerificationKeyHash):
+                required.append(credential)
+    return required
+
+
+def body_hash(cbor: bytes) -> bytes:
+    """Hash of the transaction body as it is serialized in the transaction"""
+    # a transaction is an array of four items, starting with the body
+    assert cbor[0] == 0x84, "Transaction is not an array of four items"
+    fp = io.BytesIO(cbor)
+    fp.seek(1)
+    cbor2.CBORDecoder(fp).decode()
+    return hashlib.blake2b(cbor[1 : fp.tell()], digest_size=32).digest()
+
+
+def check_key_witnesses(
+    tx: Transaction,
+    required: List[VerificationKeyHash],
+    tx_body_hash: bytes,
+    verifier: Optional[SignatureVerifier],
+):
+    """Check that all required keys signed, and, if a verifier is given, that the signatures are valid"""
+    witnesses = tx.transaction_witness_set.vkey_witnesses or []
+    signed = {w.vkey.hash() for w in witnesses}
+    for key_hash in required:
+        if key_hash not in signed:
+            raise ValidationException(f"Missing signature of key {key_hash}")
+    if verifier is None:
+        return
+    invalid = verifier.verify(vkey_signatures(tx, tx_body_hash))
+    if invalid is not None:
+        raise ValidationException(
+            f"Invalid signature of key {VerificationKey(invalid[0]).hash()}"
+        )
+
+
+def validate_transaction(
+    tx: Transaction,
+    context: ChainContext,
+    utxos: UTxOStore,
+    cbor: Optional[bytes] = None,
+    verifier: Optional[SignatureVerifier] = None,
+):
+    """
+    Check the phase-1 ledger rules, from cheapest to most expensive.
+
+    Signatures are only verified if a verifier is given, otherwise only the presence of the required witnesses is checked.
+
+    Size and body hash are taken from the transaction as submitted (cbor), if given,
+    as decoding and encoding a transaction does not always preserve them.
+
+    Raises:
+        ValidationException: If the transaction violates a rule.
+    """
+    body = tx.transaction_body
+    if cbor is None:
+        cbor = tx.to_cbor()
+    check_validity_interval(tx, context.last_block_slot)
+    if not body.inputs:
+        raise ValidationException("Transaction has no inputs")
+    inputs = resolve_inputs(body.inputs, utxos, "input")
+    reference_inputs = resolve_inputs(body.reference_inputs, utxos, "reference input")
+    collateral = resolve_inputs(body.collateral, utxos, "collateral input")
+    check_size_and_fee(
+        tx,
+        context,
+        reference_script_size(inputs + reference_inputs),
+        len(cbor),
+    )
+    check_balance(tx, inputs, context)
+    if tx.transaction_witness_set.redeemer:
+        check_collateral(tx, collateral, context)
+    else:
+        collateral = []
+    check_key_witnesses(
+        tx, required_signers(tx, inputs, collateral), body_hash(cbor), verifier
+    )
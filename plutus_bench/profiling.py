@@ -0,0 +1,331 @@
+import ast
+import dataclasses
+import os
+import pathlib
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import uplc.ast
+import uplc.cost_model
+import uplc.tools
+import uplc.util
+from uplc.cost_model import CekOp
+from uplc.machine import AST_TO_CEK_OP_MAP, Machine, budget_cost_of_op_on_model
+
+
+@dataclasses.dataclass
+class OpCost:
+    """Number of executions and cumulative cost of a builtin or machine step"""
+
+    count: int = 0
+    cpu: int = 0
+    mem: int = 0
+
+    def add(self, count: int, cpu: int, mem: int):
+        self.count += count
+        self.cpu += cpu
+        self.mem += mem
+
+
+@dataclasses.dataclass
+class CostProfile:
+    """
+    Breakdown of the cost of one script evaluation.
+
+    Builtins are keyed by their name, machine steps by the name of the CEK operation
+    (Startup, Const, Var, Lam, Apply, Delay, Force, Builtin, Constr, Case).
+    On success, the costs of all builtins and steps add up to cpu and mem.
+    """
+
+    cpu: int = 0
+    mem: int = 0
+    error: Optional[str] = None
+    logs: List[str] = dataclasses.field(default_factory=list)
+    builtins: Dict[str, OpCost] = dataclasses.field(
+        default_factory=lambda: defaultdict(OpCost)
+    )
+    steps: Dict[str, OpCost] = dataclasses.field(
+        default_factory=lambda: defaultdict(OpCost)
+    )
+
+    def to_json(self) -> dict:
+        return {
+            "cpu": self.cpu,
+            "mem": self.mem,
+            "error": self.error,
+            "logs": self.logs,
+            "builtins": {
+                k: dataclasses.asdict(v)
+                for k, v in sorted(self.builtins.items(), key=lambda i: -i[1].cpu)
+            },
+            "steps": {
+                k: dataclasses.asdict(v)
+                for k, v in sorted(self.steps.items(), key=lambda i: -i[1].cpu)
+            },
+        }
+
+
+_CEK_OP_BY_TYPE: Dict[type, CekOp] = {}
+
+
+def _cek_op(term: uplc.ast.AST) -> CekOp:
+    op = _CEK_OP_BY_TYPE.get(type(term))
+    if op is None:
+        op = next(op for ast, op in AST_TO_CEK_OP_MAP.items() if isinstance(term, ast))
+        _CEK_OP_BY_TYPE[type(term)] = op
+    return op
+
+
+class ProfilingMachine(Machine):
+    """CEK machine that records the cost of every builtin call and machine step"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profile = CostProfile()
+        self._step_counts: Dict[CekOp, int] = defaultdict(int)
+        # builtin whose cost is spent next
+        self._builtin: Optional[uplc.ast.BuiltInFun] = None
+
+    def _count_step(self, op: CekOp):
+        self._step_counts[op] += 1
+
+    def _count_builtin(
+        self, builtin: uplc.ast.BuiltInFun, budget: uplc.cost_model.Budget
+    ):
+        self.profile.builtins[builtin.name].add(1, budget.cpu, budget.memory)
+
+    def step_and_maybe_spend(self, term: uplc.ast.AST):
+        self._count_step(_cek_op(term))
+        super().step_and_maybe_spend(term)
+
+    def apply_evaluate(self, context, function, argument):
+        if isinstance(function, uplc.ast.ForcedBuiltIn):
+            self._builtin = function.builtin
+        try:
+            return super().apply_evaluate(context, function, argument)
+        finally:
+            self._builtin = None
+
+    def spend_budget(self, budget: uplc.cost_model.Budget):
+        if self._builtin is not None:
+            # the first budget spent while applying a saturated builtin is its cost
+            self._count_builtin(self._builtin, budget)
+            self._builtin = None
+        super().spend_budget(budget)
+
+    def eval(self, program: uplc.ast.Program):
+        self._count_step(CekOp.Startup)
+        res = super().eval(program)
+        for op, count in self._step_counts.items():
+            cost = budget_cost_of_op_on_model(self.cek_machine_cost_model, op, 0)
+            self.profile.steps[op.name].add(
+                count, count * cost.cpu, count * cost.memory
+            )
+        self.profile.cpu = res.cost.cpu
+        self.profile.mem = res.cost.memory
+        self.profile.logs = res.logs
+        if isinstance(res.result, Exception):
+            self.profile.error = str(res.result)
+        return res
+
+
+def profile_uplc(
+    uplc_program,
+    args: List[uplc.ast.PlutusData],
+    allowed_cpu_steps: int,
+    allowed_mem_steps: int,
+) -> CostProfile:
+    """Evaluate the program like :func:`uplc.eval` and return the cost breakdown of the evaluation"""
+    machine = ProfilingMachine(
+        uplc.cost_model.Budget(allowed_cpu_steps, allowed_mem_steps),
+        uplc.cost_model.default_cek_machine_cost_model_plutus_v3(),
+        uplc.cost_model.default_builtin_cost_model_plutus_v3(),
+    )
+    machine.eval(uplc.tools.apply(uplc_program, *args))
+    return machine.profile
+
+
+# attribute of UPLC terms that are the body of a function of the OpShin source
+_SOURCE_FRAME = "_plutus_bench_source_frame"
+
+
+class _SourceFrameAnnotator(uplc.util.NodeVisitor):
+    def __init__(self, frames: Dict[str, str]):
+        self.frames = frames
+
+    def visit_Apply(self, node: uplc.ast.Apply):
+        # OpShin binds functions as [(lam f_N rest) (delay (lam a (lam b body)))],
+        # with the scope numbers appended to the names of functions and classes
+        if isinstance(node.f, uplc.ast.BoundStateLambda):
+            frame = self.frames.get(re.sub(r"_\d+(?=_|$)", "", node.f.var_name))
+            if frame is not None:
+                body = node.x
+                while isinstance(
+                    body, (uplc.ast.BoundStateLambda, uplc.ast.BoundStateDelay)
+                ):
+                    body = body.term
+                setattr(body, _SOURCE_FRAME, frame)
+        self.generic_visit(node)
+
+
+@dataclasses.dataclass
+class OpshinSource:
+    """
+    OpShin source code of a validator, used to attribute the cost of its compiled script to the source functions.
+
+    The source must compile to the exact script it is registered for, i.e. with the same OpShin version and options.
+    """
+
+    source: str
+    filename: str = "<unknown>"
+    validator_function_name: str = "validator"
+    # parameters applied to the compiled contract
+    parameters: List[Any] = dataclasses.field(default_factory=list)
+
+    @classmethod
+    def from_file(
+        cls,
+        path: Union[str, os.PathLike],
+        validator_function_name: str = "validator",
+        parameters: Optional[List[Any]] = None,
+    ) -> "OpshinSource":
+        path = pathlib.Path(path)
+        return cls(
+            path.read_text(),
+            str(path),
+            validator_function_name,
+            parameters if parameters is not None else [],
+        )
+
+    def frames(self) -> Dict[str, str]:
+        """Names of the source functions as compiled by OpShin, mapped to their flamegraph frame"""
+        frames = {}
+        name = pathlib.Path(self.filename).name
+        for node in ast.walk(ast.parse(self.source)):
+            if isinstance(node, ast.ClassDef):
+                # methods are compiled to functions named after their class
+                for method in node.body:
+                    if isinstance(method, ast.FunctionDef):
+                        frames[f"{node.name}_{method.name}"] = (
+                            f"{node.name}.{method.name} ({name}:{method.lineno})"
+                        )
+            elif isinstance(node, ast.FunctionDef):
+                frames.setdefault(node.name, f"{node.name} ({name}:{node.lineno})")
+        return frames
+
+    def compile(self) -> uplc.ast.Program:
+        """Compile the source with OpShin, keeping the function names"""
+        try:
+            from opshin.builder import compile as opshin_compile
+        except ImportError as e:
+            raise ImportError(
+                "Cost attribution to OpShin source code requires opshin to be installed"
+            ) from e
+        from .tx_tools import uplc_plutus_data
+
+        program = opshin_compile(
+            ast.parse(self.source, filename=self.filename),
+            contract_filename=self.filename,
+            validator_function_name=self.validator_function_name,
+        )
+        program = uplc.tools.apply(
+            program, *(uplc_plutus_data(p) for p in self.parameters)
+        )
+        _SourceFrameAnnotator(self.frames()).visit(program)
+        return program
+
+
+@dataclasses.dataclass
+class SourceProfile:
+    """Cost of one script evaluation per stack of source functions"""
+
+    cpu: int = 0
+    mem: int = 0
+    error: Optional[str] = None
+    stacks: Dict[Tuple[str, ...], OpCost] = dataclasses.field(
+        default_factory=lambda: defaultdict(OpCost)
+    )
+
+    def collapsed(self, measure: str = "cpu") -> str:
+        """
+        Stacks in the collapsed format of flamegraph.pl, inferno and speedscope,
+        weighted by cpu or mem
+        """
+        assert measure in ("cpu", "mem"), f"Unknown measure {measure}"
+        return "".join(
+            f"{';'.join(stack)} {getattr(cost, measure)}\n"
+            for stack, cost in sorted(self.stacks.items())
+            if getattr(cost, measure) > 0
+        )
+
+    def write(self, path: Union[str, os.PathLike], measure: str = "cpu"):
+        pathlib.Path(path).write_text(self.collapsed(measure))
+
+
+class SourceProfilingMachine(ProfilingMachine):
+    """
+    Profiling machine that also attributes cost to the source functions annotated by :class:`OpshinSource`.
+
+    A function is entered when its body is computed and left when the machine returns to the
+    continuation the body was computed in, so tail calls leave their caller at the same time.
+    """
+
+    def __init__(self, *args, root: str = "script", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.source_profile = SourceProfile()
+        # continuation at function entry and the stack of source functions
+        self._frames: List[Tuple[Any, Tuple[str, ...]]] = [(None, (root,))]
+        self._step_costs = {
+            op: budget_cost_of_op_on_model(self.cek_machine_cost_model, op, 0)
+            for op in CekOp
+        }
+
+    def _count_step(self, op: CekOp):
+        super()._count_step(op)
+        cost = self._step_costs[op]
+        self.source_profile.stacks[self._frames[-1][1]].add(1, cost.cpu, cost.memory)
+
+    def _count_builtin(
+        self, builtin: uplc.ast.BuiltInFun, budget: uplc.cost_model.Budget
+    ):
+        super()._count_builtin(builtin, budget)
+        self.source_profile.stacks[self._frames[-1][1] + (builtin.name,)].add(
+            1, budget.cpu, budget.memory
+        )
+
+    def compute(self, term, context, state):
+        frame = getattr(term, _SOURCE_FRAME, None)
+        if frame is not None:
+            self._frames.append((context, self._frames[-1][1] + (frame,)))
+        return super().compute(term, context, state)
+
+    def return_compute(self, context, value):
+        while len(self._frames) > 1 and self._frames[-1][0] is context:
+            self._frames.pop()
+        return super().return_compute(context, value)
+
+    def eval(self, program: uplc.ast.Program):
+        res = super().eval(program)
+        self.source_profile.cpu = self.profile.cpu
+        self.source_profile.mem = self.profile.mem
+        self.source_profile.error = self.profile.error
+        return res
+
+
+def profile_source(
+    program: uplc.ast.Program,
+    args: List[uplc.ast.PlutusData],
+    allowed_cpu_steps: int,
+    allowed_mem_steps: int,
+    root: str = "script",
+) -> SourceProfile:
+    """Evaluate a program compiled by :meth:`OpshinSource.compile` and return its cost per source function"""
+    machine = SourceProfilingMachine(
+        uplc.cost_model.Budget(allowed_cpu_steps, allowed_mem_steps),
+        uplc.cost_model.default_cek_machine_cost_model_plutus_v3(),
+        uplc.cost_model.default_builtin_cost_model_plutus_v3(),
+        root=root,
+    )
+    machine.eval(uplc.tools.apply(program, *args))
+    return machine.source_profile
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+from pycardano import Transaction
+
+# verification key, signed message and signature
+Signature = Tuple[bytes, bytes, bytes]
+
+
+def vkey_signatures(tx: Transaction, tx_body_hash: bytes) -> List[Signature]:
+    """Signatures of the vkey witnesses of a transaction"""
+    return [
+        (w.vkey.payload, tx_body_hash, w.signature)
+        for w in tx.transaction_witness_set.vkey_witnesses or []
+    ]
+
+
+class SignatureVerifier:
+    """
+    Verifies Ed25519 signatures in batches.
+
+    Duplicate signatures within a batch are verified once,
+    and valid signatures are remembered (at most max_entries of them),
+    so replaying or re-submitting a transaction does not verify its witnesses again.
+    Invalid signatures are never remembered.
+    """
+
+    def __init__(self, max_entries: int = 65536):
+        self.max_entries = max_entries
+        self._valid: "OrderedDict[Signature, None]" = OrderedDict()
+        self.verified = 0
+        self.skipped = 0
+
+    def verify(self, signatures: Iterable[Signature]) -> Optional[Signature]:
+        """Verify all signatures and return the first invalid one, or None if all are valid"""
+        # dicts keep the order, so the first invalid signature is reported
+        pending = dict.fromkeys(signatures)
+        invalid = None
+        for signature in pending:
+            if signature in self._valid:
+                self._valid.move_to_end(signature)
+                self.skipped += 1
+                continue
+            vkey, message, sig = signature
+            self.verified += 1
+            try:
+                VerifyKey(vkey).verify(message, sig)
+            except BadSignatureError:
+                if invalid is None:
+                    invalid = signature
+                continue
+            self._valid[signature] = None
+        while len(self._valid) > self.max_entries:
+            self._valid.popitem(last=False)
+        return invalid
+
+    def info(self) -> dict:
+        """Verification statistics"""
+        return {
+            "verified": self.verified,
+            "skipped": self.skipped,
+            "size": len(self._valid),
+            "max_entries": self.max_entries,
+        }
@@ -1,4 +1,4 @@
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
 import pycardano
 from .ledger.api_v1 import *
@@ -182,15 +182,22 @@ def to_tx_info(
     resolved_inputs: List[pycardano.TransactionOutput],
     resolved_reference_inputs: List[pycardano.TransactionOutput],
     posix_from_slot,
+    datums: Optional[Dict[bytes, pycardano.Datum]] = None,
 ):
+    """
+    Build the TxInfo of the transaction.
+    If the caller already hashed the datums of the transaction, they can be passed in as map from hash to datum.
+    """
     tx_body = tx.transaction_body
-    datums = [
-        o.datum
-        for o in tx_body.outputs + resolved_inputs + resolved_reference_inputs
-        if o.datum is not None
-    ]
-    if tx.transaction_witness_set.plutus_data:
-        datums += tx.transaction_witness_set.plutus_data
+    if datums is None:
+        datums = [
+            o.datum
+            for o in tx_body.outputs + resolved_inputs + resolved_reference_inputs
+            if o.datum is not None
+        ]
+        if tx.transaction_witness_set.plutus_data:
+            datums += tx.transaction_witness_set.plutus_data
+        datums = {pycardano.datum_hash(d).payload: d for d in datums}
 
     redeemers = (
         tx.transaction_witness_set.redeemer
@@ -223,33 +230,29 @@ def to_tx_info(
         #    if isinstance(redeemers, pycardano.RedeemerMap)
         #    else {to_redeemer_purpose(r, tx_body): r.data for r in redeemers}
         # ),
-        [DatumPair(pycardano.datum_hash(d).payload, d) for d in datums],
+        [DatumPair(h, d) for h, d in datums.items()],
         to_tx_id(tx_body.id),
     )
 
 
 def to_spending_script_context(
-    tx_info_args: Tuple, spending_input: pycardano.TransactionInput
+    tx_info: TxInfo, spending_input: pycardano.TransactionInput
 ):
-    return ScriptContext(
-        to_tx_info(*tx_info_args), Spending(to_tx_out_ref(spending_input))
-    )
+    return ScriptContext(tx_info, Spending(to_tx_out_ref(spending_input)))
 
 
 def to_minting_script_context(
-    tx_info_args: Tuple, minting_script: pycardano.PlutusV2Script
+    tx_info: TxInfo, minting_script: pycardano.PlutusV2Script
 ):
     return ScriptContext(
-        to_tx_info(*tx_info_args),
+        tx_info,
         Minting(pycardano.script_hash(minting_script).payload),
     )
 
 
-def to_certificate_script_context(tx_info_args, certificate):
-    return ScriptContext(to_tx_info(*tx_info_args), Certifying(to_dcert(certificate)))
+def to_certificate_script_context(tx_info: TxInfo, certificate):
+    return ScriptContext(tx_info, Certifying(to_dcert(certificate)))
 
 
-def to_withdrawal_script_context(tx_info_args, script_hash):
-    return ScriptContext(
-        to_tx_info(*tx_info_args), Rewarding(to_staking_hash(script_hash))
-    )
+def to_withdrawal_script_context(tx_info: TxInfo, script_hash):
+    return ScriptContext(tx_info, Rewarding(to_staking_hash(script_hash)))
@@ -1,5 +1,5 @@
-from functools import cache
-from typing import Optional, Union, List
+from typing import Any, Dict, Mapping, Optional, Tuple, Union, List
+import dataclasses
 from dataclasses import dataclass
 
 import cbor2
@@ -15,7 +15,10 @@ from pycardano import (
     PlutusV1Script,
     PlutusV2Script,
     UTxO,
+    RawCBOR,
+    RawPlutusData,
 )
+from pycardano.serialization import ByteString, IndefiniteList
 
 from pycardano import Datum as Anything, PlutusData
 
@@ -23,18 +26,21 @@ from pycardano import Datum as Anything, PlutusData
 from .ledger.api_v1 import ScriptContext as ScriptContextV1
 from .ledger.api_v2 import ScriptContext as ScriptContextV2
 from .to_script_context_v2 import (
+    to_tx_info as to_tx_info_v2,
     to_spending_script_context as to_spending_script_context_v2,
     to_minting_script_context as to_minting_script_context_v2,
     to_certificate_script_context as to_certificate_script_context_v2,
     to_withdrawal_script_context as to_withdrawal_script_context_v2,
 )
 from .to_script_context_v1 import (
+    to_tx_info as to_tx_info_v1,
     to_spending_script_context as to_spending_script_context_v1,
     to_minting_script_context as to_minting_script_context_v1,
     to_certificate_script_context as to_certificate_script_context_v1,
     to_withdrawal_script_context as to_withdrawal_script_context_v1,
 )
 
+from .eval_cache import UnflattenCache
 from .tool import ScriptType
 
 
@@ -85,60 +91,142 @@ def as_redeemer(
         return r
 
 
+def witness_scripts_by_hash(
+    witness_set: pycardano.TransactionWitnessSet,
+) -> Dict[ScriptHash, Tuple[pycardano.ScriptType, ScriptType]]:
+    """Hash every plutus script of the witness set once"""
+    scripts = {}
+    for s in witness_set.plutus_v1_script or []:
+        scripts[plutus_script_hash(PlutusV1Script(s))] = (s, ScriptType.PlutusV1)
+    for s in witness_set.plutus_v2_script or []:
+        scripts[plutus_script_hash(PlutusV2Script(s))] = (s, ScriptType.PlutusV2)
+    return scripts
+
+
+def redeemers_by_purpose(
+    redeemers: Optional[pycardano.Redeemers],
+) -> Dict[Tuple[RedeemerTag, int], pycardano.Redeemer]:
+    """Index the redeemers by their tag and index"""
+    # Redeemers is Union[RedeemerMap, List[Redeemer]]
+    return {(r.tag, r.index): as_redeemer(r, redeemers) for r in redeemers or []}
+
+
+def transaction_ex_units(tx: pycardano.Transaction) -> Tuple[int, int]:
+    """Memory and steps requested by the redeemers of the transaction"""
+    redeemers = tx.transaction_witness_set.redeemer or []
+    if isinstance(redeemers, pycardano.RedeemerMap):
+        redeemers = redeemers.values()
+    mem = steps = 0
+    for r in redeemers:
+        mem += r.ex_units.mem
+        steps += r.ex_units.steps
+    return mem, steps
+
+
+@dataclass
+class TransactionDatums:
+    """Datums of a transaction, hashed once and shared by evaluating and submitting it."""
+
+    # witness datums by their hash
+    witness: Dict[pycardano.DatumHash, pycardano.Datum]
+    # hash of the inline datum of each output, None for outputs without inline datum
+    outputs: List[Optional[pycardano.DatumHash]]
+
+    @classmethod
+    def from_transaction(cls, tx: pycardano.Transaction) -> "TransactionDatums":
+        return cls(
+            {datum_hash(d): d for d in tx.transaction_witness_set.plutus_data or []},
+            [
+                datum_hash(o.datum) if o.datum is not None else None
+                for o in tx.transaction_body.outputs
+            ],
+        )
+
+
+def datums_by_hash(
+    tx: pycardano.Transaction,
+    resolved_inputs: List[UTxO],
+    resolved_reference_inputs: List[UTxO],
+    tx_datums: TransactionDatums,
+    resolved_datum_hashes: Optional[
+        Mapping[pycardano.TransactionInput, pycardano.DatumHash]
+    ] = None,
+) -> Dict[bytes, pycardano.Datum]:
+    """
+    Map from hash to datum of all datums in the transaction, as listed in the TxInfo.
+    Hashes of inline datums of resolved inputs that are already known to the caller are reused.
+    """
+    if resolved_datum_hashes is None:
+        resolved_datum_hashes = {}
+    datums = {}
+    for o, h in zip(tx.transaction_body.outputs, tx_datums.outputs):
+        if h is not None:
+            datums[h.payload] = o.datum
+    for u in resolved_inputs + resolved_reference_inputs:
+        if u.output.datum is not None:
+            h = resolved_datum_hashes.get(u.input) or datum_hash(u.output.datum)
+            datums[h.payload] = u.output.datum
+    for h, d in tx_datums.witness.items():
+        datums[h.payload] = d
+    return datums
+
+
 def generate_script_contexts_resolved(
     tx: pycardano.Transaction,
     resolved_inputs: List[UTxO],
     resolved_reference_inputs: List[UTxO],
     posix_from_slot,
+    resolved_datum_hashes: Optional[
+        Mapping[pycardano.TransactionInput, pycardano.DatumHash]
+    ] = None,
+    tx_datums: Optional[TransactionDatums] = None,
 ):
+    # hash every datum of the transaction once
+    if tx_datums is None:
+        tx_datums = TransactionDatums.from_transaction(tx)
     tx_info_args = (
         tx,
         [i.output for i in resolved_inputs],
         [i.output for i in resolved_reference_inputs],
         posix_from_slot,
+        datums_by_hash(
+            tx,
+            resolved_inputs,
+            resolved_reference_inputs,
+            tx_datums,
+            resolved_datum_hashes,
+        ),
     )
-    datum = None
+    # the TxInfo is the same for all scripts of one plutus version, so build it once per version
+    tx_infos = {}
+
+    def tx_info(script_type: ScriptType):
+        if script_type not in tx_infos:
+            if script_type is ScriptType.PlutusV1:
+                tx_infos[script_type] = to_tx_info_v1(*tx_info_args)
+            else:
+                tx_infos[script_type] = to_tx_info_v2(*tx_info_args)
+        return tx_infos[script_type]
+
+    witness_scripts = witness_scripts_by_hash(tx.transaction_witness_set)
+    redeemers = redeemers_by_purpose(tx.transaction_witness_set.redeemer)
+
     script_contexts = []
     for i, spending_input in enumerate(resolved_inputs):
         if not isinstance(spending_input.output.address.payment_part, ScriptHash):
             continue
-        try:
-            # Redeemers is Union[RedeemerMap, List[Redeemer]]
-            spending_redeemer = as_redeemer(
-                next(
-                    r
-                    for r in tx.transaction_witness_set.redeemer
-                    if r.index == i and r.tag == RedeemerTag.SPEND
-                ),
-                tx.transaction_witness_set.redeemer,
-            )
-        except (StopIteration, TypeError):
+        spending_redeemer = redeemers.get((RedeemerTag.SPEND, i))
+        if spending_redeemer is None:
             raise ValueError(
                 f"Missing redeemer for script input {i} (index or tag set incorrectly or missing redeemer)"
             )
-        script_type = None
-        try:
-            spending_script = next(
-                s
-                for s in tx.transaction_witness_set.plutus_v2_script
-                if plutus_script_hash(PlutusV2Script(s))
-                == spending_input.output.address.payment_part
+        spending_script, script_type = witness_scripts.get(
+            spending_input.output.address.payment_part, (None, None)
+        )
+        if spending_script is None:
+            raise NotImplementedError(
+                f"Can not validate spending of non plutus v1 or v2 script (or plutus v1 or v2 script is not in context)"
             )
-            script_type = ScriptType.PlutusV2
-
-        except (StopIteration, TypeError):
-            try:
-                spending_script = next(
-                    s
-                    for s in tx.transaction_witness_set.plutus_v1_script
-                    if plutus_script_hash(PlutusV1Script(s))
-                    == spending_input.output.address.payment_part
-                )
-                script_type = ScriptType.PlutusV1
-            except Exception as e:
-                raise NotImplementedError(
-                    f"Can not validate spending of non plutus v1 or v2 script (or plutus v1 or v2 script is not in context)"
-                )
         if spending_input.output.datum is not None:
             assert (
                 script_type != ScriptType.PlutusV1
@@ -146,13 +234,8 @@ def generate_script_contexts_resolved(
             datum = spending_input.output.datum
         elif spending_input.output.datum_hash is not None:
             datum_h = spending_input.output.datum_hash
-            try:
-                datum = next(
-                    d
-                    for d in tx.transaction_witness_set.plutus_data or []
-                    if datum_hash(d) == datum_h
-                )
-            except StopIteration:
+            datum = tx_datums.witness.get(datum_h)
+            if datum is None:
                 raise ValueError(
                     f"No datum with hash '{datum_h.payload.hex()}' provided for transaction"
                 )
@@ -163,11 +246,11 @@ def generate_script_contexts_resolved(
 
         if script_type is ScriptType.PlutusV1:
             script_context = to_spending_script_context_v1(
-                tx_info_args, spending_input.input
+                tx_info(ScriptType.PlutusV1), spending_input.input
             )
         elif script_type is ScriptType.PlutusV2:
             script_context = to_spending_script_context_v2(
-                tx_info_args, spending_input.input
+                tx_info(ScriptType.PlutusV2), spending_input.input
             )
         else:
             raise NotImplementedError()
@@ -178,70 +261,39 @@ def generate_script_contexts_resolved(
                 datum,
                 spending_redeemer,
                 script_context,
-                # ScriptContext(tx_info, Spending(to_tx_out_ref(spending_input.input))),
             )
         )
     for i, minting_script_hash in enumerate(tx.transaction_body.mint or []):
-        try:
-            minting_redeemer = as_redeemer(
-                next(
-                    r
-                    for r in tx.transaction_witness_set.redeemer
-                    if r.index == i and r.tag == RedeemerTag.MINT
-                ),
-                tx.transaction_witness_set.redeemer,
-            )
-        except StopIteration:
+        minting_redeemer = redeemers.get((RedeemerTag.MINT, i))
+        if minting_redeemer is None:
             raise ValueError(
                 f"Missing redeemer for mint {i} (index or tag set incorrectly or missing redeemer)"
             )
-        minting_script, script_type = next(
-            (
-                (s, ScriptType.PlutusV1)
-                for s in tx.transaction_witness_set.plutus_v1_script or []
-                if plutus_script_hash(PlutusV2Script(s)) == minting_script_hash
-            ),
-            (None, None),
+        minting_script, script_type = witness_scripts.get(
+            minting_script_hash, (None, None)
         )
-        if not minting_script:
-            minting_script, script_type = (
-                next(
-                    (
-                        (s, ScriptType.PlutusV2)
-                        for s in tx.transaction_witness_set.plutus_v2_script or []
-                        if plutus_script_hash(PlutusV2Script(s)) == minting_script_hash
-                    ),
-                    (minting_script, script_type),
-                )
-                if not minting_script
-                else minting_script
-            )
 
         assert (
             minting_script and script_type
         ), f"Can not validate spending of non plutus v1 or v2 scripts (or plutus v1 or v2 script is not in context)"
 
         if script_type == ScriptType.PlutusV1:
-            script_context = to_minting_script_context_v1(tx_info_args, minting_script)
+            script_context = to_minting_script_context_v1(
+                tx_info(ScriptType.PlutusV1), minting_script
+            )
         elif script_type == ScriptType.PlutusV2:
-            script_context = to_minting_script_context_v2(tx_info_args, minting_script)
+            script_context = to_minting_script_context_v2(
+                tx_info(ScriptType.PlutusV2), minting_script
+            )
         else:
             raise NotImplementedError()
 
         script_contexts.append(
-            ScriptInvocation(minting_script, datum, minting_redeemer, script_context)
+            ScriptInvocation(minting_script, None, minting_redeemer, script_context)
         )
     for i, certificate in enumerate(tx.transaction_body.certificates or []):
-        try:
-            certificate_redeemer = as_redeemer(
-                next(
-                    r
-                    for r in tx.transaction_witness_set.redeemer or []
-                    if r.index == i and r.tag == RedeemerTag.CERTIFICATE
-                ),
-                tx.transaction_witness_set.redeemer,
-            )
-        except StopIteration:
+        certificate_redeemer = redeemers.get((RedeemerTag.CERTIFICATE, i))
+        if certificate_redeemer is None:
             if isinstance(certificate, pycardano.StakeRegistration):
                 #  TODO: Check can this always be skipped?
                 continue
@@ -249,108 +301,156 @@ def generate_script_contexts_resolved(
                 f"Missing redeemer for certificate {i} (index or tag set incorrectly or missing redeemer)"
             )
 
-        certificate_script, script_type = next(
-            (
-                (s, ScriptType.PlutusV1)
-                for s in tx.transaction_witness_set.plutus_v1_script or []
-                if plutus_script_hash(PlutusV1Script(s))
-                == certificate.stake_credential.credential
-            ),
-            (None, None),
-        )
-        certificate_script, script_type = next(
-            (
-                (s, ScriptType.PlutusV2)
-                for s in tx.transaction_witness_set.plutus_v2_script or []
-                if plutus_script_hash(PlutusV2Script(s))
-                == certificate.stake_credential.credential
-            ),
-            (certificate_script, script_type),
+        certificate_script, script_type = witness_scripts.get(
+            certificate.stake_credential.credential, (None, None)
         )
         assert (
             certificate_script and script_type
         ), "Can not validate spending of non plutus v1 or v2 scripts (or plutus v1 or v2 script is not in context)"
 
         if script_type == ScriptType.PlutusV1:
-            script_context = to_certificate_script_context_v1(tx_info_args, certificate)
+            script_context = to_certificate_script_context_v1(
+                tx_info(ScriptType.PlutusV1), certificate
+            )
         elif script_type == ScriptType.PlutusV2:
-            script_context = to_certificate_script_context_v2(tx_info_args, certificate)
+            script_context = to_certificate_script_context_v2(
+                tx_info(ScriptType.PlutusV2), certificate
+            )
         else:
             raise NotImplementedError()
 
         script_contexts.append(
             ScriptInvocation(
-                certificate_script, datum, certificate_redeemer, script_context
+                certificate_script, None, certificate_redeemer, script_context
             )
         )
     for i, address in enumerate(sorted(tx.transaction_body.withdraws or {})):
-        try:
-            withdrawal_redeemer = as_redeemer(
-                next(
-                    r
-                    for r in tx.transaction_witness_set.redeemer
-                    if r.index == i and r.tag == RedeemerTag.WITHDRAWAL
-                ),
-                tx.transaction_witness_set.redeemer,
-            )
-        except StopIteration:
+        withdrawal_redeemer = redeemers.get((RedeemerTag.WITHDRAWAL, i))
+        if withdrawal_redeemer is None:
             raise ValueError(
                 f"Missing redeemer for withdrawal {i} (index or tag set incorrectly or missing redeemer)"
             )
         script_hash = pycardano.Address.from_primitive(address).staking_part
-        withdrawal_script, script_type = next(
-            (
-                (s, ScriptType.PlutusV1)
-                for s in tx.transaction_witness_set.plutus_v1_script or []
-                if plutus_script_hash(PlutusV1Script(s)) == script_hash
-            ),
-            (None, None),
-        )
-        withdrawal_script, script_type = next(
-            (
-                (s, ScriptType.PlutusV2)
-                for s in tx.transaction_witness_set.plutus_v2_script or []
-                if plutus_script_hash(PlutusV2Script(s)) == script_hash
-            ),
-            (withdrawal_script, script_type),
-        )
+        withdrawal_script, script_type = witness_scripts.get(script_hash, (None, None))
         assert (
             withdrawal_script and script_type
         ), "Can not validate spending of non plutus v1 or v2 scripts (or plutus v1 or v2 script is not in context)"
 
         if script_type == ScriptType.PlutusV1:
-            script_context = to_withdrawal_script_context_v1(tx_info_args, script_hash)
+            script_context = to_withdrawal_script_context_v1(
+                tx_info(ScriptType.PlutusV1), script_hash
+            )
         elif script_type == ScriptType.PlutusV2:
-            script_context = to_withdrawal_script_context_v2(tx_info_args, script_hash)
+            script_context = to_withdrawal_script_context_v2(
+                tx_info(ScriptType.PlutusV2), script_hash
+            )
         else:
             raise NotImplementedError("Only Plutus V1 and V2 scripts are supported.")
 
         script_contexts.append(
             ScriptInvocation(
-                withdrawal_script, datum, withdrawal_redeemer, script_context
+                withdrawal_script, None, withdrawal_redeemer, script_context
             )
         )
 
     return script_contexts
 
 
-@cache
+# shared by all evaluations of the process, configure it by setting its attributes
+unflatten_cache = UnflattenCache()
+
+
 def uplc_unflat(script: bytes):
-    return uplc.unflatten(script)
+    return unflatten_cache.get(script)
+
+
+DataMemo = Dict[int, Tuple[Any, uplc.ast.PlutusData]]
+
 
+def uplc_plutus_data(
+    a: pycardano.Datum, memo: Optional[DataMemo] = None
+) -> uplc.ast.PlutusData:
+    """
+    Convert plutus data to UPLC data.
 
-def uplc_plutus_data(a: pycardano.Datum) -> PlutusData:
+    Equivalent to decoding the CBOR encoding of the data, but converts pycardano PlutusData
+    (including the ledger api dataclasses) and primitives directly.
+    Pass the same memo to convert PlutusData objects that are shared between several values only once.
+    """
+    if isinstance(a, PlutusData):
+        cached = memo.get(id(a)) if memo is not None else None
+        if cached is not None and cached[0] is a:
+            return cached[1]
+        field_data = []
+        for f in dataclasses.fields(a):
+            v = getattr(a, f.name)
+            if v is None and f.metadata.get("optional"):
+                continue
+            field_data.append(uplc_plutus_data(v, memo))
+        res = uplc.ast.PlutusConstr(a.CONSTR_ID, uplc.ast.frozenlist(field_data))
+        if memo is not None:
+            # keep a reference to the object so that its id is not reused
+            memo[id(a)] = (a, res)
+        return res
+    if isinstance(a, int) and not isinstance(a, bool):
+        return uplc.ast.PlutusInteger(a)
+    if isinstance(a, bytes):
+        return uplc.ast.PlutusByteString(a)
+    if isinstance(a, ByteString):
+        return uplc.ast.PlutusByteString(a.value)
+    if isinstance(a, (list, IndefiniteList)):
+        return uplc.ast.PlutusList(
+            uplc.ast.frozenlist([uplc_plutus_data(x, memo) for x in a])
+        )
+    if isinstance(a, dict):
+        return uplc.ast.PlutusMap(
+            uplc.ast.frozendict.frozendict(
+                {
+                    uplc_plutus_data(k, memo): uplc_plutus_data(v, memo)
+                    for k, v in a.items()
+                }
+            )
+        )
+    if isinstance(a, RawPlutusData):
+        return uplc.ast.data_from_cbortag(a.data)
+    if isinstance(a, RawCBOR):
+        return uplc.ast.data_from_cbor(a.cbor)
     return uplc.ast.data_from_cbor(cbor2.dumps(a, default=pycardano.default_encoder))
 
 
-def evaluate_script(script_invocation: ScriptInvocation):
-    uplc_program = uplc_unflat(script_invocation.script)
-    args = [script_invocation.redeemer.data, script_invocation.script_context]
+def uplc_script_context(
+    script_context: Union[ScriptContextV1, ScriptContextV2],
+    data_cache: Optional[DataMemo] = None,
+) -> uplc.ast.PlutusData:
+    """
+    Convert the script context to UPLC data.
+
+    All script contexts of a transaction share their TxInfo,
+    pass the same data_cache to convert the TxInfo only once per transaction.
+    """
+    return uplc_plutus_data(script_context, data_cache)
+
+
+def uplc_arguments(
+    script_invocation: ScriptInvocation,
+    data_cache: Optional[DataMemo] = None,
+) -> List[uplc.ast.PlutusData]:
+    """Arguments the script of the invocation is applied to, as UPLC data."""
+    args = [
+        uplc_plutus_data(script_invocation.redeemer.data, data_cache),
+        uplc_script_context(script_invocation.script_context, data_cache),
+    ]
     if script_invocation.datum is not None:
-        args.insert(0, script_invocation.datum)
-    args = [uplc_plutus_data(a) for a in args]
-    allowed_cpu_steps = script_invocation.redeemer.ex_units.steps
-    allowed_mem_steps = script_invocation.redeemer.ex_units.mem
+        args.insert(0, uplc_plutus_data(script_invocation.datum, data_cache))
+    return args
+
+
+def evaluate_uplc(
+    uplc_program,
+    args: List[uplc.ast.PlutusData],
+    allowed_cpu_steps: int,
+    allowed_mem_steps: int,
+):
     res = uplc.eval(
         uplc.tools.apply(uplc_program, *args),
         budget=uplc.cost_model.Budget(allowed_cpu_steps, allowed_mem_steps),
@@ -364,3 +464,15 @@ def evaluate_script(script_invocation: ScriptInvocation):
         ),
         logs,
     )
+
+
+def evaluate_script(
+    script_invocation: ScriptInvocation,
+    data_cache: Optional[DataMemo] = None,
+):
+    return evaluate_uplc(
+        uplc_unflat(script_invocation.script),
+        uplc_arguments(script_invocation, data_cache),
+        script_invocation.redeemer.ex_units.steps,
+        script_invocation.redeemer.ex_units.mem,
+    )
@@ -0,0 +1,388 @@
+import copy
+import hashlib
+from typing import (
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import cbor2
+from pycardano import (
+    Address,
+    Datum,
+    DatumHash,
+    ScriptHash,
+    TransactionInput,
+    UTxO,
+    RawCBOR,
+    VerificationKeyHash,
+    datum_hash,
+    default_encoder,
+)
+
+StakingCredential = Union[VerificationKeyHash, ScriptHash]
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class CowDict(MutableMapping[K, V], Generic[K, V]):
+    """
+    Copy-on-write dictionary.
+
+    Entries live in a chain of layers of which only the topmost one is written to.
+    Lower layers are never modified again and may be shared between several dictionaries,
+    so :meth:`fork` is cheap and every fork only uses memory for the entries in which it diverges.
+    When a layer is shared, it is merged with the layers below it as long as it is at least half their size.
+    This keeps chains O(log n) deep at an amortized cost of O(log n) per changed entry,
+    instead of ever copying the whole dictionary at once.
+    Iteration follows the insertion order of a regular dict.
+    """
+
+    def __init__(self, data: Optional[Iterable[Tuple[K, V]]] = None):
+        self._parent: Optional[CowDict[K, V]] = None
+        self._depth = 0
+        self._local: Dict[K, V] = dict(data) if data is not None else {}
+        # keys of lower layers that are deleted (or re-inserted at the end) in this layer
+        self._hidden: Set[K] = set()
+        # keys of lower layers that are overwritten in place in this layer
+        self._overrides: Set[K] = set()
+        self._len = len(self._local)
+
+    def _lookup(self, key):
+        layer = self
+        while layer is not None:
+            value = layer._local.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if key in layer._hidden:
+                return _MISSING
+            layer = layer._parent
+        return _MISSING
+
+    def _in_parent(self, key) -> bool:
+        return (
+            self._parent is not None
+            and key not in self._hidden
+            and self._parent._lookup(key) is not _MISSING
+        )
+
+    def __getitem__(self, key: K) -> V:
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self._lookup(key) is not _MISSING
+
+    def __setitem__(self, key: K, value: V):
+        if key not in self._local:
+            if self._in_parent(key):
+                self._overrides.add(key)
+            else:
+                self._len += 1
+        self._local[key] = value
+
+    def __delitem__(self, key: K):
+        if key in self._local:
+            del self._local[key]
+            if key in self._overrides:
+                self._overrides.remove(key)
+                self._hidden.add(key)
+        elif self._in_parent(key):
+            self._hidden.add(key)
+        else:
+            raise KeyError(key)
+        self._len -= 1
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[K]:
+        for key, _ in self.items():
+            yield key
+
+    def items(self) -> Iterator[Tuple[K, V]]:
+        if self._parent is not None:
+            for key, value in self._parent.items():
+                if key in self._overrides:
+                    yield key, self._local[key]
+                elif key not in self._hidden:
+                    yield key, value
+        for key, value in self._local.items():
+            if key not in self._overrides:
+                yield key, value
+
+    def values(self) -> Iterator[V]:
+        for _, value in self.items():
+            yield value
+
+    def owns(self, key: K) -> bool:
+        """Whether the value for key was set on the writable layer of this dictionary."""
+        return key in self._local
+
+    def child(self) -> "CowDict[K, V]":
+        """
+        Return a new dictionary layered on top of this one.
+        This dictionary must not be modified afterwards, use :meth:`fork` otherwise.
+        """
+        return CowDict._layer_over(CowDict._compact(self))
+
+    def fork(self) -> "CowDict[K, V]":
+        """Return an independent copy of this dictionary in amortized O(log n) per changed entry."""
+        if self._local or self._hidden:
+            # move the current contents into a shared layer and write to a fresh layer on top
+            base = CowDict.__new__(CowDict)
+            base.__dict__.update(self.__dict__)
+            parent = CowDict._compact(base)
+        elif self._parent is not None:
+            parent = self._parent
+        else:
+            return CowDict()
+        self.__dict__.update(CowDict._layer_over(parent).__dict__)
+        return CowDict._layer_over(parent)
+
+    def _size(self) -> int:
+        return len(self._local) + len(self._hidden)
+
+    @staticmethod
+    def _compact(layer: "CowDict[K, V]") -> "CowDict[K, V]":
+        # merge the shared layer downwards while it is at least half the size of the layer below
+        while layer._parent is not None and 2 * layer._size() >= layer._parent._size():
+            layer = CowDict._merge(layer, layer._parent)
+        return layer
+
+    @staticmethod
+    def _merge(upper: "CowDict[K, V]", lower: "CowDict[K, V]") -> "CowDict[K, V]":
+        # new layer over the parent of lower with the combined contents of both layers
+        merged = CowDict.__new__(CowDict)
+        merged._parent = lower._parent
+        merged._depth = lower._depth
+        merged._local = dict(lower._local)
+        merged._hidden = set(lower._hidden)
+        merged._overrides = set(lower._overrides)
+        merged._len = lower._len
+        # replay the changes of upper, deletions first as deleted keys may be re-inserted at the end
+        for key in upper._hidden:
+            del merged[key]
+        for key, value in upper._local.items():
+            merged[key] = value
+        return merged
+
+    @staticmethod
+    def _layer_over(parent: "CowDict[K, V]") -> "CowDict[K, V]":
+        layer = CowDict()
+        layer._parent = parent
+        layer._depth = parent._depth + 1
+        layer._len = parent._len
+        return layer
+
+
+class UTxOStore:
+    """
+    Indexed set of unspent transaction outputs.
+
+    UTxOs are indexed by their transaction input and by their address.
+    Each address holds an insertion-ordered dict keyed by the transaction input,
+    so adding and removing a UTxO are O(1) while the UTxOs of an address
+    are still listed in the order in which they were added.
+    The lovelace held by outputs of each staking credential is tracked incrementally,
+    so the controlled amount of a stake address can be looked up in O(1).
+    Inline datums are serialized once when their output is added, which yields both their hash
+    and a view of the UTxO with the datum in its serialized form, as chain backends return it.
+    Datums are kept in a datum store by hash for as long as an unspent output refers to them,
+    either as inline datum or by datum hash.
+    The datum of an output that only holds the datum hash is known once it was added with :meth:`add_datum`,
+    e.g. from the witness set of the transaction that created the output.
+    All indices are copy-on-write dictionaries, so :meth:`fork` is cheap.
+    """
+
+    def __init__(self):
+        # map from utxo to its address, the utxo itself, the hash of its datum
+        # and the utxo with its inline datum serialized
+        self._by_input: CowDict[
+            TransactionInput, Tuple[str, UTxO, Optional[DatumHash], UTxO]
+        ] = CowDict()
+        # map from address to outputs, in insertion order
+        self._by_address: CowDict[str, CowDict[TransactionInput, UTxO]] = CowDict()
+        # map from staking credential to the lovelace held by its outputs
+        self._stake_lovelace: CowDict[StakingCredential, int] = CowDict()
+        # map from datum hash to the datum (None while unknown) and the number of unspent outputs referring to it
+        self._datums: CowDict[DatumHash, Tuple[Optional[Datum], int]] = CowDict()
+
+    def __len__(self) -> int:
+        return len(self._by_input)
+
+    def __contains__(self, txi: TransactionInput) -> bool:
+        return txi in self._by_input
+
+    def add(self, utxo: UTxO, datum_h: Optional[DatumHash] = None):
+        """
+        Add a UTxO, replacing any existing UTxO with the same input.
+        Pass the hash of its inline datum if it is already known to avoid hashing it again.
+        """
+        if utxo.input in self._by_input:
+            self.remove(utxo.input)
+        address = str(utxo.output.address)
+        datum = utxo.output.datum
+        serialized = utxo
+        if isinstance(datum, RawCBOR):
+            if datum_h is None:
+                datum_h = datum_hash(datum)
+        elif datum is not None:
+            datum_cbor = cbor2.dumps(datum, default=default_encoder)
+            if datum_h is None:
+                datum_h = DatumHash(
+                    hashlib.blake2b(datum_cbor, digest_size=32).digest()
+                )
+            output = copy.copy(utxo.output)
+            output.datum = RawCBOR(datum_cbor)
+            serialized = UTxO(utxo.input, output)
+        else:
+            datum_h = utxo.output.datum_hash
+        if datum_h is not None:
+            known, refs = self._datums.get(datum_h, (None, 0))
+            self._datums[datum_h] = (datum if known is None else known, refs + 1)
+        self._by_input[utxo.input] = (address, utxo, datum_h, serialized)
+        self._writable_address_utxos(address)[utxo.input] = utxo
+        self._update_stake(utxo, utxo.output.amount.coin)
+
+    def remove(self, txi: TransactionInput) -> UTxO:
+        """Remove the UTxO spent by the given input and return it."""
+        address, utxo, datum_h, _ = self._by_input.pop(txi)
+        if datum_h is not None:
+            datum, refs = self._datums[datum_h]
+            if refs > 1:
+                self._datums[datum_h] = (datum, refs - 1)
+            else:
+                del self._datums[datum_h]
+        address_utxos = self._writable_address_utxos(address)
+        del address_utxos[txi]
+        if not address_utxos:
+            del self._by_address[address]
+        self._update_stake(utxo, -utxo.output.amount.coin)
+        return utxo
+
+    def _writable_address_utxos(
+        self, address: str
+    ) -> "CowDict[TransactionInput, UTxO]":
+        address_utxos = self._by_address.get(address)
+        if address_utxos is None:
+            address_utxos = self._by_address[address] = CowDict()
+        elif not self._by_address.owns(address):
+            # the per-address dict is shared with a fork, layer our changes on top of it
+            address_utxos = self._by_address[address] = address_utxos.child()
+        return address_utxos
+
+    def _update_stake(self, utxo: UTxO, lovelace: int):
+        credential = utxo.output.address.staking_part
+        # pointer addresses are not resolved to their staking credential
+        if not isinstance(credential, (VerificationKeyHash, ScriptHash)):
+            return
+        total = self._stake_lovelace.get(credential, 0) + lovelace
+        if total:
+            self._stake_lovelace[credential] = total
+        else:
+            self._stake_lovelace.pop(credential, None)
+
+    def get(self, txi: TransactionInput) -> UTxO:
+        return self._by_input[txi][1]
+
+    def address_of(self, txi: TransactionInput) -> str:
+        return self._by_input[txi][0]
+
+    def datum_hash(self, txi: TransactionInput) -> Optional[DatumHash]:
+        """Hash of the inline datum or the datum hash of the UTxO, None if it has no datum."""
+        return self._by_input[txi][2]
+
+    def add_datum(self, datum_h: DatumHash, datum: Datum):
+        """Make the datum with the given hash known, if an unspent output refers to it."""
+        known, refs = self._datums.get(datum_h, (None, 0))
+        if known is None and refs:
+            self._datums[datum_h] = (datum, refs)
+
+    def datum(self, datum_h: DatumHash) -> Datum:
+        datum = self._datums[datum_h][0]
+        if datum is None:
+            raise KeyError(datum_h)
+        return datum
+
+    def address_utxos(
+        self, address: Union[str, Address], serialized_datums: bool = False
+    ) -> List[UTxO]:
+        """
+        UTxOs of the address in the order in which they were added.
+        If serialized_datums is set, inline datums are returned as RawCBOR.
+        """
+        address_utxos = self._by_address.get(str(address))
+        if address_utxos is None:
+            return []
+        if serialized_datums:
+            return [self._by_input[txi][3] for txi in address_utxos]
+        return list(address_utxos.values())
+
+    def addresses(self) -> Iterator[str]:
+        return iter(self._by_address)
+
+    def stake_lovelace(self, credential: StakingCredential) -> int:
+        """Lovelace held by all outputs whose address has the given staking credential."""
+        return self._stake_lovelace.get(credential, 0)
+
+    def dump(self) -> dict:
+        """
+        The UTxOs and known datums in their CBOR encoding, see :meth:`load`.
+        The UTxOs of every address are listed in the order in which they were added.
+        """
+        utxos = []
+        for address_utxos in self._by_address.values():
+            for txi in address_utxos:
+                _, _, datum_h, serialized = self._by_input[txi]
+                utxos.append(
+                    (
+                        serialized.to_cbor(),
+                        datum_h.payload if datum_h is not None else None,
+                    )
+                )
+        datums = [
+            (datum_h.payload, cbor2.dumps(datum, default=default_encoder))
+            for datum_h, (datum, _) in self._datums.items()
+            if datum is not None
+        ]
+        return {"utxos": utxos, "datums": datums}
+
+    @classmethod
+    def load(cls, dumped: dict) -> "UTxOStore":
+        """Rebuild a store from :meth:`dump`, keeping the datum hashes as they were"""
+        store = cls()
+        for utxo_cbor, datum_h in dumped["utxos"]:
+            store.add(
+                UTxO.from_cbor(utxo_cbor),
+                DatumHash(datum_h) if datum_h is not None else None,
+            )
+        for datum_h, datum_cbor in dumped["datums"]:
+            store.add_datum(DatumHash(datum_h), RawCBOR(datum_cbor))
+        return store
+
+    def fork(self) -> "UTxOStore":
+        """
+        Return an independent copy of this store.
+
+        Runs in O(1), both stores share their current entries until either of them is modified.
+        """
+        store = UTxOStore.__new__(UTxOStore)
+        store._by_input = self._by_input.fork()
+        store._by_address = self._by_address.fork()
+        store._stake_lovelace = self._stake_lovelace.fork()
+        store._datums = self._datums.fork()
+        return store
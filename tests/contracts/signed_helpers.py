@@ -0,0 +1,22 @@
+from opshin.prelude import *
+
+
+@dataclass()
+class Owner(PlutusData):
+    CONSTR_ID = 0
+    pkh: bytes
+
+    def signed(self, pkh: bytes) -> bool:
+        return self.pkh == pkh
+
+
+def count_signatories(signatories: List[bytes]) -> int:
+    n = 0
+    for s in signatories:
+        n += 1
+    return n
+
+
+def validator(owner: Owner, redeemer: None, context: ScriptContext) -> None:
+    assert count_signatories(context.tx_info.signatories) > 0, "no signatures"
+    assert owner.signed(context.tx_info.signatories[0]), "not signed"
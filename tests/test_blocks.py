@@ -0,0 +1,115 @@
+import dataclasses
+
+import pycardano
+from starlette.testclient import TestClient
+
+from plutus_bench import MockUser, NativeMockChainContext
+from plutus_bench.mock import MockFrostApi
+from plutus_bench.mockfrost.server import app
+
+from .test_phase1 import transfer
+
+
+def spend_change(api: MockFrostApi, user: MockUser, tx: pycardano.Transaction):
+    """Spend the change output of a transaction that may still be in the mempool"""
+    index = len(tx.transaction_body.outputs) - 1
+    change = pycardano.UTxO(
+        pycardano.TransactionInput(tx.id, index), tx.transaction_body.outputs[index]
+    )
+    builder = pycardano.TransactionBuilder(NativeMockChainContext(api))
+    builder.add_input(change)
+    return builder.build_and_sign([user.signing_key], change_address=user.address)
+
+
+def test_transactions_form_blocks():
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(10_000_000)
+    genesis = api.block_latest(return_type="json")
+    assert genesis["tx_count"] == 0
+    tx = transfer(api, user)
+    api.submit_tx(tx)
+    block = api.block_latest(return_type="json")
+    assert block["tx_count"] == 1
+    assert block["height"] == genesis["height"] + 1
+    assert block["previous_block"] == genesis["hash"]
+    assert block["fees"] == str(tx.transaction_body.fee)
+    assert api.latest_block.transactions == (tx.id.payload.hex(),)
+    api.wait(10)
+    tip = api.block_latest(return_type="json")
+    assert (tip["slot"], tip["tx_count"]) == (10, 0)
+    assert tip["previous_block"] == block["hash"]
+
+
+def test_mempool():
+    api = MockFrostApi(block_production=True)
+    user = MockUser(api)
+    user.fund(10_000_000)
+    tx = transfer(api, user)
+    api.submit_tx(tx)
+    # transactions may spend outputs of transactions in the mempool
+    chained = spend_change(api, user, tx)
+    api.submit_tx(chained)
+    assert user.balance().coin == 10_000_000
+    assert len(api.mempool) == 2
+    api.wait(1)
+    assert not api.mempool
+    assert api.latest_block.slot == 1
+    assert api.latest_block.transactions == (
+        tx.id.payload.hex(),
+        chained.id.payload.hex(),
+    )
+    assert 0 < user.balance().coin < 5_000_000
+    stats = api.block_statistics()
+    assert (stats["blocks"], stats["transactions"]) == (1, 2)
+    assert stats["transactions_per_block"] == 2
+    assert 0 < stats["size_utilisation"] < 1
+
+
+def test_blocks_respect_size_limit():
+    users = []
+    api = MockFrostApi(block_production=True)
+    for _ in range(5):
+        user = MockUser(api)
+        user.fund(10_000_000)
+        users.append(user)
+    txs = [transfer(api, user) for user in users]
+    size = max(len(tx.to_cbor()) for tx in txs)
+    api._protocol_param = dataclasses.replace(
+        api.protocol_param, max_block_size=2 * size
+    )
+    for tx in txs:
+        api.submit_tx(tx)
+    api.wait(1)
+    assert len(api.latest_block.transactions) == 2
+    assert len(api.mempool) == 3
+    # blocks are produced in the slots in between until the mempool is empty
+    api.wait(10)
+    assert not api.mempool
+    stats = api.block_statistics()
+    assert stats["transactions"] == 5
+    assert stats["max_transactions_per_block"] == 2
+    assert stats["full_blocks"] == 2
+    assert stats["blocks"] == 4
+    assert stats["empty_blocks"] == 1
+    assert api.latest_block.slot == 11
+
+
+def test_invalid_transactions_are_dropped():
+    api = MockFrostApi(block_production=True)
+    user = MockUser(api)
+    user.fund(10_000_000)
+    tx = transfer(api, user)
+    api.submit_tx(tx)
+    api.remove_txi(tx.transaction_body.inputs[0])
+    api.wait(1)
+    assert not api.latest_block.transactions
+    assert api.block_statistics()["dropped_transactions"] == 1
+
+
+def test_block_production_session():
+    client = TestClient(app)
+    session_id = client.post("/session", params={"block_production": True}).json()
+    stats = client.get(f"/{session_id}/blocks/statistics").json()
+    assert stats["blocks"] == 0
+    assert stats["mempool"] == 0
@@ -0,0 +1,138 @@
+import json
+from multiprocessing import Process
+from time import sleep
+
+import cbor2
+import pycardano
+import pytest
+import uvicorn
+from starlette.testclient import TestClient
+
+from plutus_bench.mockfrost.bulk import CBORArrayReader, NDJSONReader
+from plutus_bench.mockfrost.client import MockFrostClient, MockFrostUser
+from plutus_bench.mockfrost.server import app
+
+from .test_sessions import session_api
+
+ADDRESS = pycardano.Address(
+    pycardano.PaymentSigningKey.generate().to_verification_key().hash()
+)
+
+
+def read_chunked(reader, data: bytes, chunk_size: int) -> list:
+    items = []
+    for i in range(0, len(data), chunk_size):
+        items += reader.feed(data[i : i + chunk_size])
+    return items + reader.close()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+def test_cbor_array_reader(chunk_size):
+    values = [1, -2, b"x" * 300, "text", [1, [2, 3]], {1: {2: b""}}, 2**40, None]
+    values.append(cbor2.CBORTag(121, [1, 2]))
+    items = [cbor2.dumps(v) for v in values]
+    definite = cbor2.dumps(values)
+    indefinite = b"\x9f" + b"".join(items) + b"\xff"
+    for data in (definite, indefinite):
+        assert read_chunked(CBORArrayReader(), data, chunk_size) == items
+    with pytest.raises(ValueError):
+        read_chunked(CBORArrayReader(), indefinite[:-1], chunk_size)
+    with pytest.raises(ValueError):
+        CBORArrayReader().feed(cbor2.dumps({1: 2}))
+
+
+def test_ndjson_reader():
+    lines = b'"01"\n\n"8102"\n"a0"'
+    assert read_chunked(NDJSONReader(), lines, 2) == [b"\x01", b"\x81\x02", b"\xa0"]
+
+
+def test_add_transaction_outputs():
+    client = TestClient(app)
+    session_id = client.post("/session").json()
+    txouts = [pycardano.TransactionOutput(ADDRESS, 2_000_000 + i) for i in range(50)]
+    res = client.post(
+        f"/{session_id}/ledger/txos",
+        # definite length array header
+        content=bytes([0x98, len(txouts)])
+        + b"".join(txout.to_cbor() for txout in txouts),
+        headers={"Content-Type": "application/cbor"},
+    )
+    assert res.status_code == 200
+    tx_ins = res.json()
+    assert len(tx_ins) == len(txouts)
+    api = session_api(session_id)
+    for tx_in, txout in zip(tx_ins, txouts):
+        utxo = api.get_utxo_from_txid(
+            pycardano.TransactionId(bytes.fromhex(tx_in["tx_id"])),
+            tx_in["output_index"],
+        )
+        assert utxo.output == txout
+
+
+def test_add_utxos_ndjson():
+    client = TestClient(app)
+    session_id = client.post("/session").json()
+    utxos = [
+        pycardano.UTxO(
+            pycardano.TransactionInput(pycardano.TransactionId(bytes(32)), i),
+            pycardano.TransactionOutput(ADDRESS, 2_000_000),
+        )
+        for i in range(3)
+    ]
+    res = client.put(
+        f"/{session_id}/ledger/utxos",
+        content="".join(json.dumps(u.to_cbor().hex()) + "\n" for u in utxos),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert [tx_in["output_index"] for tx_in in res.json()] == [0, 1, 2]
+    assert len(session_api(session_id).address_utxos(str(ADDRESS))) == 3
+
+
+def test_invalid_item_adds_nothing():
+    client = TestClient(app)
+    session_id = client.post("/session").json()
+    txout = pycardano.TransactionOutput(ADDRESS, 2_000_000)
+    res = client.post(
+        f"/{session_id}/ledger/txos",
+        content=b"\x82" + txout.to_cbor() + cbor2.dumps("not an output"),
+        headers={"Content-Type": "application/cbor"},
+    )
+    assert res.status_code == 400
+    assert "Invalid item 1" in res.json()["detail"]
+    assert not session_api(session_id).address_utxos(str(ADDRESS))
+    res = client.post(
+        f"/{session_id}/ledger/txos",
+        content=b"",
+        headers={"Content-Type": "application/json"},
+    )
+    assert res.status_code == 415
+
+
+def run_server():
+    uvicorn.run(app, port=8000)
+
+
+@pytest.fixture
+def server():
+    proc = Process(target=run_server, args=(), daemon=True)
+    proc.start()
+    sleep(1)  # Wait for server to start
+    yield
+    proc.kill()  # Cleanup after test
+
+
+def test_client_add_txouts(server):
+    client = MockFrostClient(base_url="http://127.0.0.1:8000")
+    session = client.create_session()
+    user = MockFrostUser(session)
+    tx_ins = session.add_txouts(
+        pycardano.TransactionOutput(user.address, 2_000_000) for _ in range(10)
+    )
+    assert len(tx_ins) == 10
+    assert user.balance().coin == 20_000_000
+    utxo = pycardano.UTxO(
+        pycardano.TransactionInput(pycardano.TransactionId(bytes(32)), 0),
+        pycardano.TransactionOutput(user.address, 1_000_000),
+    )
+    assert session.add_utxos([utxo]) == [{"tx_id": "00" * 32, "output_index": 0}]
+    assert user.balance().coin == 21_000_000
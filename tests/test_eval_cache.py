@@ -0,0 +1,69 @@
+import pytest
+import uplc
+
+from plutus_bench import (
+    EvaluationCache,
+    ProcessPoolEvaluator,
+    SerialEvaluator,
+    UnflattenCache,
+)
+from plutus_bench.mock import ExecutionException, MockFrostApi
+
+from .test_tx_tools import build_multi_spend_tx
+
+
+def test_evaluation_cache(tmp_path):
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=3)
+    expected = api.evaluate_tx(tx)
+    cache = EvaluationCache(directory=tmp_path)
+    api.evaluator = SerialEvaluator(cache)
+    assert api.evaluate_tx(tx) == expected
+    assert (cache.hits, cache.misses) == (0, 3)
+    assert api.evaluate_tx(tx) == expected
+    assert cache.hits == 3
+    # a fresh cache, e.g. of the next test run, reads the results from disk
+    cache = EvaluationCache(directory=tmp_path)
+    with ProcessPoolEvaluator(max_workers=2, cache=cache) as evaluator:
+        api.evaluator = evaluator
+        assert api.evaluate_tx(tx) == expected
+    assert (cache.disk_hits, cache.misses) == (3, 0)
+
+
+def test_evaluation_cache_failure_and_bound():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=2)
+    tx.transaction_body.required_signers = None
+    with pytest.raises(ExecutionException) as uncached_error:
+        api.evaluate_tx(tx)
+    cache = EvaluationCache(max_entries=1)
+    api.evaluator = SerialEvaluator(cache)
+    for _ in range(2):
+        with pytest.raises(ExecutionException) as cached_error:
+            api.evaluate_tx(tx)
+        assert str(cached_error.value) == str(uncached_error.value)
+        assert cached_error.value.logs == uncached_error.value.logs
+    assert cache.hits == 1
+    assert len(cache) == 1
+
+
+def test_unflatten_cache(tmp_path):
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=1)
+    (script,) = tx.transaction_witness_set.plutus_v2_script
+    other = uplc.flatten(uplc.parse("(program 1.0.0 (con unit ()))"))
+    cache = UnflattenCache(max_entries=1, directory=tmp_path)
+    program = cache.get(script)
+    assert cache.get(script) is program
+    cache.get(other)
+    assert cache.info() == {
+        "hits": 1,
+        "disk_hits": 0,
+        "misses": 2,
+        "size": 1,
+        "max_entries": 1,
+    }
+    # evicted from memory, but a fresh cache loads the decoded program from disk
+    for c in (cache, UnflattenCache(directory=tmp_path)):
+        assert c.get(script).dumps() == program.dumps()
+        assert c.disk_hits == 1
@@ -0,0 +1,117 @@
+import pycardano
+import pytest
+from starlette.testclient import TestClient
+
+from plutus_bench import MockUser, ProcessPoolEvaluator, SerialEvaluator
+from plutus_bench.mock import ExecutionException, MockFrostApi
+from plutus_bench.mockfrost.server import SESSIONS, app
+
+from .test_tx_tools import build_multi_spend_tx
+
+
+def test_process_pool_matches_serial():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=4)
+    expected = api.evaluate_tx(tx)
+    with ProcessPoolEvaluator(max_workers=2) as evaluator:
+        api.evaluator = evaluator
+        assert api.evaluate_tx(tx) == expected
+        # later transactions only send the script hash
+        assert api.evaluate_tx(tx) == expected
+    assert list(expected) == [f"spend:{i}" for i in range(len(expected))]
+
+
+def test_process_pool_reports_failure():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=2)
+    # gift only allows the creator to spend, drop the required signer
+    tx.transaction_body.required_signers = None
+    with pytest.raises(ExecutionException) as serial_error:
+        api.evaluate_tx(tx)
+    with ProcessPoolEvaluator(max_workers=2) as evaluator:
+        api.evaluator = evaluator
+        with pytest.raises(ExecutionException) as pool_error:
+            api.evaluate_tx(tx)
+    assert str(pool_error.value) == str(serial_error.value)
+    assert pool_error.value.logs == serial_error.value.logs
+
+
+class CountingEvaluator(SerialEvaluator):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def evaluate(self, script_invocations):
+        self.calls += 1
+        return super().evaluate(script_invocations)
+
+
+def test_submit_reuses_evaluation():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=2)
+    api.evaluator = evaluator = CountingEvaluator()
+    api.evaluate_tx(tx)
+    api.submit_tx(tx, dry_run=True)
+    assert evaluator.calls == 1
+    # the ledger moved on, evaluate again
+    api.wait(1)
+    api.submit_tx(tx, dry_run=True)
+    assert evaluator.calls == 2
+    api.strict_evaluation = True
+    api.submit_tx(tx)
+    assert evaluator.calls == 3
+
+
+def test_submit_reuses_failed_evaluation():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=2)
+    api.evaluator = evaluator = CountingEvaluator()
+    tx.transaction_body.required_signers = None
+    # the signatures no longer match the modified body
+    api.phase1_validation = False
+    with pytest.raises(ExecutionException):
+        api.evaluate_tx(tx)
+    with pytest.raises(ExecutionException):
+        api.submit_tx(tx)
+    assert evaluator.calls == 1
+
+
+def test_evaluate_batch():
+    api = MockFrostApi()
+    txs = [build_multi_spend_tx(api, n=n) for n in (1, 2, 3)]
+    expected = [api.evaluate_tx(tx) for tx in txs]
+    failing = build_multi_spend_tx(api, n=1)
+    failing.transaction_body.required_signers = None
+    api.evaluator = evaluator = CountingEvaluator()
+    res = api.evaluate_txs_cbor(
+        [txs[0].to_cbor(), failing.to_cbor(), "00", txs[1].to_cbor()]
+    )
+    # all scripts of the batch are evaluated in one go
+    assert evaluator.calls == 1
+    assert [res[0], res[3]] == expected[:2]
+    assert isinstance(res[1], ExecutionException)
+    assert isinstance(res[2], Exception)
+    with ProcessPoolEvaluator(max_workers=2) as pool:
+        assert api.evaluate_txs(txs, evaluator=pool) == expected
+
+
+def test_evaluate_batch_endpoint():
+    client = TestClient(app)
+    session_id = client.post("/session").json()
+    api = next(s.chain_state for k, s in SESSIONS.items() if str(k) == session_id)
+    tx = build_multi_spend_tx(api, n=2)
+    failing = build_multi_spend_tx(api, n=1)
+    failing.transaction_body.required_signers = None
+    single = client.post(
+        f"/{session_id}/api/v0/utils/txs/evaluate",
+        content=tx.to_cbor().hex(),
+        headers={"Content-Type": "application/cbor"},
+    ).json()
+    for parallel in (False, True):
+        res = client.post(
+            f"/{session_id}/utils/txs/evaluate/batch",
+            params={"parallel": parallel},
+            json=[tx.to_cbor().hex(), failing.to_cbor().hex()],
+        ).json()
+        assert res[0] == single
+        assert "EvaluationFailure" in res[1]["result"]
@@ -0,0 +1,82 @@
+import pycardano
+import pytest
+from pycardano import (
+    StakeCredential,
+    StakeDelegation,
+    Transaction,
+    TransactionBody,
+    TransactionOutput,
+    TransactionWitnessSet,
+)
+
+from plutus_bench import MockUser, MockPool
+from plutus_bench.mock import MockFrostApi
+
+
+def spend_all(user: MockUser, recipient: MockUser, certificates=None) -> Transaction:
+    utxos = user.utxos()
+    return Transaction(
+        TransactionBody(
+            inputs=[u.input for u in utxos],
+            outputs=[TransactionOutput(recipient.address, user.balance())],
+            fee=0,
+            certificates=certificates,
+        ),
+        TransactionWitnessSet(),
+    )
+
+
+def test_failed_submit_leaves_ledger_untouched():
+    api = MockFrostApi()
+    user = MockUser(api)
+    recipient = MockUser(api)
+    pool = MockPool(api)
+    user.fund(10_000_000)
+    stake_key = pycardano.StakeKeyPair.generate()
+    tx = spend_all(
+        user,
+        recipient,
+        certificates=[
+            StakeDelegation(
+                StakeCredential(stake_key.verification_key.hash()),
+                pool.pool_key_hash,
+            )
+        ],
+    )
+    with pytest.raises(AssertionError, match="Stake key is not registered"):
+        api.submit_tx_mock(tx)
+    assert user.balance().coin == 10_000_000
+    assert recipient.balance().coin == 0
+    assert api._pool_delegators[str(pool.pool_id)] == []
+
+
+def test_dry_run_submit():
+    api = MockFrostApi()
+    user = MockUser(api)
+    recipient = MockUser(api)
+    user.fund(10_000_000)
+    tx = spend_all(user, recipient)
+    journal = api.submit_tx_mock(tx, dry_run=True)
+    assert not journal.committed
+    assert [u.output.amount.coin for u in journal.created.values()] == [10_000_000]
+    assert user.balance().coin == 10_000_000
+    journal.commit()
+    assert user.balance().coin == 0
+    assert recipient.balance().coin == 10_000_000
+
+
+def test_stale_journal_is_not_committed():
+    api = MockFrostApi()
+    user = MockUser(api)
+    recipient = MockUser(api)
+    user.fund(10_000_000)
+    user.fund(5_000_000)
+    tx = spend_all(user, recipient)
+    journal = api.submit_tx_mock(tx, dry_run=True)
+    # spend one of the inputs of the journal directly
+    api.remove_txi(tx.transaction_body.inputs[1])
+    with pytest.raises(AssertionError, match="was spent since the journal was created"):
+        journal.commit()
+    assert not journal.committed
+    assert user.balance().coin == 10_000_000
+    assert recipient.balance().coin == 0
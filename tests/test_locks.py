@@ -0,0 +1,37 @@
+import asyncio
+
+from plutus_bench.mockfrost.locks import ReadWriteLock
+
+
+def test_readers_share_writers_exclude():
+    async def run():
+        lock = ReadWriteLock()
+        events = []
+
+        async def reader(name, delay):
+            async with lock.read():
+                events.append(f"{name} start")
+                await asyncio.sleep(delay)
+                events.append(f"{name} end")
+
+        async def writer(name):
+            async with lock.write():
+                events.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                events.append(f"{name} end")
+
+        first = asyncio.create_task(reader("r1", 0.02))
+        second = asyncio.create_task(reader("r2", 0.02))
+        await asyncio.sleep(0)
+        write = asyncio.create_task(writer("w"))
+        await asyncio.sleep(0)
+        # arrives while the writer waits, must not overtake it
+        late = asyncio.create_task(reader("r3", 0))
+        await asyncio.gather(first, second, write, late)
+        return events
+
+    events = asyncio.run(run())
+    assert events[:2] == ["r1 start", "r2 start"]
+    assert events.index("w start") > max(events.index("r1 end"), events.index("r2 end"))
+    assert events.index("w end") == events.index("w start") + 1
+    assert events.index("r3 start") > events.index("w end")
@@ -0,0 +1,98 @@
+import pathlib
+
+import cbor2
+import pycardano
+import pytest
+from pycardano import TransactionFailedException
+
+from plutus_bench import MockUser, NativeMockChainContext
+from plutus_bench.mock import MockFrostApi
+
+from tests.gift import spend_from_gift_contract
+from tests.mint import mint_coin_with_contract
+from plutus_bench.tool import address_from_script, load_contract, ScriptType
+
+own_path = pathlib.Path(__file__)
+
+
+def fund_gift_contract(api: MockFrostApi, context, owner: MockUser):
+    gift_contract_path = own_path.parent / "assets/gift.plutus"
+    gift_address = address_from_script(
+        load_contract(gift_contract_path, ScriptType.PlutusV2), network=context.network
+    )
+    api.add_txout(
+        pycardano.TransactionOutput(
+            address=gift_address,
+            amount=pycardano.Value(coin=1000000),
+            datum=owner.verification_key.hash().payload,
+        ),
+    )
+    return gift_contract_path
+
+
+def test_native_context_spend_from_gift_contract():
+    api = MockFrostApi()
+    context = NativeMockChainContext(api)
+    payment_key = MockUser(api)
+    payment_key.fund(100_000_000)
+    gift_contract_path = fund_gift_contract(api, context, payment_key)
+    spend_from_gift_contract(payment_key.signing_key, gift_contract_path, context)
+    assert payment_key.balance().coin > 100_000_000
+
+
+def test_native_context_other_user_spend_from_gift_contract():
+    api = MockFrostApi()
+    context = NativeMockChainContext(api)
+    payment_key = MockUser(api)
+    payment_key.fund(100_000_000)
+    owning_user = MockUser(api)
+    gift_contract_path = fund_gift_contract(api, context, owning_user)
+    pytest.raises(
+        TransactionFailedException,
+        spend_from_gift_contract,
+        payment_key.signing_key,
+        gift_contract_path,
+        context,
+        enforce_true_owner=False,
+    )
+
+
+def test_native_context_mint_contract():
+    api = MockFrostApi()
+    context = NativeMockChainContext(api)
+    minting_user = MockUser(api)
+    minting_user.fund(100_000_000)
+    mint_coin_with_contract(
+        "My_token",
+        100,
+        minting_user.signing_key,
+        minting_user.verification_key,
+        context,
+    )
+    assert context.protocol_param == api.protocol_param
+
+
+def test_native_context_serializes_inline_datums_once():
+    api = MockFrostApi()
+    context = NativeMockChainContext(api)
+    owner = MockUser(api)
+    fund_gift_contract(api, context, owner)
+    gift_address = next(iter(api._utxo_state.addresses()))
+    (utxo,) = context.utxos(gift_address)
+    assert isinstance(utxo.output.datum, pycardano.RawCBOR)
+    assert utxo.output.datum.cbor == cbor2.dumps(owner.verification_key.hash().payload)
+    assert context.utxos(gift_address)[0] is utxo
+
+
+def test_native_context_submit_failure():
+    api = MockFrostApi()
+    context = NativeMockChainContext(api)
+    user = MockUser(api)
+    user.fund(10_000_000)
+    builder = pycardano.TransactionBuilder(context)
+    builder.add_input_address(user.address)
+    tx = builder.build_and_sign([user.signing_key], change_address=user.address)
+    context.submit_tx(tx)
+    # the input is spent already
+    with pytest.raises(TransactionFailedException):
+        context.submit_tx(tx)
@@ -0,0 +1,86 @@
+import pycardano
+import pytest
+
+from plutus_bench import SerialEvaluator
+from plutus_bench.mock import (
+    EvaluationDivergenceWarning,
+    ExecutionException,
+    MockFrostApi,
+)
+from plutus_bench.tool import load_contract, ScriptType
+
+from .test_profiling import build_signed_helpers_tx, own_path
+from .test_tx_tools import build_multi_spend_tx
+
+opshin = pytest.importorskip("opshin")
+
+from .contracts import gift, signed_helpers
+
+
+class InvocationCountingEvaluator(SerialEvaluator):
+    def __init__(self):
+        super().__init__()
+        self.invocations = 0
+
+    def evaluate(self, script_invocations):
+        self.invocations += len(script_invocations)
+        return super().evaluate(script_invocations)
+
+
+gift_script = load_contract(own_path.parent / "assets/gift.plutus", ScriptType.PlutusV2)
+
+
+def test_native_evaluation_skips_uplc():
+    api = MockFrostApi(opshin_scripts={gift_script: gift.validator})
+    tx = build_multi_spend_tx(api, n=2)
+    api.evaluator = evaluator = InvocationCountingEvaluator()
+    res = api.evaluate_tx(tx)
+    assert evaluator.invocations == 0
+    assert all(
+        units == pycardano.ExecutionUnits(0, 0) for units in res.values()
+    ), "native evaluation does not measure cost"
+    tx.transaction_body.required_signers = None
+    with pytest.raises(ExecutionException, match="Required signature missing"):
+        api.evaluate_tx(tx)
+
+
+def test_native_arguments_use_validator_types():
+    api = MockFrostApi()
+    tx, script, _ = build_signed_helpers_tx(api)
+    expected = api.evaluate_tx(tx)
+    api.opshin_scripts = {script: signed_helpers.validator}
+    api.opshin_sample_rate = 1
+    # sampled invocations report the UPLC cost
+    assert api.evaluate_tx(tx) == expected
+    assert api.divergences == []
+
+
+def test_sampling_flags_divergence():
+    def always_passes(datum, redeemer, context):
+        pass
+
+    api = MockFrostApi(opshin_scripts={gift_script: always_passes})
+    tx = build_multi_spend_tx(api, n=2)
+    tx.transaction_body.required_signers = None
+    # not sampled, the native validator is trusted
+    api.evaluate_tx(tx)
+    api.opshin_sample_rate = 1
+    with pytest.warns(EvaluationDivergenceWarning):
+        with pytest.raises(ExecutionException):
+            api.evaluate_tx(tx)
+    (divergence,) = api.divergences
+    assert divergence.transaction_id == tx.id
+    assert divergence.redeemer == "spend:0"
+    assert divergence.native_error is None
+    assert divergence.uplc_error is not None
+
+
+def test_sample_rate_is_a_fraction():
+    api = MockFrostApi(opshin_scripts={gift_script: gift.validator})
+    tx = build_multi_spend_tx(api, n=20)
+    api.opshin_sample_rate = 0.5
+    api.evaluator = evaluator = InvocationCountingEvaluator()
+    res = api.evaluate_tx(tx)
+    measured = [units for units in res.values() if units.steps > 0]
+    assert 0 < len(measured) < len(res)
+    assert evaluator.invocations == len(measured)
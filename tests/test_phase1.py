@@ -0,0 +1,110 @@
+import pycardano
+import pytest
+
+from plutus_bench import MockUser, NativeMockChainContext
+from plutus_bench.mock import MockFrostApi
+from plutus_bench.phase1 import ValidationException
+
+from .test_evaluator import CountingEvaluator
+from .test_tx_tools import build_multi_spend_tx
+
+
+def transfer(api: MockFrostApi, user: MockUser, **builder_args):
+    recipient = MockUser(api)
+    builder = pycardano.TransactionBuilder(NativeMockChainContext(api))
+    builder.add_input_address(user.address)
+    builder.add_output(pycardano.TransactionOutput(recipient.address, 5_000_000))
+    for k, v in builder_args.items():
+        setattr(builder, k, v)
+    return builder.build_and_sign([user.signing_key], change_address=user.address)
+
+
+def resign(tx: pycardano.Transaction, *keys: pycardano.SigningKey):
+    """Sign the (modified) body of the transaction again"""
+    tx.transaction_witness_set.vkey_witnesses = [
+        pycardano.VerificationKeyWitness(
+            pycardano.VerificationKey.from_signing_key(key),
+            key.sign(tx.transaction_body.hash()),
+        )
+        for key in keys
+    ]
+    return tx
+
+
+def test_valid_transfer():
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(10_000_000)
+    api.submit_tx(transfer(api, user))
+    assert 0 < user.balance().coin < 5_000_000
+
+
+def test_validity_interval():
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(10_000_000)
+    api.set_block_slot(100)
+    tx = transfer(api, user, validity_start=101)
+    with pytest.raises(ValidationException, match="not valid yet"):
+        api.submit_tx(tx)
+    tx = transfer(api, user, ttl=100)
+    with pytest.raises(ValidationException, match="expired"):
+        api.submit_tx(tx)
+
+
+def test_double_spend_is_rejected_before_evaluation():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=2)
+    api.submit_tx(tx)
+    api.evaluator = evaluator = CountingEvaluator()
+    api.strict_evaluation = True
+    with pytest.raises(ValidationException, match="already spent"):
+        api.submit_tx(tx)
+    assert evaluator.calls == 0
+
+
+def test_fee_and_balance():
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(10_000_000)
+    tx = transfer(api, user)
+    tx.transaction_body.fee -= 1
+    with pytest.raises(ValidationException, match="below the minimum fee"):
+        api.submit_tx(resign(tx, user.signing_key))
+    tx.transaction_body.fee += 1
+    tx.transaction_body.outputs[0].amount.coin -= 1
+    with pytest.raises(ValidationException, match="not balanced"):
+        api.submit_tx(resign(tx, user.signing_key))
+
+
+def test_key_witnesses():
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(10_000_000)
+    tx = transfer(api, user)
+    tx.transaction_witness_set.vkey_witnesses = []
+    with pytest.raises(ValidationException, match="Missing signature"):
+        api.submit_tx(tx)
+    other = pycardano.PaymentSigningKey.generate()
+    tx = transfer(api, user)
+    (witness,) = tx.transaction_witness_set.vkey_witnesses
+    witness.signature = other.sign(tx.transaction_body.hash())
+    with pytest.raises(ValidationException, match="Invalid signature"):
+        api.submit_tx(tx)
+
+
+def test_collateral():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=1)
+    tx.transaction_body.collateral = None
+    with pytest.raises(ValidationException, match="no collateral"):
+        api.submit_tx(tx)
+
+
+def test_phase1_validation_can_be_disabled():
+    api = MockFrostApi(phase1_validation=False)
+    user = MockUser(api)
+    user.fund(10_000_000)
+    tx = transfer(api, user)
+    tx.transaction_witness_set.vkey_witnesses = []
+    api.submit_tx(tx)
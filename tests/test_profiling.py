@@ -0,0 +1,144 @@
+import pathlib
+from dataclasses import dataclass
+
+import pycardano
+import pytest
+import uplc
+from starlette.testclient import TestClient
+
+from plutus_bench import MockUser, NativeMockChainContext
+from plutus_bench.mock import MockFrostApi
+from plutus_bench.profiling import OpshinSource
+from plutus_bench.tool import address_from_script, load_contract, ScriptType
+from plutus_bench.mockfrost.server import SESSIONS, app
+
+from .test_tx_tools import build_multi_spend_tx
+
+own_path = pathlib.Path(__file__)
+
+
+def test_profile_adds_up_to_evaluation():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=2)
+    expected = api.evaluate_tx(tx)
+    profiles = api.profile_tx(tx)
+    assert list(profiles) == list(expected)
+    for key, profile in profiles.items():
+        assert profile.error is None
+        assert (profile.mem, profile.cpu) == (expected[key].mem, expected[key].steps)
+        costs = [*profile.builtins.values(), *profile.steps.values()]
+        assert sum(c.cpu for c in costs) == profile.cpu
+        assert sum(c.mem for c in costs) == profile.mem
+        assert profile.steps["Startup"].count == 1
+        assert profile.steps["Apply"].count > 0
+        assert profile.builtins
+
+
+def test_profile_reports_failure():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=1)
+    tx.transaction_body.required_signers = None
+    profile = api.profile_tx(tx)["spend:0"]
+    assert profile.error is not None
+    assert profile.cpu > 0
+
+
+def test_profile_endpoint():
+    client = TestClient(app)
+    session_id = client.post("/session").json()
+    api = next(s.chain_state for k, s in SESSIONS.items() if str(k) == session_id)
+    tx = build_multi_spend_tx(api, n=1)
+    res = client.post(
+        f"/{session_id}/utils/txs/profile",
+        content=tx.to_cbor().hex(),
+        headers={"Content-Type": "application/cbor"},
+    ).json()["result"]
+    units = api.evaluate_tx(tx)["spend:0"]
+    assert res["EvaluationResult"]["spend:0"] == {
+        "steps": units.steps,
+        "memory": units.mem,
+    }
+    profile = res["Profile"]["spend:0"]
+    assert profile["cpu"] == units.steps
+    # sorted by cost
+    cpus = [b["cpu"] for b in profile["builtins"].values()]
+    assert cpus == sorted(cpus, reverse=True)
+
+
+def build_signed_helpers_tx(api: MockFrostApi):
+    source = OpshinSource.from_file(own_path.parent / "contracts/signed_helpers.py")
+    script = pycardano.PlutusV2Script(uplc.flatten(source.compile()))
+    context = NativeMockChainContext(api)
+    user = MockUser(api)
+    user.fund(100_000_000)
+    txi = api.add_txout(
+        pycardano.TransactionOutput(
+            address_from_script(script, network=context.network),
+            2_000_000,
+            datum=SignedHelpersOwner(user.verification_key.hash().payload),
+        )
+    )
+    builder = pycardano.TransactionBuilder(context)
+    builder.add_input_address(user.address)
+    builder.add_script_input(
+        api.get_utxo_from_txid(txi.transaction_id, txi.index),
+        script,
+        None,
+        pycardano.Redeemer(0),
+    )
+    tx = builder.build_and_sign(
+        signing_keys=[user.signing_key],
+        change_address=user.address,
+        auto_required_signers=True,
+    )
+    return tx, script, source
+
+
+@dataclass
+class SignedHelpersOwner(pycardano.PlutusData):
+    CONSTR_ID = 0
+    pkh: bytes
+
+
+def test_source_profile_attributes_cost_to_functions(tmp_path):
+    pytest.importorskip("opshin")
+    api = MockFrostApi()
+    tx, script, source = build_signed_helpers_tx(api)
+    api.register_opshin_source(script, source)
+    units = api.evaluate_tx(tx)["spend:0"]
+    profile = api.source_profile_tx(tx)["spend:0"]
+    assert (profile.cpu, profile.mem) == (units.steps, units.mem)
+    assert sum(c.cpu for c in profile.stacks.values()) == profile.cpu
+    assert sum(c.mem for c in profile.stacks.values()) == profile.mem
+    frames = {frame for stack in profile.stacks for frame in stack}
+    validator = "validator (signed_helpers.py:20)"
+    assert validator in frames
+    stacks = set(profile.stacks)
+    assert (
+        "signed_helpers.py",
+        validator,
+        "count_signatories (signed_helpers.py:13)",
+    ) in stacks
+    assert (
+        "signed_helpers.py",
+        validator,
+        "Owner.signed (signed_helpers.py:9)",
+        "EqualsByteString",
+    ) in stacks
+
+    api.flamegraph_directory = tmp_path
+    api.evaluate_tx(tx)
+    (folded,) = tmp_path.iterdir()
+    assert folded.name == f"{tx.id}.spend_0.folded"
+    lines = folded.read_text().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == units.steps
+    assert any(line.startswith(f"signed_helpers.py;{validator} ") for line in lines)
+
+
+def test_source_must_match_script():
+    pytest.importorskip("opshin")
+    api = MockFrostApi()
+    source = OpshinSource.from_file(own_path.parent / "contracts/signed_helpers.py")
+    gift = load_contract(own_path.parent / "assets/gift.plutus", ScriptType.PlutusV2)
+    with pytest.raises(ValueError):
+        api.register_opshin_source(gift, source)
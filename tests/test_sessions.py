@@ -0,0 +1,144 @@
+import asyncio
+import datetime
+import uuid
+
+import pycardano
+
+from starlette.testclient import TestClient
+
+from plutus_bench.mock import MockFrostApi, MockUser
+from plutus_bench.mockfrost import server
+from plutus_bench.mockfrost.server import SESSIONS, app
+from plutus_bench.mockfrost.store import Session, SQLiteSessionStore
+
+
+def session_api(session_id: str):
+    return next(s.chain_state for k, s in SESSIONS.items() if str(k) == session_id)
+
+
+def test_access_time_is_tracked():
+    client = TestClient(app)
+    session_id = client.post("/session").json()
+    created = client.get(f"/session/{session_id}").json()
+    client.get(f"/{session_id}/api/v0/blocks/latest")
+    accessed = client.get(f"/session/{session_id}").json()
+    assert accessed["last_access_time"] > created["last_access_time"]
+    assert accessed["creation_time"] == created["creation_time"]
+
+
+def test_expired_sessions_are_removed(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "SESSION_TTL", 60)
+    monkeypatch.setattr(server.STORE, "spill_directory", str(tmp_path))
+    client = TestClient(app)
+    idle = client.post("/session").json()
+    active = client.post("/session").json()
+    next(
+        s for k, s in SESSIONS.items() if str(k) == idle
+    ).last_access_time -= datetime.timedelta(minutes=2)
+    server.remove_expired_sessions()
+    assert client.get(f"/session/{idle}").json() is None
+    assert client.get(f"/session/{active}").json() is not None
+
+
+def test_evicted_sessions_are_spilled(monkeypatch, tmp_path):
+    monkeypatch.setattr(server.STORE, "max_sessions", 2)
+    monkeypatch.setattr(server.STORE, "spill_directory", str(tmp_path))
+    client = TestClient(app)
+    first = client.post("/session").json()
+    user = MockUser(session_api(first))
+    user.fund(3_000_000)
+    utxos = client.get(f"/{first}/api/v0/addresses/{user.address}/utxos").json()
+    second = client.post("/session").json()
+    third = client.post("/session").json()
+    assert len(SESSIONS) == 2
+    assert (tmp_path / f"{first}.session").exists()
+    # restored on access, evicting the least recently used session
+    assert client.get(f"/{first}/api/v0/addresses/{user.address}/utxos").json() == (
+        utxos
+    )
+    assert not (tmp_path / f"{first}.session").exists()
+    assert (tmp_path / f"{second}.session").exists()
+    assert client.delete(f"/session/{second}").json()
+    assert not (tmp_path / f"{second}.session").exists()
+    assert {str(k) for k in SESSIONS} == {first, third}
+
+
+def test_memory_cap_without_spilling(monkeypatch):
+    client = TestClient(app)
+    first = client.post("/session").json()
+    size = session_api(first).estimated_size()
+    monkeypatch.setattr(server.STORE, "max_bytes", 2 * size)
+    second = client.post("/session").json()
+    third = client.post("/session").json()
+    assert client.get(f"/session/{first}").json() is None
+    assert client.get(f"/session/{second}").json() is not None
+    assert client.get(f"/session/{third}").json() is not None
+
+
+def test_sqlite_store_is_shared(tmp_path):
+    path = tmp_path / "sessions.db"
+    # e.g. two worker processes of the server
+    first, second = SQLiteSessionStore(path), SQLiteSessionStore(path)
+    session_id = uuid.uuid4()
+    now = datetime.datetime.now()
+    first.create(session_id, Session(MockFrostApi(), now, now))
+
+    async def fund(store):
+        session = store.get(session_id)
+        async with store.writing(session_id, session):
+            user = MockUser(session.chain_state)
+            user.fund(3_000_000)
+        return user
+
+    user = asyncio.run(fund(second))
+    # the first store reloads the session changed by the second
+    assert first.get(session_id).chain_state.address_utxos(str(user.address))
+    user = asyncio.run(fund(first))
+    assert len(second.get(session_id).chain_state.address_utxos(str(user.address))) == 1
+    assert second.delete(session_id)
+    assert first.get(session_id) is None
+
+
+def test_templates():
+    client = TestClient(app)
+    source = client.post("/session").json()
+    user = MockUser(session_api(source))
+    user.fund(3_000_000)
+    utxos_path = f"/api/v0/addresses/{user.address}/utxos"
+    utxos = client.get(f"/{source}{utxos_path}").json()
+    assert client.put("/template/funded", json={"session_id": source}).json() == (
+        "funded"
+    )
+    assert "funded" in client.get("/template").json()
+    # later changes of the source do not change the template
+    user.fund(2_000_000)
+    first = client.post("/template/funded/session").json()
+    second = client.post("/template/funded/session").json()
+    assert client.get(f"/{first}{utxos_path}").json() == utxos
+    session_api(first).add_txout(pycardano.TransactionOutput(user.address, 1_000_000))
+    assert len(client.get(f"/{first}{utxos_path}").json()) == 2
+    assert client.get(f"/{second}{utxos_path}").json() == utxos
+    clone = client.post(f"/session/{source}/clone").json()
+    assert client.get(f"/{clone}{utxos_path}").json() == (
+        client.get(f"/{source}{utxos_path}").json()
+    )
+    assert client.delete("/template/funded").json()
+    assert client.post("/template/funded/session").status_code == 404
+
+
+def test_sqlite_templates(tmp_path):
+    path = tmp_path / "sessions.db"
+    first, second = SQLiteSessionStore(path), SQLiteSessionStore(path)
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(3_000_000)
+    first.save_template("funded", api)
+    assert second.template_names() == ["funded"]
+    assert second.get_template("funded").address_utxos(str(user.address)) == (
+        api.address_utxos(str(user.address))
+    )
+    user.fund(2_000_000)
+    first.save_template("funded", api)
+    assert len(second.get_template("funded").address_utxos(str(user.address))) == 2
+    assert second.delete_template("funded")
+    assert first.get_template("funded") is None
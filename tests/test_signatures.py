@@ -0,0 +1,93 @@
+import pycardano
+import pytest
+from starlette.testclient import TestClient
+
+from plutus_bench import MockUser
+from plutus_bench.mock import MockFrostApi
+from plutus_bench.mockfrost.server import SESSIONS, app
+from plutus_bench.phase1 import ValidationException
+from plutus_bench.signatures import SignatureVerifier
+
+from .test_phase1 import transfer
+
+
+def signature(key: pycardano.SigningKey, message: bytes):
+    return (
+        pycardano.VerificationKey.from_signing_key(key).payload,
+        message,
+        key.sign(message),
+    )
+
+
+def test_verifier_skips_duplicates_and_known_signatures():
+    key = pycardano.PaymentSigningKey.generate()
+    valid = signature(key, b"a")
+    invalid = (valid[0], b"b", valid[2])
+    verifier = SignatureVerifier()
+    assert verifier.verify([valid, valid, signature(key, b"c")]) is None
+    assert verifier.verified == 2
+    assert verifier.verify([valid, invalid, invalid]) == invalid
+    assert (verifier.verified, verifier.skipped) == (3, 1)
+    # invalid signatures are verified again
+    assert verifier.verify([invalid]) == invalid
+    assert verifier.verified == 4
+
+
+def test_verifier_is_bounded():
+    key = pycardano.PaymentSigningKey.generate()
+    verifier = SignatureVerifier(max_entries=2)
+    verifier.verify([signature(key, bytes([i])) for i in range(4)])
+    assert verifier.info()["size"] == 2
+
+
+def test_submit_batch_verifies_once():
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(10_000_000)
+    other = MockUser(api)
+    other.fund(10_000_000)
+    txs = [transfer(api, user), transfer(api, other)]
+    api.submit_txs(txs)
+    assert api.signature_verifier.verified == 2
+    # the submits find the signatures verified by the batch
+    assert api.signature_verifier.skipped == 2
+
+
+def test_submit_batch_stops_at_invalid_signature():
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(10_000_000)
+    other = MockUser(api)
+    other.fund(10_000_000)
+    txs = [transfer(api, user), transfer(api, other)]
+    (witness,) = txs[1].transaction_witness_set.vkey_witnesses
+    witness.signature = user.signing_key.sign(txs[1].transaction_body.hash())
+    with pytest.raises(ValidationException, match="Invalid signature"):
+        api.submit_txs(txs)
+    assert user.balance().coin < 10_000_000
+    assert other.balance().coin == 10_000_000
+
+
+def test_signature_verification_toggle():
+    api = MockFrostApi(verify_signatures=False)
+    user = MockUser(api)
+    user.fund(20_000_000)
+    tx = transfer(api, user)
+    (witness,) = tx.transaction_witness_set.vkey_witnesses
+    witness.signature = bytes(64)
+    api.submit_tx(tx)
+    assert api.signature_verifier.verified == 0
+    # witnesses of the required signers are still needed
+    tx = transfer(api, user)
+    tx.transaction_witness_set.vkey_witnesses = []
+    with pytest.raises(ValidationException, match="Missing signature"):
+        api.submit_tx(tx)
+
+
+def test_session_toggle():
+    client = TestClient(app)
+    session_id = client.post(
+        "/session", params={"verify_signatures": False}, json={}
+    ).json()
+    api = next(s.chain_state for k, s in SESSIONS.items() if str(k) == session_id)
+    assert not api.verify_signatures
@@ -0,0 +1,150 @@
+import pathlib
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import cbor2
+import pycardano
+import uplc.ast
+from pycardano import PlutusData
+from pycardano.serialization import ByteString
+
+from plutus_bench import MockUser, NativeMockChainContext
+from plutus_bench.mock import MockFrostApi
+from plutus_bench.tool import address_from_script, load_contract, ScriptType
+from plutus_bench.tx_tools import (
+    generate_script_contexts_resolved,
+    redeemers_by_purpose,
+    witness_scripts_by_hash,
+    uplc_plutus_data,
+    uplc_script_context,
+)
+
+own_path = pathlib.Path(__file__)
+
+
+def build_multi_spend_tx(api: MockFrostApi, n: int = 3) -> pycardano.Transaction:
+    context = NativeMockChainContext(api)
+    user = MockUser(api)
+    user.fund(100_000_000)
+    gift_contract = load_contract(
+        own_path.parent / "assets/gift.plutus", ScriptType.PlutusV2
+    )
+    gift_address = address_from_script(gift_contract, network=context.network)
+    builder = pycardano.TransactionBuilder(context)
+    builder.add_input_address(user.address)
+    for i in range(n):
+        txi = api.add_txout(
+            pycardano.TransactionOutput(
+                gift_address,
+                2_000_000 + i,
+                datum=user.verification_key.hash().payload,
+            )
+        )
+        builder.add_script_input(
+            api.get_utxo_from_txid(txi.transaction_id, txi.index),
+            gift_contract,
+            None,
+            pycardano.Redeemer(0),
+        )
+    return builder.build_and_sign(
+        signing_keys=[user.signing_key],
+        change_address=user.address,
+        auto_required_signers=True,
+    )
+
+
+def resolve(api: MockFrostApi, inputs):
+    return [api.get_utxo_from_txid(i.transaction_id, i.index) for i in inputs or []]
+
+
+def test_tx_info_shared_between_invocations():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api)
+    invocations = generate_script_contexts_resolved(
+        tx,
+        resolve(api, tx.transaction_body.inputs),
+        resolve(api, tx.transaction_body.reference_inputs),
+        api.posix_from_slot,
+    )
+    assert len(invocations) == 3
+    tx_info = invocations[0].script_context.tx_info
+    assert all(i.script_context.tx_info is tx_info for i in invocations)
+    data_cache = {}
+    for invocation in invocations:
+        expected = uplc.ast.data_from_cbor(
+            cbor2.dumps(invocation.script_context, default=pycardano.default_encoder)
+        )
+        assert uplc_script_context(invocation.script_context, data_cache) == expected
+    # the TxInfo is converted once and shared by all script contexts
+    tx_info_data = data_cache[id(tx_info)][1]
+    assert all(
+        uplc_script_context(i.script_context, data_cache).fields[0] is tx_info_data
+        for i in invocations
+    )
+
+
+def test_direct_plutus_data_conversion():
+    @dataclass
+    class Big(PlutusData):
+        CONSTR_ID = 200
+        a: int
+        b: bytes
+
+    @dataclass
+    class Mid(PlutusData):
+        CONSTR_ID = 10
+        xs: List[Any]
+        m: Dict[Any, Any]
+
+    shared = Big(-(2**70), bytes(64))
+    nested = Mid(
+        [shared, shared, pycardano.IndefiniteList([1, b"a"])], {b"k": shared, 3: []}
+    )
+    values = [
+        0,
+        -1,
+        2**64 + 1,
+        b"",
+        bytes(65),
+        ByteString(bytes(100)),
+        pycardano.Unit(),
+        shared,
+        nested,
+        pycardano.RawPlutusData(cbor2.CBORTag(122, [1, [2]])),
+        pycardano.RawCBOR(cbor2.dumps(cbor2.CBORTag(121, []))),
+        {1: {2: [3]}},
+    ]
+    memo = {}
+    for v in values:
+        expected = uplc.ast.data_from_cbor(
+            cbor2.dumps(v, default=pycardano.default_encoder)
+        )
+        assert uplc_plutus_data(v, memo) == expected
+        assert uplc_plutus_data(v) == expected
+    # shared sub-terms are converted once
+    mid = uplc_plutus_data(nested, memo)
+    assert mid.fields[0].value[0] is mid.fields[0].value[1]
+    assert mid.fields[0].value[0] is uplc_plutus_data(shared, memo)
+
+
+def test_witness_and_redeemer_indices():
+    api = MockFrostApi()
+    tx = build_multi_spend_tx(api, n=2)
+    gift_contract = load_contract(
+        own_path.parent / "assets/gift.plutus", ScriptType.PlutusV2
+    )
+    scripts = witness_scripts_by_hash(tx.transaction_witness_set)
+    assert scripts == {
+        pycardano.plutus_script_hash(gift_contract): (
+            gift_contract,
+            ScriptType.PlutusV2,
+        )
+    }
+    redeemers = redeemers_by_purpose(tx.transaction_witness_set.redeemer)
+    assert sorted(index for _, index in redeemers) == [
+        i
+        for i, txi in enumerate(tx.transaction_body.inputs)
+        if pycardano.Address.from_primitive(api.get_address(txi)).payment_part
+        == pycardano.plutus_script_hash(gift_contract)
+    ]
+    assert all(tag == pycardano.RedeemerTag.SPEND for tag, _ in redeemers)
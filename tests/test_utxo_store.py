@@ -0,0 +1,218 @@
+import math
+import random
+
+import pycardano
+import pytest
+from pycardano import TransactionId, TransactionInput, TransactionOutput, UTxO
+
+from plutus_bench import MockUser
+from plutus_bench.mock import MockFrostApi
+from plutus_bench.utxo_store import CowDict
+
+from .test_phase1 import transfer
+from .test_tx_tools import build_multi_spend_tx
+
+
+def test_remove_keeps_address_order():
+    api = MockFrostApi()
+    user = MockUser(api)
+    inputs = [
+        api.add_txout(TransactionOutput(user.address, 1_000_000 + i)) for i in range(5)
+    ]
+    api.remove_txi(inputs[2])
+    assert [u.input for u in api._utxos(user.address)] == [
+        inputs[0],
+        inputs[1],
+        inputs[3],
+        inputs[4],
+    ]
+    assert [
+        (u["tx_hash"], u["output_index"])
+        for u in api.address_utxos(str(user.address), return_type="json")
+    ] == [(i.transaction_id.payload.hex(), i.index) for i in inputs if i != inputs[2]]
+    with pytest.raises(KeyError):
+        api.get_utxo_from_txid(inputs[2].transaction_id, inputs[2].index)
+
+
+def test_add_utxo_overwrites_existing_input():
+    api = MockFrostApi()
+    user = MockUser(api)
+    other = MockUser(api)
+    txi = TransactionInput(TransactionId(bytes(32)), 0)
+    api.add_utxo(UTxO(txi, TransactionOutput(user.address, 1_000_000)))
+    api.add_utxo(UTxO(txi, TransactionOutput(other.address, 2_000_000)))
+    assert api._utxos(user.address) == []
+    assert api.get_address(txi) == str(other.address)
+    assert api.get_utxo_from_txid(txi.transaction_id, 0).output.amount.coin == (
+        2_000_000
+    )
+
+
+def test_datum_store():
+    api = MockFrostApi()
+    user = MockUser(api)
+    datum = pycardano.PlutusData()
+    h = pycardano.datum_hash(datum)
+    with_inline = api.add_txout(TransactionOutput(user.address, 2_000_000, datum=datum))
+    with_hash = api.add_txout(TransactionOutput(user.address, 2_000_000, datum_hash=h))
+    without = api.add_txout(TransactionOutput(user.address, 2_000_000))
+    utxos = api.address_utxos(str(user.address), return_type="json")
+    assert [u["data_hash"] for u in utxos] == [h.payload.hex(), h.payload.hex(), None]
+    assert api._utxo_state.datum_hash(without) is None
+    # the datum stays available while an unspent output refers to it
+    api.remove_txi(with_inline)
+    assert api.script_datum_cbor(h.payload.hex(), return_type="json") == {
+        "cbor": datum.to_cbor_hex()
+    }
+    api.remove_txi(with_hash)
+    with pytest.raises(ValueError):
+        api.script_datum_cbor(h.payload.hex(), return_type="json")
+    assert len(api._utxo_state._datums) == 0
+
+
+def test_witness_datums_kept_for_referring_outputs():
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(10_000_000)
+    datum, unused = pycardano.PlutusData(), pycardano.Unit()
+    h = pycardano.datum_hash(datum)
+    tx = pycardano.Transaction(
+        pycardano.TransactionBody(
+            inputs=[u.input for u in user.utxos()],
+            outputs=[TransactionOutput(user.address, 10_000_000, datum_hash=h)],
+            fee=0,
+        ),
+        pycardano.TransactionWitnessSet(plutus_data=[datum, unused]),
+    )
+    api.submit_tx_mock(tx)
+    assert api._utxo_state.datum(h) == datum
+    assert pycardano.datum_hash(unused) not in api._utxo_state._datums
+
+
+def test_controlled_amount_tracks_staked_outputs():
+    api = MockFrostApi()
+    user = MockUser(api)
+    stake_key = pycardano.StakeKeyPair.generate()
+    staked_address = pycardano.Address(
+        payment_part=user.verification_key.hash(),
+        staking_part=stake_key.verification_key.hash(),
+        network=api.network,
+    )
+    stake_address = pycardano.Address(
+        staking_part=stake_key.verification_key.hash(), network=api.network
+    ).encode()
+    api._reward_account[stake_address] = {
+        "registered_stake": True,
+        "delegation": {"pool_id": None, "rewards": 5},
+    }
+    txi = api.add_txout(TransactionOutput(staked_address, 3_000_000))
+    api.add_txout(TransactionOutput(staked_address, 2_000_000))
+    api.add_txout(TransactionOutput(user.address, 7_000_000))
+    assert api.get_controlled_amount(stake_address) == 5_000_005
+    api.remove_txi(txi)
+    assert api.get_controlled_amount(stake_address) == 2_000_005
+    assert api.accounts(stake_address, return_type="json")["controlled_amount"] == (
+        "2000005"
+    )
+
+
+def test_cow_dict_matches_dict():
+    rng = random.Random(0)
+    dicts = [(CowDict(), {})]
+    for _ in range(5000):
+        i = rng.randrange(len(dicts))
+        cow, reference = dicts[i]
+        op = rng.random()
+        key = rng.randrange(50)
+        if op < 0.45:
+            cow[key] = reference[key] = rng.random()
+        elif op < 0.9:
+            if key in reference:
+                del cow[key]
+                del reference[key]
+            else:
+                with pytest.raises(KeyError):
+                    del cow[key]
+        else:
+            dicts.append((cow.fork(), dict(reference)))
+        for cow, reference in dicts:
+            assert len(cow) == len(reference)
+        assert list(cow.items()) == list(reference.items())
+    for cow, reference in dicts:
+        assert list(cow.items()) == list(reference.items())
+
+
+def test_cow_dict_long_fork_chain():
+    rng = random.Random(1)
+    cow, reference = CowDict((i, i) for i in range(1000)), {i: i for i in range(1000)}
+    forks = []
+    for step in range(2000):
+        key = rng.randrange(1200)
+        if key in reference and rng.random() < 0.5:
+            del cow[key]
+            del reference[key]
+        else:
+            cow[key] = reference[key] = step
+        forks.append((cow.fork(), dict(reference)))
+        # layers are merged as the chain grows, so it stays shallow
+        assert cow._depth <= 2 * math.log2(step + 2) + 2
+    assert list(cow.items()) == list(reference.items())
+    for fork, expected in forks[::97]:
+        assert list(fork.items()) == list(expected.items())
+
+
+def test_fork_is_independent():
+    api = MockFrostApi()
+    user = MockUser(api)
+    kept = api.add_txout(TransactionOutput(user.address, 1_000_000))
+    spent = api.add_txout(TransactionOutput(user.address, 2_000_000))
+    fork = api.fork()
+    fork.remove_txi(spent)
+    added = fork.add_txout(TransactionOutput(user.address, 3_000_000))
+    assert [u.input for u in api._utxos(user.address)] == [kept, spent]
+    assert [u.input for u in fork._utxos(user.address)] == [kept, added]
+    # both chains draw the same fresh transaction ids after forking
+    assert api.add_txout(TransactionOutput(user.address, 3_000_000)) == added
+
+
+def test_snapshot_restore():
+    api = MockFrostApi()
+    user = MockUser(api)
+    user.fund(1_000_000)
+    snapshot = api.snapshot()
+    for _ in range(3):
+        user.fund(2_000_000)
+        api.wait(100)
+        assert user.balance().coin == 3_000_000
+        api.restore(snapshot)
+        assert user.balance().coin == 1_000_000
+        assert api.last_block_slot == 0
+
+
+def test_dumps_loads():
+    api = MockFrostApi(block_production=True)
+    tx = build_multi_spend_tx(api, n=2)
+    user = MockUser(api)
+    user.fund(10_000_000)
+    api.wait(5)
+    api.submit_tx(transfer(api, user))
+    expected = api.evaluate_tx(tx)
+    loaded = MockFrostApi.loads(api.dumps())
+    assert loaded.evaluate_tx(tx) == expected
+    for address in api._utxo_state.addresses():
+        assert loaded.address_utxos(address, return_type="json") == api.address_utxos(
+            address, return_type="json"
+        )
+    assert loaded.block_latest(return_type="json") == api.block_latest(
+        return_type="json"
+    )
+    assert loaded.block_production and len(loaded.mempool) == 1
+    loaded.wait(1)
+    assert user.balance().coin == 10_000_000
+    assert (
+        0 < sum(u.output.amount.coin for u in loaded._utxos(user.address)) < 5_000_000
+    )
+    # both chains draw the same fresh transaction ids
+    assert loaded.add_txout(TransactionOutput(user.address, 1)) == api.add_txout(
+        TransactionOutput(user.address, 1)
+    )